@@ -0,0 +1,279 @@
+"""
+Run retriever queries in batch, reading the jobs from a JSONL file and writing a JSONL result per job.
+
+Each job is a JSON object with the repository URL, the commit, the ecosystem ("go" or "javascript") and the input of
+the retriever ("package,function"), and an optional id copied to its result:
+
+    {"id": "oc-1", "repository": "https://github.com/openshift/oc", "commit": "0000b3ef...", "ecosystem": "go",
+     "input": "crypto/rsa,Verify"}
+
+The jobs of the same repository and commit share one clone, one set of documents and one retriever. The jobs of a
+repository run one after another in the same worker, as they share its clone directory, and the repositories are
+spread over a pool of worker processes. A job that fails or times out gets a result with its error, and doesn't stop
+the other jobs.
+
+Answers are cached by repository, commit, query, parser version and dependency graph version in the query results
+cache (poc_QUERY_RESULT_CACHE_PATH, an empty value disables it), so rerunning a batch only runs the new queries.
+
+Usage:
+    python batch_runner.py requests.jsonl --output results.jsonl --workers 4 --timeout 600
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import signal
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from main import checkout_manifests, create_documents, extract_using_function_name, get_manifest_path
+from retrievers.chain_of_calls_retriever import ChainOfCallsRetriever
+from utils import instrumentation
+from utils.dep_tree import Ecosystem
+from utils.query_result_cache import QueryResultCache
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+
+class JobTimeoutError(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def time_limit(seconds: float | None):
+    """
+    Raise `JobTimeoutError` in the block after `seconds`. Uses SIGALRM, so it must run in the main thread of a
+    process. No limit if `seconds` is None or 0.
+    """
+    if not seconds:
+        yield
+        return
+
+    def raise_timeout(signum, frame):
+        raise JobTimeoutError(f"Timed out after {seconds}s")
+
+    previous_handler = signal.signal(signal.SIGALRM, raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def validate_job(job: dict):
+    """
+    Validate the fields of a job, normalizing its ecosystem to an `Ecosystem` name. Raises ValueError if invalid.
+    """
+    missing_fields = [field for field in ("repository", "commit", "ecosystem", "input") if field not in job]
+    if missing_fields:
+        raise ValueError(f"Missing fields {missing_fields}")
+    if str(job["ecosystem"]).upper() not in Ecosystem.__members__:
+        raise ValueError(f"Unknown ecosystem {job['ecosystem']}")
+    job["ecosystem"] = str(job["ecosystem"]).upper()
+    if "," not in job["input"]:
+        raise ValueError(f"Input '{job['input']}' is not 'package,function'")
+
+
+def read_jobs(jobs_path: str) -> tuple[list[dict], list[dict]]:
+    """
+    Returns the valid jobs of a JSONL file, each with its line number, and the results of the invalid ones.
+    """
+    jobs = list()
+    invalid_results = list()
+    with open(jobs_path) as jobs_file:
+        for line_number, line in enumerate(jobs_file, start=1):
+            if not line.strip():
+                continue
+            job = {"line": line_number}
+            try:
+                job.update(json.loads(line))
+                validate_job(job)
+            except (ValueError, TypeError) as e:
+                invalid_results.append(create_result(job, error=e))
+                continue
+            jobs.append(job)
+    return jobs, invalid_results
+
+
+def create_result(job: dict, error: BaseException | None = None, **fields) -> dict:
+    result = {
+        "id": job.get("id"),
+        "line": job.get("line"),
+        "repository": job.get("repository"),
+        "commit": job.get("commit"),
+        "ecosystem": job.get("ecosystem"),
+        "input": job.get("input"),
+        "resolved_input": None,
+        "found_path": False,
+        "path": [],
+        "cached": False,
+        "timings": {},
+        "error": None,
+    }
+    result.update(fields)
+    if error is not None:
+        result["error"] = {"type": type(error).__name__, "message": str(error)}
+    return result
+
+
+def group_jobs(jobs: list[dict]) -> dict[str, dict[tuple[str, str], list[dict]]]:
+    """
+    Group the jobs by repository, then by commit and ecosystem, keeping their order.
+    """
+    groups = dict()
+    for job in jobs:
+        repository_groups = groups.setdefault(job["repository"], dict())
+        repository_groups.setdefault((job["commit"], job["ecosystem"]), []).append(job)
+    return groups
+
+
+def build_retriever(repository: str, commit: str, ecosystem: Ecosystem) -> ChainOfCallsRetriever:
+    # The documents are streamed to the retriever when the memory budget is about to be reached
+    documents = create_documents(repository_url=repository, repository_digest=commit, programming_language=ecosystem,
+                                 stream=None)
+    # Cached documents are loaded without cloning, the dependency tree is built from the manifest at the commit
+    checkout_manifests(repository, commit, ecosystem)
+    return ChainOfCallsRetriever(documents=documents, ecosystem=ecosystem, package_name="",
+                                 manifest_path=get_manifest_path(repository))
+
+
+def run_job(retriever: ChainOfCallsRetriever, job: dict, timeout: float | None,
+            result_cache: QueryResultCache | None = None) -> dict:
+    start = time.perf_counter()
+    retriever.reset_query_state()
+    timings = dict()
+    resolved_input = None
+    cached = False
+    try:
+        with time_limit(timeout):
+            resolved_input = extract_using_function_name(job["input"], retriever.symbol_index)
+            timings["resolve_s"] = time.perf_counter() - start
+
+            query_start = time.perf_counter()
+            if result_cache is not None:
+                call_hierarchy_list, cached = result_cache.invoke(retriever, job["repository"], job["commit"],
+                                                                  resolved_input)
+            else:
+                call_hierarchy_list = retriever.invoke(resolved_input)
+            timings["query_s"] = time.perf_counter() - query_start
+    except Exception as e:
+        logger.warning("Job at line %s failed: %s", job["line"], e)
+        timings["total_s"] = time.perf_counter() - start
+        return create_result(job, error=e, resolved_input=resolved_input, timings=timings)
+
+    path = [{"package": package_name, "function": function_name, "source": source}
+            for package_name, function_name, source in retriever.get_call_hierarchy(call_hierarchy_list)]
+    timings["total_s"] = time.perf_counter() - start
+    return create_result(job, resolved_input=resolved_input, found_path=bool(retriever.found_path), path=path,
+                         cached=cached, timings=timings)
+
+
+def run_repository_jobs(repository: str, commit_groups: dict[tuple[str, str], list[dict]], timeout: float | None,
+                        setup_timeout: float | None, use_result_cache: bool = True) -> list[dict]:
+    """
+    Run the jobs of a repository, building a retriever per commit and ecosystem. Answers are cached in the query
+    results cache configured by the environment, unless `use_result_cache` is False.
+    """
+    # Each worker process opens its own connection to the cache
+    result_cache = QueryResultCache.from_environment() if use_result_cache else None
+    try:
+        return _run_repository_jobs(repository, commit_groups, timeout, setup_timeout, result_cache)
+    finally:
+        if result_cache is not None:
+            result_cache.close()
+        # Worker processes don't run exit handlers, their recording is exported after each repository
+        instrumentation.export()
+
+
+def _run_repository_jobs(repository: str, commit_groups: dict[tuple[str, str], list[dict]], timeout: float | None,
+                         setup_timeout: float | None, result_cache: QueryResultCache | None) -> list[dict]:
+    results = list()
+    for (commit, ecosystem_name), jobs in commit_groups.items():
+        setup_start = time.perf_counter()
+        try:
+            with time_limit(setup_timeout), instrumentation.span("batch.build_retriever"):
+                retriever = build_retriever(repository, commit, Ecosystem[ecosystem_name])
+        except Exception as e:
+            logger.warning("Unable to build the retriever of %s@%s: %s", repository, commit, e)
+            logger.debug(traceback.format_exc())
+            setup_time = time.perf_counter() - setup_start
+            results.extend(create_result(job, error=e, timings={"setup_s": setup_time}) for job in jobs)
+            continue
+        setup_time = time.perf_counter() - setup_start
+
+        for job in jobs:
+            result = run_job(retriever, job, timeout, result_cache)
+            result["timings"]["setup_s"] = setup_time
+            results.append(result)
+    return results
+
+
+def run_batch(jobs_path: str, output_file, workers: int, timeout: float | None, setup_timeout: float | None,
+              use_result_cache: bool = True) -> int:
+    """
+    Run the jobs of a JSONL file, writing each result as a JSON line as soon as its repository is done.
+
+    Returns the number of failed jobs.
+    """
+    jobs, invalid_results = read_jobs(jobs_path)
+    failed_jobs = 0
+
+    def write_results(results: list[dict]):
+        nonlocal failed_jobs
+        for result in results:
+            failed_jobs += result["error"] is not None
+            output_file.write(json.dumps(result) + "\n")
+        output_file.flush()
+
+    write_results(invalid_results)
+    groups = group_jobs(jobs)
+    logger.info("Running %d jobs of %d repositories", len(jobs), len(groups))
+
+    if workers <= 1:
+        for repository, commit_groups in groups.items():
+            write_results(run_repository_jobs(repository, commit_groups, timeout, setup_timeout, use_result_cache))
+        return failed_jobs
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_repository_jobs, repository, commit_groups, timeout, setup_timeout,
+                                   use_result_cache): commit_groups for repository, commit_groups in groups.items()}
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                # Including BrokenProcessPool, when the worker died, e.g. killed for running out of memory
+                logger.error("Worker failed: %s", e)
+                results = [create_result(job, error=e) for jobs in futures[future].values() for job in jobs]
+            write_results(results)
+    return failed_jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("jobs", nargs="?", default="requests.jsonl", help="The JSONL file of the jobs")
+    parser.add_argument("--output", help="The JSONL file of the results, standard output by default")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes, 1 runs the jobs in this process")
+    parser.add_argument("--timeout", type=float, default=None, help="Time limit of a job in seconds")
+    parser.add_argument("--setup-timeout", type=float, default=None,
+                        help="Time limit of cloning, parsing and building the retriever of a commit in seconds")
+    parser.add_argument("--no-result-cache", action="store_true",
+                        help="Answer every job with its retriever instead of the query results cache")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    with (open(args.output, "w") if args.output else contextlib.nullcontext(sys.stdout)) as output_file:
+        failed_jobs = run_batch(args.jobs, output_file, args.workers, args.timeout, args.setup_timeout,
+                                not args.no_result_cache)
+    if failed_jobs:
+        logger.warning("%d jobs failed", failed_jobs)
+    return 1 if failed_jobs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
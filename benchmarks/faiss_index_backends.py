@@ -0,0 +1,130 @@
+"""
+Compare the FAISS index backends of `FaissIndexConfig` on a synthetic code corpus embedded with a local hashing
+embedder, so no model or network is needed.
+
+For each backend, reports the recall@k against exact flat search, the serialized index size, the build time and the
+mean query latency.
+
+Usage:
+    python benchmarks/faiss_index_backends.py --chunks 50000 --dimension 384 --k 10
+"""
+import argparse
+import random
+import sys
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_community.vectorstores.faiss import dependable_faiss_import  # noqa: E402
+from langchain_core.embeddings import Embeddings  # noqa: E402
+
+from utils.faiss_indexes import FaissIndexConfig  # noqa: E402
+from utils.faiss_indexes import create_faiss_index  # noqa: E402
+
+BACKENDS = [
+    FaissIndexConfig("flat", "float32"),
+    FaissIndexConfig("flat", "float16"),
+    FaissIndexConfig("flat", "sq8"),
+    FaissIndexConfig("ivf_flat", "float32"),
+    FaissIndexConfig("ivf_flat", "sq8"),
+    FaissIndexConfig("ivf_pq"),
+    FaissIndexConfig("hnsw", "float32"),
+    FaissIndexConfig("hnsw", "float16"),
+]
+
+
+class HashingEmbedding(Embeddings):
+    """
+    A local embedder hashing the tokens of a text into a fixed number of buckets, so texts sharing identifiers get
+    close vectors.
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in text.replace("(", " ").replace(")", " ").replace(".", " ").split():
+            bucket = zlib.crc32(token.encode("utf-8"))
+            vector[bucket % self.dimension] += 1.0 if bucket & (1 << 31) else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def generate_chunks(count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    identifiers = [f"{rng.choice(['get', 'set', 'new', 'parse', 'read', 'write'])}{rng.randrange(5000)}"
+                   for _ in range(20000)]
+    packages = [f"pkg{index}" for index in range(500)]
+
+    chunks = []
+    for _ in range(count):
+        package = rng.choice(packages)
+        lines = [f"func {rng.choice(identifiers)}(ctx context.Context) error {{"]
+        for _ in range(rng.randrange(3, 12)):
+            lines.append(f"\t{package}.{rng.choice(identifiers)}({rng.choice(identifiers)})")
+        lines.append("}")
+        chunks.append("\n".join(lines))
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faiss = dependable_faiss_import()
+    embedding = HashingEmbedding(args.dimension)
+
+    start = time.perf_counter()
+    vectors = np.asarray(embedding.embed_documents(generate_chunks(args.chunks, args.seed)), dtype=np.float32)
+    queries = np.asarray(embedding.embed_documents(generate_chunks(args.queries, args.seed + 1)), dtype=np.float32)
+    print(f"Embedded {args.chunks} chunks and {args.queries} queries of dimension {args.dimension} in "
+          f"{time.perf_counter() - start:.1f}s\n")
+
+    ground_truth = None
+
+    print(f"{'backend':<22} {'factory':<22} {'recall@' + str(args.k):>10} {'size MB':>9} {'build s':>9} "
+          f"{'query ms':>9}")
+    for config in BACKENDS:
+        start = time.perf_counter()
+        training_vectors = vectors[:config.training_sample_size]
+        index = create_faiss_index(config, training_vectors, len(vectors))
+        index.add(vectors)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, neighbors = index.search(queries, args.k)
+        query_time = (time.perf_counter() - start) / len(queries)
+
+        if ground_truth is None:
+            ground_truth = neighbors
+        recall = np.mean([len(set(found) & set(expected)) / args.k
+                          for found, expected in zip(neighbors, ground_truth)])
+
+        size = len(faiss.serialize_index(index)) / (1 << 20)
+        factory_string = config.get_factory_string(args.dimension, len(vectors), len(training_vectors))
+
+        backend = config.index_type
+        if config.index_type != "ivf_pq":
+            backend += f"/{config.vector_encoding}"
+        print(f"{backend:<22} {factory_string:<22} {recall:>10.3f} {size:>9.1f} {build_time:>9.2f} "
+              f"{query_time * 1000:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Compare building the Go dependency tree from a large `go mod graph` output by splitting the whole output in memory (the
+previous `GoDependencyTreeBuilder.build_tree`) and by streaming it through `parse_go_mod_graph`.
+
+Without --graph, a synthetic monorepo like graph is generated: many modules, each required in several versions by
+several modules. A graph recorded with `go mod graph > graph.txt` can be given with --graph instead.
+
+Usage:
+    python benchmarks/go_mod_graph_parsing.py --modules 20000 --edges 400000
+    python benchmarks/go_mod_graph_parsing.py --graph graph.txt
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.dep_tree import ROOT_LEVEL_SENTINEL  # noqa: E402
+from utils.dep_tree import parse_go_mod_graph  # noqa: E402
+
+
+def generate_graph(path: Path, modules: int, edges: int, seed: int):
+    # Every module is required in several versions, which mostly require the same modules
+    rng = random.Random(seed)
+    names = [f"github.com/org{index % 500}/module{index}" for index in range(modules)]
+    requirements = {name: rng.sample(names, 8) for name in names}
+    with open(path, "w") as graph_file:
+        for name in names[:200]:
+            graph_file.write(f"example.com/monorepo {name}@v1.{rng.randrange(10)}.0\n")
+        written_edges = 200
+        while written_edges < edges:
+            parent = rng.choice(names)
+            parent_version = f"v1.{rng.randrange(10)}.0"
+            for son in requirements[parent]:
+                graph_file.write(f"{parent}@{parent_version} {son}@v1.{rng.randrange(10)}.{rng.randrange(3)}\n")
+            written_edges += len(requirements[parent])
+
+
+def extract_package_name(package_name: str) -> str:
+    if package_name.__contains__("@"):
+        version_start = package_name.index("@")
+        return package_name[: version_start]
+    else:
+        return package_name
+
+
+def build_tree_in_memory(path: Path) -> dict[str, list[str]]:
+    # The previous implementation, reading the whole output at once
+    lines = path.read_text().splitlines()
+    root_package_name = lines[0].split(" ")[0]
+    tree = dict()
+    for line in lines:
+        line.split(" ")
+        parent = extract_package_name(line.split(" ")[0])
+        son = extract_package_name(line.split(" ")[1])
+        if tree.get(son, None) is None:
+            tree[son] = [parent]
+        else:
+            tree.get(son).append(parent)
+    tree[root_package_name] = [ROOT_LEVEL_SENTINEL]
+    return tree
+
+
+def build_tree_streaming(path: Path) -> dict[str, list[str]]:
+    with open(path) as graph_file:
+        return parse_go_mod_graph(graph_file)
+
+
+def measure(build, path: Path):
+    start = time.perf_counter()
+    tree = build(path)
+    elapsed = time.perf_counter() - start
+
+    # Measured separately, tracing allocations slows down the build
+    tracemalloc.start()
+    build(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tree, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--graph", type=Path, help="A recorded `go mod graph` output")
+    parser.add_argument("--modules", type=int, default=20000)
+    parser.add_argument("--edges", type=int, default=400000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        graph_path = args.graph
+        if graph_path is None:
+            graph_path = Path(temp_dir) / "graph.txt"
+            generate_graph(graph_path, args.modules, args.edges, args.seed)
+
+        print(f"Graph: {graph_path}, {graph_path.stat().st_size / (1 << 20):.1f} MB")
+
+        results = dict()
+        for name, build in (("in memory", build_tree_in_memory), ("streaming", build_tree_streaming)):
+            tree, elapsed, peak = measure(build, graph_path)
+            results[name] = tree
+            parents = sum(len(tree_parents) for tree_parents in tree.values())
+            print(f"{name:<10} {elapsed:>8.3f}s  peak {peak / (1 << 20):>8.1f} MB  {len(tree)} modules, "
+                  f"{parents} parents")
+
+        # The streaming tree only drops duplicate parents
+        assert results["in memory"].keys() == results["streaming"].keys()
+        assert all(list(dict.fromkeys(parents)) == results["streaming"][module]
+                   for module, parents in results["in memory"].items())
+
+
+if __name__ == "__main__":
+    main()
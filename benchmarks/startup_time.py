@@ -0,0 +1,92 @@
+"""
+Measure the time to import the entry points of the pipeline in a fresh interpreter, and check that they don't import
+the heavy dependencies only needed once documents are parsed or embedded (FAISS, numpy, torch, esprima, tree-sitter
+grammars). Each module is imported in its own subprocess, `--repeats` times, and the median is reported.
+
+Exits with status 1 if a module imports a deferred dependency, or if its median import time is above --max-seconds, so
+that it can guard against startup regressions.
+
+Usage:
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --repeats 10 --max-seconds 1.0
+    python benchmarks/startup_time.py --module utils.documents_loader --slowest 15
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPOSITORY_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = ["main", "batch_runner", "query_service", "utils.documents_loader",
+                   "retrievers.chain_of_calls_retriever", "utils.dep_tree"]
+
+# Imported on first use by the parser, the splitter and the vector store, never by importing the entry points
+DEFERRED_MODULES = ["faiss", "numpy", "torch", "esprima", "tree_sitter", "tree_sitter_languages", "git",
+                    "langchain_community.vectorstores.faiss", "langchain_text_splitters"]
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure_import(module: str) -> tuple[float, set[str]]:
+    completed = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT.format(module=module)], cwd=REPOSITORY_ROOT,
+                               capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return result["seconds"], set(result["modules"])
+
+
+def get_slowest_imports(module: str, count: int) -> list[tuple[int, str]]:
+    # Cumulative microseconds of each import, as reported by -X importtime
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=REPOSITORY_ROOT,
+                               capture_output=True, text=True, check=True)
+    imports = list()
+    for line in completed.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            imports.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", dest="modules",
+                        help="A module to import, can be repeated (default: the pipeline entry points)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, help="Fail if a median import time is above it")
+    parser.add_argument("--slowest", type=int, default=0, help="Also print the N slowest imports of each module")
+    args = parser.parse_args()
+
+    failures = list()
+    for module in args.modules or DEFAULT_MODULES:
+        timings = list()
+        for _ in range(args.repeats):
+            seconds, imported_modules = measure_import(module)
+            timings.append(seconds)
+        median = statistics.median(timings)
+        deferred = [name for name in DEFERRED_MODULES if name in imported_modules]
+        print(f"{module:<40} median {median:>6.3f}s  min {min(timings):>6.3f}s  {len(imported_modules)} modules"
+              f"{'  imports ' + ', '.join(deferred) if deferred else ''}")
+
+        for microseconds, name in get_slowest_imports(module, args.slowest):
+            print(f"    {microseconds / 1e6:>6.3f}s {name}")
+
+        if deferred:
+            failures.append(f"{module} imports deferred dependencies: {', '.join(deferred)}")
+        if args.max_seconds is not None and median > args.max_seconds:
+            failures.append(f"{module} takes {median:.3f}s to import, above {args.max_seconds:.3f}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
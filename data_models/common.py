@@ -3,7 +3,9 @@ import typing
 from hashlib import sha512
 
 from pydantic import BaseModel
+from pydantic import ConfigDict
 from pydantic import Field
+from pydantic import PrivateAttr
 
 _LT = typing.TypeVar("_LT")
 
@@ -11,12 +13,36 @@ _LT = typing.TypeVar("_LT")
 class HashableModel(BaseModel):
     """
     Subclass of a Pydantic BaseModel that is hashable. Use in objects that need to be hashed for caching purposes.
+
+    Instances are frozen and the digest of their content is computed once, so hashing and comparisons are cheap after
+    the first one. List fields must not be modified in place.
     """
 
+    model_config = ConfigDict(frozen=True)
+
+    _digest: bytes | None = PrivateAttr(default=None)
+
+    @property
+    def content_digest(self) -> str:
+        """
+        Returns a stable hex digest of the model type and content, suitable for building persistent cache keys.
+        """
+        return self._get_digest().hex()
+
+    def _get_digest(self) -> bytes:
+        if self._digest is None:
+            self._digest = sha512(f"{self.__class__.__qualname__}::{self.model_dump_json()}".encode(
+                'utf-8', errors='ignore')).digest()
+        return self._digest
+
+    def model_copy(self, *, update: dict[str, typing.Any] | None = None, deep: bool = False):
+        copied = super().model_copy(update=update, deep=deep)
+        if update:
+            copied._digest = None
+        return copied
+
     def __hash__(self):
-        return int.from_bytes(bytes=sha512(f"{self.__class__.__qualname__}::{self.model_dump_json()}".encode(
-            'utf-8', errors='ignore')).digest(),
-                              byteorder=sys.byteorder)
+        return int.from_bytes(bytes=self._get_digest(), byteorder=sys.byteorder)
 
     def __lt__(self, other):
         return self.__hash__() < other.__hash__()
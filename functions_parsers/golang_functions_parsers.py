@@ -2,7 +2,7 @@ import os
 import re
 from langchain_core.documents import Document
 
-from functions_parsers.lang_functions_parsers import LanguageFunctionsParser
+from functions_parsers.lang_functions_parsers import LanguageFunctionsParser, regex_finditer, regex_search
 
 EMBEDDED_TYPE = "embedded_type"
 
@@ -102,7 +102,7 @@ def handle_imports(code_content: str, identifier: str, callee_package: str) -> b
         #  import without alias, in this case maybe package name contain alias
         else:
             # re.search(regex, caller_function_body, re.MULTILINE)
-            matching = re.search(rf"import [\'\"].*{identifier}[\'\"]", code_content)
+            matching = regex_search(rf"import [\'\"].*{identifier}[\'\"]", code_content)
             if matching and matching.group(0):
                 import_line = code_content[matching.start():]
                 import_package_line = import_line[:import_line.find(os.linesep)].strip()
@@ -164,7 +164,7 @@ class GoLanguageFunctionsParser(LanguageFunctionsParser):
         if var_properties is not None:
             resolved_type = var_properties.get("type")
             value = var_properties.get("value")
-            struct_initializer_expression = re.search(r"(&|\\*)?\w+\s*{", value)
+            struct_initializer_expression = regex_search(r"(&|\\*)?\w+\s*{", value)
             resolved_type = str(resolved_type).replace("&", "").replace("*", "")
             return resolved_type, struct_initializer_expression, value, var_properties
         else:
@@ -203,13 +203,13 @@ class GoLanguageFunctionsParser(LanguageFunctionsParser):
                 if not self.is_comment_line(row):
                     # Extract arguments and receiver argument of type as parameters
                     if row.startswith("func"):
-                        match = re.finditer(r"(func|\w+)\s*\([a-zA-Z0-9\s*,.\[\]]+\)"
-                                            , func_method.page_content[:func_method.page_content.find("{")]
-                                            , flags=re.MULTILINE)
+                        match = regex_finditer(r"(func|\w+)\s*\([a-zA-Z0-9\s*,.\[\]]+\)"
+                                                , func_method.page_content[:func_method.page_content.find("{")]
+                                                , flags=re.MULTILINE)
                         for current_match in match:
                             current_args = (current_match.group(0).replace("\n\t", "")
                                             .replace("\t", "").replace("\n", ""))
-                            current_params = re.search(r"\(.*\)", current_args)
+                            current_params = regex_search(r"\(.*\)", current_args)
                             params = (current_params.group(0).replace("(", "")
                                       .replace(")", "").split(","))
                             params_tuple = tuple(params)
@@ -235,7 +235,7 @@ class GoLanguageFunctionsParser(LanguageFunctionsParser):
                             all_vars[RETURN_TYPES] = []
 
 
-                    elif row.strip().startswith("var ") and not re.search(r"var\s*\(", row.strip()):
+                    elif row.strip().startswith("var ") and not regex_search(r"var\s*\(", row.strip()):
                         row_without_var_prefix = row.strip()[3:].strip()
                         parts = row_without_var_prefix.split()
                         # variable name
@@ -427,9 +427,8 @@ class GoLanguageFunctionsParser(LanguageFunctionsParser):
         index_of_function_closing = caller_function.page_content.rfind("}")
         caller_function_body = str(
             caller_function.page_content[index_of_function_opening + 1: index_of_function_closing])
-        re.search("", caller_function_body)
         regex = fr'[a-zA-Z0-9_\[\]\(\).]*.?{callee_function}\('
-        matching = re.search(regex, caller_function_body, re.MULTILINE)
+        matching = regex_search(regex, caller_function_body, re.MULTILINE)
         if matching and matching.group(0):
             return self.__check_identifier_resolved_to_callee_function_package(function=caller_function,
                                                                                identifier_function=matching.group(0),
@@ -490,7 +489,7 @@ class GoLanguageFunctionsParser(LanguageFunctionsParser):
                     # maybe identifier is the package itself in the file
                     regex = f"package {identifier}"
                     code_content = code_documents[doc].page_content
-                    matching = re.search(regex, code_content, re.MULTILINE)
+                    matching = regex_search(regex, code_content, re.MULTILINE)
                     if matching and matching.group(0):
                         return True
 
@@ -505,8 +504,8 @@ class GoLanguageFunctionsParser(LanguageFunctionsParser):
                 #  function and dig into structures and identifiers defined by variables
                 function_header = function.page_content[:function.page_content.index("{")]
                 regex_arguments = r"\([a-zA-Z0-9\s*,.]+\)"
-                match_regex = re.finditer(rf"^(\s*|\n){identifier}\s*(:=|=)\s*[^=]+\n*$",
-                                          caller_function_body, flags=re.MULTILINE)
+                match_regex = regex_finditer(rf"^(\s*|\n){identifier}\s*(:=|=)\s*[^=]+\n*$",
+                                             caller_function_body, flags=re.MULTILINE)
                 matches = [match.group(0) for match in match_regex]
 
                 if len(matches) > 0:
@@ -524,7 +523,7 @@ class GoLanguageFunctionsParser(LanguageFunctionsParser):
 
                 # Checks if match some argument in function or receiver parameter ( without parenthesis of return
                 # values)
-                elif re.search(regex_arguments, function_header):
+                elif regex_search(regex_arguments, function_header):
                     return self.__trace_down_package(expression=identifier.strip(), code_documents=code_documents,
                                                      type_documents=type_documents, callee_package=callee_package,
                                                      fields_of_types=fields_of_types,
@@ -0,0 +1,354 @@
+import os
+import re
+
+from langchain_core.documents import Document
+
+from functions_parsers.lang_functions_parsers import LanguageFunctionsParser, count_regex_evaluations
+
+PARAMETER = "parameter"
+
+LOCAL_IMPLICIT = "local_implicit"
+
+# Key of the containing object or class name of a method in the local variables of the method
+CONTAINING_SCOPE = "containing_scope"
+
+EXTENDS = "extends"
+
+# Headers of the function code units of ExtendedJavaScriptSegmenter, the function name is the first group
+FUNCTION_HEADERS_REGEXES = [
+    # function declarations
+    re.compile(r"^(?:export\s+(?:default\s+)?)?(?:async\s+)?function\b\s*\*?\s*([\w$]*)\s*\("),
+    # function expressions and arrow functions assigned to a variable
+    re.compile(r"^(?:export\s+)?(?:const|let|var)\s+([\w$]+)\s*=\s*(?:async\s+)?(?:function\b|\(|[\w$]+\s*=>)"),
+    # functions assigned to an object property
+    re.compile(r"^([\w$]+)\s*:\s*(?:async\s+)?(?:function\b|\(|[\w$]+\s*=>)"),
+    # methods of objects and classes
+    re.compile(r"^(?:static\s+)?(?:async\s+)?(?:get\s+|set\s+)?\*?\s*([\w$]+)\s*\("),
+]
+CLASS_HEADER_REGEX = re.compile(r"^(?:export\s+(?:default\s+)?)?class\s+([\w$]+)(?:\s+extends\s+([\w$.]+))?")
+CLASS_METHOD_REGEX = re.compile(r"^\s+(?:static\s+)?(?:async\s+)?(?:get\s+|set\s+)?\*?\s*([\w$]+)\s*\([^)]*\)\s*\{",
+                                flags=re.MULTILINE)
+CONTAINING_SCOPE_NAME_REGEX = re.compile(r"^\s*(?:export\s+)?(?:class\s+|(?:const|let|var)\s+)?([\w$.]+)")
+
+REQUIRE_REGEX = re.compile(r"(?:const|let|var)\s+([\w$]+|\{[^}]*\})\s*=\s*require\(\s*['\"]([^'\"]+)['\"]\s*\)")
+IMPORT_REGEX = re.compile(r"import\s+([\w$*{][^'\";]*?)\s+from\s*['\"]([^'\"]+)['\"]")
+LOCAL_VARIABLE_REGEX = re.compile(r"(?:const|let|var)\s+([\w$]+)\s*=\s*([^;\n]+)")
+DESTRUCTURED_VARIABLES_REGEX = re.compile(r"(?:const|let|var)\s*\{([^}]*)\}\s*=\s*([^;\n]+)")
+IDENTIFIER_REGEX = re.compile(r"[\w$]+")
+
+# Maximum number of local variable assignments followed to resolve an identifier
+MAX_ALIASES_DEPTH = 5
+
+
+def get_destructured_names(pattern: str) -> list[str]:
+    """
+    Returns the local names bound by a destructuring pattern or a named imports list, e.g. "{ a, b: c, d as e }" binds
+    a, c and e.
+    """
+    names = list()
+    for element in pattern.strip().strip("{}").split(","):
+        element = element.split("=")[0].strip()
+        if not element:
+            continue
+        for separator in (":", " as "):
+            if separator in element:
+                element = element.split(separator)[-1].strip()
+        count_regex_evaluations()
+        if IDENTIFIER_REGEX.fullmatch(element):
+            names.append(element)
+    return names
+
+
+def parse_imports(code_content: str) -> dict[str, str]:
+    """
+    Returns a mapping of each identifier bound by a `require` call or an `import` statement to its module specifier.
+    """
+    imports = dict()
+    count_regex_evaluations(2)
+    for match in REQUIRE_REGEX.finditer(code_content):
+        target, module = match.groups()
+        names = get_destructured_names(target) if target.startswith("{") else [target]
+        for name in names:
+            imports[name] = module
+    for match in IMPORT_REGEX.finditer(code_content):
+        clause, module = match.groups()
+        named_imports_start = clause.find("{")
+        if named_imports_start != -1:
+            for name in get_destructured_names(clause[named_imports_start:clause.find("}") + 1]):
+                imports[name] = module
+            clause = clause[:named_imports_start]
+        for default_or_namespace in clause.split(","):
+            default_or_namespace = default_or_namespace.strip()
+            if default_or_namespace.startswith("*"):
+                default_or_namespace = default_or_namespace.split(" as ")[-1].strip()
+            count_regex_evaluations()
+            if IDENTIFIER_REGEX.fullmatch(default_or_namespace):
+                imports[default_or_namespace] = module
+    return imports
+
+
+def get_module_package_name(module: str) -> str:
+    """
+    Returns the package name of a bare module specifier, e.g. "@scope/name" for "@scope/name/lib/file".
+    """
+    if module.startswith("node:"):
+        return module[len("node:"):]
+    parts = module.split("/")
+    if module.startswith("@") and len(parts) > 1:
+        return f"{parts[0]}/{parts[1]}"
+    return parts[0]
+
+
+class JavaScriptFunctionsParser(LanguageFunctionsParser):
+
+    def __init__(self):
+        # Import tables of the files, parsed once per file when a call in the file is first resolved
+        self.__imports_of_files: dict[str, dict[str, str]] = dict()
+
+    @staticmethod
+    def __get_content(function: Document) -> str:
+        # Methods extracted from objects and classes start with a line break
+        return function.page_content.lstrip()
+
+    def __get_imports_of_file(self, source: str, code_documents: dict[str, Document],
+                              caller_function: Document) -> dict[str, str]:
+        imports = self.__imports_of_files.get(source)
+        if imports is None:
+            code_document = code_documents.get(source)
+            imports = parse_imports(code_document.page_content) if code_document is not None else dict()
+            self.__imports_of_files[source] = imports
+        # Modules required inside the function shadow the ones of the file
+        local_imports = parse_imports(caller_function.page_content)
+        return {**imports, **local_imports} if local_imports else imports
+
+    @staticmethod
+    def __get_function_body(content: str) -> str:
+        index_of_function_opening = content.find("{")
+        index_of_arrow = content.find("=>")
+        if index_of_arrow != -1 and (index_of_function_opening == -1 or index_of_arrow < index_of_function_opening):
+            return content[index_of_arrow + 2:]
+        if index_of_function_opening == -1:
+            return ""
+        return content[index_of_function_opening + 1: content.rfind("}")]
+
+    @staticmethod
+    def __get_package_root(source: str) -> str:
+        """
+        Returns the location of the installed package containing a file, e.g. "node_modules/@scope/name", or an empty
+        string for files of the application.
+        """
+        index_of_package = source.rfind("node_modules/")
+        if index_of_package == -1:
+            return ""
+        index_of_package += len("node_modules/")
+        parts = source[index_of_package:].split("/")
+        package_name_length = 2 if parts[0].startswith("@") and len(parts) > 1 else 1
+        return source[:index_of_package] + "/".join(parts[:package_name_length])
+
+    def __module_resolves_to_callee(self, module: str, caller_source: str, callee_package: str,
+                                    callee_function_file_name: str) -> bool:
+        if module.startswith("."):
+            resolved_module = os.path.normpath(os.path.join(os.path.dirname(caller_source), module))
+            callee_package_root = self.__get_package_root(callee_function_file_name)
+            if callee_package_root:
+                return resolved_module == callee_package_root or resolved_module.startswith(f"{callee_package_root}/")
+            return callee_function_file_name.startswith(resolved_module)
+        return get_module_package_name(module).lower() == callee_package.lower()
+
+    def __resolve_identifier_module(self, identifier: str, imports: dict[str, str], local_variables: dict) -> str:
+        """
+        Returns the module specifier an identifier was imported from, following the local variables assigned from
+        other identifiers, e.g. `const client = new sdk.Client()`.
+        """
+        for _ in range(MAX_ALIASES_DEPTH):
+            if identifier in imports:
+                return imports[identifier]
+            variable = local_variables.get(identifier)
+            if not isinstance(variable, dict) or variable.get("value") in (None, PARAMETER):
+                return None
+            count_regex_evaluations(2)
+            value = re.sub(r"^(?:await|new)\s+", "", variable["value"].strip())
+            match = IDENTIFIER_REGEX.match(value)
+            if match is None or match.group(0) == identifier:
+                return None
+            identifier = match.group(0)
+        return None
+
+    def create_map_of_local_vars(self, functions_methods_documents: list[Document]) -> dict[str, dict]:
+        mappings = dict()
+        for func_method in functions_methods_documents:
+            func_key = f"{self.get_function_name(func_method)}@{func_method.metadata['source']}"
+            content = self.__get_content(func_method)
+            all_vars = dict()
+
+            header_end = content.find(")")
+            header = content[content.find("(") + 1:header_end] if header_end != -1 else ""
+            # A single parameter of an arrow function may be unparenthesized
+            count_regex_evaluations()
+            arrow_parameter = re.match(r"^(?:(?:export\s+)?(?:const|let|var)\s+[\w$]+\s*=\s*)?(?:async\s+)?([\w$]+)"
+                                       r"\s*=>", content)
+            if arrow_parameter:
+                header = arrow_parameter.group(1)
+            for parameter in header.split(","):
+                parameter = parameter.split("=")[0].strip().lstrip(".")
+                count_regex_evaluations()
+                if IDENTIFIER_REGEX.fullmatch(parameter):
+                    all_vars[parameter] = {"value": PARAMETER, "type": ""}
+
+            body = self.__get_function_body(content)
+            for row in body.splitlines():
+                if self.is_comment_line(row):
+                    continue
+                count_regex_evaluations(2)
+                for match in LOCAL_VARIABLE_REGEX.finditer(row):
+                    all_vars[match.group(1)] = {"value": match.group(2).strip(), "type": LOCAL_IMPLICIT}
+                for match in DESTRUCTURED_VARIABLES_REGEX.finditer(row):
+                    for name in get_destructured_names(match.group(1)):
+                        all_vars[name] = {"value": match.group(2).strip(), "type": LOCAL_IMPLICIT}
+
+            containing_scope = func_method.metadata.get("containing_scope")
+            if containing_scope:
+                count_regex_evaluations()
+                scope_match = CONTAINING_SCOPE_NAME_REGEX.match(containing_scope)
+                if scope_match:
+                    all_vars[CONTAINING_SCOPE] = scope_match.group(1)
+
+            mappings[func_key] = all_vars
+
+        return mappings
+
+    def parse_all_type_struct_class_to_fields(self, types: list[Document]) -> dict[tuple, list[tuple]]:
+        types_mapping = dict()
+        for the_type in types:
+            content = self.__get_content(the_type)
+            header_match = CLASS_HEADER_REGEX.match(content)
+            if header_match is None:
+                continue
+            class_name, base_class = header_match.groups()
+            members = [(method_name, "method") for method_name in CLASS_METHOD_REGEX.findall(
+                content[content.find("{") + 1:]) if method_name not in ("if", "for", "while", "switch", "catch")]
+            if base_class:
+                members.append((EXTENDS, base_class))
+            types_mapping[(class_name, the_type.metadata['source'])] = members
+        return types_mapping
+
+    def get_function_name(self, function: Document) -> str:
+        content = self.__get_content(function)
+        for header_regex in FUNCTION_HEADERS_REGEXES:
+            match = header_regex.match(content)
+            if match:
+                return match.group(1)
+        function_line = content.find(os.linesep)
+        return content[:function_line] if function_line != -1 else content
+
+    def search_for_called_function(self, caller_function: Document, callee_function: str, callee_function_package: str,
+                                   code_documents: dict[str, Document], type_documents: list[Document],
+                                   callee_function_file_name: str, fields_of_types: dict[tuple, list[tuple]],
+                                   functions_local_variables_index: dict[str, dict]) -> bool:
+        caller_function_body = self.__get_function_body(self.__get_content(caller_function))
+        regex = rf"(?<![\w$])((?:[\w$]+\s*\??\.\s*)*){re.escape(callee_function)}\s*\("
+        count_regex_evaluations()
+        matches = list(re.finditer(regex, caller_function_body))
+        if not matches:
+            return False
+
+        caller_source = caller_function.metadata.get('source')
+        same_file = caller_source == callee_function_file_name
+        imports = self.__get_imports_of_file(caller_source, code_documents, caller_function)
+        local_variables = functions_local_variables_index.get(
+            f"{self.get_function_name(caller_function)}@{caller_source}", dict())
+        callee_variables = functions_local_variables_index.get(f"{callee_function}@{callee_function_file_name}",
+                                                               dict())
+        callee_scope = callee_variables.get(CONTAINING_SCOPE)
+
+        for matching in matches:
+            qualifier = matching.group(1).replace("?", "").replace(" ", "")
+            # A call without qualifier, of a function of the same file or imported by its name
+            if not qualifier:
+                if caller_function_body[:matching.start()].rstrip().endswith("function"):
+                    continue
+                if same_file:
+                    return True
+                module = imports.get(callee_function)
+                if module is not None and self.__module_resolves_to_callee(module, caller_source,
+                                                                           callee_function_package,
+                                                                           callee_function_file_name):
+                    return True
+                continue
+
+            identifier = qualifier.split(".")[0]
+            # A method of the same object or class
+            if identifier in ("this", "super") or identifier == callee_scope:
+                if same_file:
+                    return True
+                if identifier in ("this", "super"):
+                    continue
+
+            module = self.__resolve_identifier_module(identifier, imports, local_variables)
+            if module is not None and self.__module_resolves_to_callee(module, caller_source,
+                                                                       callee_function_package,
+                                                                       callee_function_file_name):
+                return True
+
+            # An instance of a class of the callee's file, e.g. `const purl = new PackageURL(...)`
+            variable = local_variables.get(identifier)
+            if same_file and isinstance(variable, dict) and variable.get("value", "").startswith("new "):
+                count_regex_evaluations()
+                class_match = IDENTIFIER_REGEX.match(variable["value"][len("new "):].strip())
+                class_members = fields_of_types.get((class_match.group(0), callee_function_file_name), []) \
+                    if class_match else []
+                if (callee_function, "method") in class_members:
+                    return True
+
+        return False
+
+    def get_package_names(self, function: Document) -> list[str]:
+        full_doc_path = str(function.metadata['source'])
+        package_root = self.__get_package_root(full_doc_path)
+        if package_root:
+            return [package_root[package_root.rfind("node_modules/") + len("node_modules/"):]]
+        # Files of the application, or the module name of a dummy document of a Node.js built-in module
+        return [full_doc_path.split("/")[0]]
+
+    def get_package_name(self, function: Document, package_name: str) -> str:
+        for package in self.get_package_names(function):
+            if package_name.lower() == package.lower():
+                return package.lower()
+        return None
+
+    def is_root_package(self, function: Document) -> bool:
+        return not function.metadata['source'].startswith(self.dir_name_for_3rd_party_packages())
+
+    def is_comment_line(self, line: str) -> bool:
+        return line.strip().startswith(("//", "/*", "*"))
+
+    def get_comment_line_notation(self) -> str:
+        return "//"
+
+    def is_function(self, function: Document) -> bool:
+        if function.metadata.get('content_type') != 'functions_classes':
+            return False
+        content = self.__get_content(function)
+        return (CLASS_HEADER_REGEX.match(content) is None and
+                any(header_regex.match(content) for header_regex in FUNCTION_HEADERS_REGEXES))
+
+    def dir_name_for_3rd_party_packages(self) -> str:
+        return "node_modules"
+
+    def supported_files_extensions(self) -> list[str]:
+        return [".js"]
+
+    def is_supported_file_extensions(self, extension: str) -> bool:
+        return extension in self.supported_files_extensions()
+
+    def is_searchable_file_name(self, function: Document) -> bool:
+        file_path = str(function.metadata['source'])
+        file_name_parts = file_path[file_path.rfind("/") + 1:].lower().split(".")
+        return "/__tests__/" not in file_path and not any(part in ("test", "spec") for part in file_name_parts[1:]) \
+            and "test" not in file_name_parts[0]
+
+    def get_function_reserved_word(self) -> str:
+        return "function"
+
+    def get_type_reserved_word(self) -> str:
+        return "class"
@@ -1,7 +1,31 @@
+import collections
+import re
+import typing
 from abc import ABC, abstractmethod
+from collections.abc import Mapping
 
 from langchain_core.documents import Document
 
+from utils import instrumentation
+
+
+def count_regex_evaluations(evaluations: int = 1):
+    """
+    Count the regular expressions evaluated by the parsers to find calls and local variables, apart from the ones of
+    the retriever ("retriever.regex_evaluations").
+    """
+    instrumentation.count("parser.regex_evaluations", evaluations)
+
+
+def regex_search(pattern: str, string: str, flags: int = 0) -> re.Match | None:
+    count_regex_evaluations()
+    return re.search(pattern, string, flags)
+
+
+def regex_finditer(pattern: str, string: str, flags: int = 0) -> typing.Iterator[re.Match]:
+    count_regex_evaluations()
+    return re.finditer(pattern, string, flags)
+
 
 class LanguageFunctionsParser(ABC):
 
@@ -45,9 +69,11 @@ class LanguageFunctionsParser(ABC):
     def get_comment_line_notation(self) -> str:
         pass
 
-    @abstractmethod
     def is_exported_function(self, function: Document) -> bool:
-        pass
+        """
+        Returns whether a function can be called from other files than its own, by default all of them.
+        """
+        return True
 
     @abstractmethod
     def is_function(self, function: Document) -> bool:
@@ -76,3 +102,41 @@ class LanguageFunctionsParser(ABC):
     @abstractmethod
     def get_type_reserved_word(self) -> str:
         pass
+
+
+class LazyLocalVariablesIndex(Mapping):
+    """
+    A lower memory version of the index returned by `create_map_of_local_vars`, mapping the same "function@source"
+    keys to the local variables of the functions, computed when first looked up. Only the local variables of the last
+    `max_cached_functions` looked up functions are kept.
+    """
+
+    def __init__(self, language_parser: LanguageFunctionsParser, functions_methods_documents: list[Document],
+                 max_cached_functions: int = 4096):
+        self.language_parser = language_parser
+        self.max_cached_functions = max_cached_functions
+        self.__functions_of_key: dict[str, list[Document]] = dict()
+        for func_method in functions_methods_documents:
+            func_key = f"{language_parser.get_function_name(func_method)}@{func_method.metadata['source']}"
+            self.__functions_of_key.setdefault(func_key, []).append(func_method)
+        self.__local_variables: collections.OrderedDict[str, dict] = collections.OrderedDict()
+
+    def __getitem__(self, func_key: str) -> dict:
+        local_variables = self.__local_variables.get(func_key)
+        if local_variables is not None:
+            self.__local_variables.move_to_end(func_key)
+            return local_variables
+        # Raises KeyError for unknown functions, as the index of create_map_of_local_vars
+        functions = self.__functions_of_key[func_key]
+        # Functions with the same key override each other as in the index of create_map_of_local_vars
+        local_variables = self.language_parser.create_map_of_local_vars(functions)[func_key]
+        self.__local_variables[func_key] = local_variables
+        if len(self.__local_variables) > self.max_cached_functions:
+            self.__local_variables.popitem(last=False)
+        return local_variables
+
+    def __iter__(self):
+        return iter(self.__functions_of_key)
+
+    def __len__(self) -> int:
+        return len(self.__functions_of_key)
@@ -1,4 +1,5 @@
 from functions_parsers.golang_functions_parsers import GoLanguageFunctionsParser
+from functions_parsers.javascript_functions_parsers import JavaScriptFunctionsParser
 from functions_parsers.lang_functions_parsers import LanguageFunctionsParser
 from utils.dep_tree import Ecosystem
 
@@ -6,5 +7,7 @@ from utils.dep_tree import Ecosystem
 def get_language_function_parser(ecosystem: Ecosystem) -> LanguageFunctionsParser:
     if ecosystem == Ecosystem.GO:
         return GoLanguageFunctionsParser()
+    elif ecosystem == Ecosystem.JAVASCRIPT:
+        return JavaScriptFunctionsParser()
     else:
         return LanguageFunctionsParser()
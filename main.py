@@ -1,12 +1,25 @@
 import os
-import pickle
 import re
+import typing
 
 from langchain_core.documents import Document
 from data_models.input import SourceDocumentsInfo
 from retrievers.chain_of_calls_retriever import ChainOfCallsRetriever
+from utils import instrumentation
+from utils import memory_accounting
 from utils.dep_tree import Ecosystem
+from utils.document_store import DOCUMENT_STORE_SUFFIX
+from utils.document_store import DocumentStore
+from utils.document_store import document_store_key
+from utils.document_store import get_document_store_path
+from utils.document_store import write_document_store
 from utils.documents_loader import DocumentEmbedding
+from utils.documents_loader import PARSER_VERSION
+from utils.symbol_index import SymbolIndex
+
+GIT_DIRECTORY = "/tmp"
+# The manifest files are checked out apart from the clones of create_documents, which only check out the parsed sources
+MANIFESTS_DIRECTORY = f"{GIT_DIRECTORY}/manifests"
 
 
 def process_list(documents_list):
@@ -24,41 +37,142 @@ def process_list(documents_list):
     print(f"simplified_codes: {simplified_codes}, functions_methods: {functions_methods}, others: {others}")
 
 
+def find_base_cached_documents(cache_path: str, repository_url: str, repository_digest: str) -> tuple[str, str] | None:
+    """
+    Find the most recent cached documents of the same repository at another commit.
+    Returns a tuple of (document store path, commit digest), or None if the repository wasn't cached yet.
+    """
+    prefix = f"{document_store_key(repository_url)}-"
+    candidates = list()
+    if os.path.isdir(cache_path):
+        for file_name in os.listdir(cache_path):
+            path = f"{cache_path}/{file_name}"
+            digest = file_name[len(prefix):-len(DOCUMENT_STORE_SUFFIX)]
+            # Other repositories' keys may start with this repository key, e.g. "oc" and "oc-mirror"
+            if (file_name.startswith(prefix) and file_name.endswith(DOCUMENT_STORE_SUFFIX)
+                    and re.fullmatch(r"[0-9a-fA-F]+", digest) and digest != repository_digest):
+                candidates.append((os.path.getmtime(path), path, digest))
+    if len(candidates) == 0:
+        return None
+    _, path, digest = max(candidates)
+    return path, digest
+
+
+def load_cached_documents(document_store_path) -> list[Document] | None:
+    try:
+        with instrumentation.span("documents_cache.load"), \
+                DocumentStore(document_store_path, parser_version=PARSER_VERSION) as store:
+            return list(store.documents())
+    except (OSError, ValueError) as e:
+        print(f"Ignoring cached documents at {document_store_path}. Error: {e}")
+        return None
+
+
+def stream_cached_documents(document_store_path) -> typing.Iterator[Document] | None:
+    try:
+        store = DocumentStore(document_store_path, parser_version=PARSER_VERSION)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring cached documents at {document_store_path}. Error: {e}")
+        return None
+
+    def documents():
+        with store:
+            yield from store.documents()
+
+    return documents()
+
+
 def create_documents(repository_url: str,
                      repository_digest: str,
-                     programming_language: Ecosystem):
-    documents = list()
+                     programming_language: Ecosystem,
+                     stream: bool | None = False):
+    """
+    Returns the documents of a repository at a commit, parsed or loaded from the documents cache.
+
+    If `stream` is True, returns an iterator reading the documents one by one from the documents cache instead of a
+    list, and parsed documents are written to the cache as they are produced. If None, streams when the memory budget
+    is about to be reached.
+    """
+    if stream is None:
+        stream = memory_accounting.should_save_memory()
     cache_path = os.environ.get("DOCUMENTS_CACHE_PATH", "/home/zgrinber/poc_cache")
 
     repo_url = repository_url
     repo_digest = repository_digest
 
-    cached_documents_path = \
-        (f"{cache_path}/"
-         f"{repo_url.replace('//', '.').replace('/', '.').replace(':', '')}-"
-         f"{repo_digest}")
-    if os.path.isfile(cached_documents_path):
-        with open(cached_documents_path, 'rb') as doc_file:
-            documents = pickle.load(doc_file)  # deserialize using load()
-    else:
+    cached_documents_path = get_document_store_path(cache_path, repo_url, repo_digest)
+    load_documents = stream_cached_documents if stream else load_cached_documents
+    documents = load_documents(cached_documents_path) if os.path.isfile(cached_documents_path) else None
+    instrumentation.count("documents_cache.hits" if documents is not None else "documents_cache.misses")
+    if documents is None:
 
         document_embedder = DocumentEmbedding(embedding=None,
                                               vdb_directory="/tmp/vdb",
-                                              git_directory="/tmp")
-
-        documents = document_embedder.collect_documents(
-            source_info=SourceDocumentsInfo(type='code', git_repo=repo_url,
-                                            ref=("%s" % repo_digest), include=get_includes(programming_language),
-                                            exclude=get_exclude()))
-        with open(cached_documents_path, 'wb') as doc_file:  # open a text file
-            pickle.dump(documents, doc_file)
+                                              git_directory=GIT_DIRECTORY)
+        source_info = SourceDocumentsInfo(type='code', git_repo=repo_url,
+                                          ref=("%s" % repo_digest), include=get_includes(programming_language),
+                                          exclude=get_exclude())
+
+        base_cache_entry = find_base_cached_documents(cache_path, repo_url, repo_digest)
+        base_documents = load_cached_documents(base_cache_entry[0]) if base_cache_entry is not None else None
+        if base_documents is not None:
+            base_digest = base_cache_entry[1]
+            try:
+                # Re-parse only the files that changed since the cached commit
+                documents = document_embedder.collect_documents_incremental(source_info=source_info,
+                                                                            base_ref=base_digest,
+                                                                            base_documents=base_documents)
+            except Exception as e:
+                print(f"Incremental ingestion from {base_digest} failed, collecting all documents. Error: {e}")
+                documents = document_embedder.collect_documents(source_info=source_info)
+        elif stream:
+            documents = document_embedder.iter_documents(source_info=source_info)
+        else:
+            documents = document_embedder.collect_documents(source_info=source_info)
+        write_document_store(cached_documents_path, documents, parser_version=PARSER_VERSION)
+        if stream:
+            del documents, base_documents
+            documents = stream_cached_documents(cached_documents_path)
+
+    if not stream:
+        memory_accounting.report_memory("create_documents", documents=documents)
     return documents
 
 
+def get_manifest_path(repository_url: str) -> str:
+    # The manifest files of the repositories are checked out by checkout_manifests under MANIFESTS_DIRECTORY
+    return f"{MANIFESTS_DIRECTORY}/{repository_url}"
+
+
 def get_exclude():
     return ["**/*test*", "**/*tst*"]
 
 
+def get_manifest_includes(the_ecosystem: Ecosystem) -> list[str]:
+    # The files read by the dependency tree builders: the main manifest, its lockfiles and the manifests of local and
+    # installed dependencies
+    match the_ecosystem:
+        case Ecosystem.GO:
+            return ["**/go.mod", "go.sum", "vendor/modules.txt"]
+        case Ecosystem.JAVASCRIPT:
+            return ["**/package.json", "npm-shrinkwrap.json", "package-lock.json", "node_modules/.package-lock.json"]
+
+
+def checkout_manifests(repository_url: str, repository_digest: str, programming_language: Ecosystem):
+    """
+    Check out the manifest files of a repository at a commit under its manifest path. Only the sources parsed into the
+    documents are checked out by `create_documents`, and cached documents are loaded without cloning.
+
+    The manifest path is a clone of its own: checking out other files in the clone of `create_documents` would change
+    its sparse checkout patterns and remove the sources from its working tree.
+    """
+    # Imported here, GitPython is only needed once the first retriever is built
+    from utils.source_code_git_loader import SourceCodeGitLoader
+
+    SourceCodeGitLoader(repo_path=get_manifest_path(repository_url), clone_url=repository_url, ref=repository_digest,
+                        include=get_manifest_includes(programming_language)).load_repo()
+
+
 def get_includes(the_ecosystem: Ecosystem) -> list[str]:
     match the_ecosystem:
         case Ecosystem.GO:
@@ -67,95 +181,10 @@ def get_includes(the_ecosystem: Ecosystem) -> list[str]:
             return ["**/*.js"]
 
 
-def handle_argument(param: str) -> str:
-    if (param.startswith("'") and param.endswith("'")) or (param.startswith('"') and param.endswith('"')):
-        return param
-    elif param.__contains__("(") and param.__contains__(")"):
-        function_prefix_index_end = param.find("(") + 1
-        function_ending_index_end = param.rfind(")")
-        return traverse_all_parameters(function_ending_index_end, function_prefix_index_end, param)
-    else:
-        return ".*"
-
-
-def infer_if_short_package_name_match(package: str, package_names: list[str], final_package: set[str]) -> bool:
-    package_with_version_suffix = r"[./][vV][1-9]+$"
-    match = re.search(package_with_version_suffix, package)
-    if match:
-        parts = package.split(match.group())
-        short_package_name = parts[-2].split("/")[-1]
-    else:
-        parts = package.split("/")
-        short_package_name = parts[-1].split("/")[-1]
-
-    for current_package in package_names:
-        if short_package_name in current_package:
-            final_package.add(current_package)
-            return True
-
-    else:
-        return False
-
-
-def extract_using_function_name(input_string: str):
-    parts_input = input_string.split(",", 1)
-    package = parts_input[0]
-    function = parts_input[1]
-
-    # call_hierarchy_list = retriever.invoke("github.com/beorn7/perks,NewTargeted")
-    final_package = set()
-    package_functions = [doc for doc in documents if
-                         lang_parser.get_package_name(doc, package)
-                         or
-                         infer_if_short_package_name_match(package, lang_parser.get_package_names(doc), final_package)]
-
-    the_final_package = list(final_package)
-    if len(the_final_package) > 0 and the_final_package[0] != package:
-        package = the_final_package[0]
-
-    if function.__contains__(".") and "(" or ")" in function:
-        function_string = str(function)
-        function_prefix_index_end = function_string.find("(") + 1
-        function_ending_index_end = function_string.rfind(")")
-        function_builder = traverse_all_parameters(function_ending_index_end, function_prefix_index_end,
-                                                   function_string)
-    else:
-        return input_string
-    new_function_name = ""
-    comment_line_character = lang_parser.get_comment_line_notation()
-    for func in package_functions:
-
-        if match := re.search(rf"{function_builder}", func.page_content, flags=re.MULTILINE):
-            current_offset = match.start() - 1
-            while func.page_content[current_offset] != os.linesep:
-                current_offset -= 1
-            if func.page_content[current_offset: match.start()].strip().startswith(comment_line_character):
-                pass
-            else:
-                new_function_name = lang_parser.get_function_name(func)
-                break
-    new_input = f"{package},{new_function_name}"
-    return new_input
-
-
-def traverse_all_parameters(function_ending_index_end, function_prefix_index_end, function_string):
-    current_idx = function_prefix_index_end
-    function_builder = function_string[:function_prefix_index_end]
-    if current_idx == function_ending_index_end:
-        function_builder += ")"
-    while current_idx < function_ending_index_end:
-        end_of_arg_ind = function_string[current_idx:].find(",")
-        if end_of_arg_ind > -1:
-            value = handle_argument(function_string[current_idx: current_idx + end_of_arg_ind].strip())
-            function_builder += f"\\s?{value},"
-            current_idx = current_idx + end_of_arg_ind + 1
-        else:
-            # last argument
-            value = handle_argument(function_string[current_idx:function_ending_index_end].strip())
-            function_builder += f"\\s?{value}\\s?)"
-            current_idx = function_ending_index_end
-
-    return function_builder
+def extract_using_function_name(input_string: str, symbol_index: SymbolIndex) -> str:
+    # Call expressions inputs, e.g. 'github.com/go-jose/go-jose/v4,strings.Split(token, ".")', are resolved to the
+    # function of the package making the call
+    return symbol_index.resolve_input(input_string)
 
 
 # ("https://github.com/openshift/oauth-server", "c055dbb9a84e04575ade106e9a43cc638a8aeaef",
@@ -185,41 +214,41 @@ tests_golang = [
 
 tests_js = [("https://github.com/trustification/exhort-javascript-api", "05eafb488642194a1488d3029a597c06403b6ca2",
              'packageurl-js,toPurl'), Ecosystem.JAVASCRIPT]
-ecosystems = [tests_js, tests_golang]
-for num, ecosystem in enumerate(ecosystems):
-    for k, test in enumerate(ecosystem):
-        print(f"Ecosystem number #{num + 1}")
-        print(f"Test number #{k + 1}")
-        print(f"Test parameters: {test}")
-        (git_repo, git_commit_digest, the_input) = test
-        documents_list = create_documents(repository_url=git_repo,
-                                          repository_digest=git_commit_digest,
-                                          programming_language=ecosystem[-1])
-        process_list(documents_list)
-        retriever = ChainOfCallsRetriever(documents=documents_list, ecosystem=ecosystem[-1], package_name="",
-                                          manifest_path=f"/tmp/{git_repo}")
-        lang_parser = retriever.language_parser
-        documents = retriever.documents
-
-        process_list(documents_list)
-        the_input = extract_using_function_name(the_input)
-
-        call_hierarchy_list = retriever.invoke(the_input)
-        print("")
-        print(f"Retriever found path={retriever.found_path}")
-        print(f"path size={len(call_hierarchy_list)}")
-        print("")
-        print("==============================================")
-        print("Prints Hierarchy call functions path")
-        print("==============================================")
-        print("")
-        retriever.print_call_hierarchy(call_hierarchy_list)
-        print("==============================================")
-        print("Path Contents Content:")
-        print("==============================================")
-        print("")
-        for i, function_method in enumerate(reversed(call_hierarchy_list)):
-            print(f"File {i + 1}: {function_method.metadata['source']}")
-            print("-------------------------------------------")
-            print(function_method.page_content)
-        print(" ")
+if __name__ == "__main__":
+    ecosystems = [tests_js, tests_golang]
+    for num, ecosystem in enumerate(ecosystems):
+        for k, test in enumerate(ecosystem):
+            print(f"Ecosystem number #{num + 1}")
+            print(f"Test number #{k + 1}")
+            print(f"Test parameters: {test}")
+            (git_repo, git_commit_digest, the_input) = test
+            documents_list = create_documents(repository_url=git_repo,
+                                              repository_digest=git_commit_digest,
+                                              programming_language=ecosystem[-1])
+            process_list(documents_list)
+            checkout_manifests(git_repo, git_commit_digest, ecosystem[-1])
+            retriever = ChainOfCallsRetriever(documents=documents_list, ecosystem=ecosystem[-1], package_name="",
+                                              manifest_path=get_manifest_path(git_repo))
+
+            process_list(documents_list)
+            the_input = extract_using_function_name(the_input, retriever.symbol_index)
+
+            call_hierarchy_list = retriever.invoke(the_input)
+            print("")
+            print(f"Retriever found path={retriever.found_path}")
+            print(f"path size={len(call_hierarchy_list)}")
+            print("")
+            print("==============================================")
+            print("Prints Hierarchy call functions path")
+            print("==============================================")
+            print("")
+            retriever.print_call_hierarchy(call_hierarchy_list)
+            print("==============================================")
+            print("Path Contents Content:")
+            print("==============================================")
+            print("")
+            for i, function_method in enumerate(reversed(call_hierarchy_list)):
+                print(f"File {i + 1}: {function_method.metadata['source']}")
+                print("-------------------------------------------")
+                print(function_method.page_content)
+            print(" ")
@@ -0,0 +1,249 @@
+"""
+A local HTTP service answering retriever queries from warm retrievers, so the documents and indexes of a repository
+are built once instead of by every process querying it.
+
+Retrievers are kept per (repository, commit, ecosystem), built on the first query of their key, and evicted least
+recently used first when their estimated memory exceeds the budget (poc_QUERY_SERVICE_MEMORY_BUDGET_MB, or
+--memory-budget-mb). Concurrent queries of a key being built wait for the same build, and queries of the same retriever
+run one at a time, since a query changes the retriever's state. Answers are cached in the query results cache
+(poc_QUERY_RESULT_CACHE_PATH), unless --no-result-cache.
+
+Endpoints:
+    POST /query   A job of batch_runner.py, with "input" or "package" and "function", answered with its result
+    GET  /health  The warm retrievers and their estimated memory
+
+Usage:
+    python query_service.py --port 8080 --memory-budget-mb 8192
+    python query_service.py --unix-socket /tmp/poc-query-service.sock
+    curl -s localhost:8080/query -d '{"repository": "https://github.com/openshift/oc", "commit": "0000b3ef...",
+        "ecosystem": "go", "package": "crypto/rsa", "function": "Verify"}'
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from batch_runner import build_retriever, create_result, run_job, validate_job
+from retrievers.chain_of_calls_retriever import ChainOfCallsRetriever
+from utils.dep_tree import Ecosystem
+from utils.query_result_cache import QueryResultCache
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+MEMORY_BUDGET_MB_ENV = "poc_QUERY_SERVICE_MEMORY_BUDGET_MB"
+DEFAULT_MEMORY_BUDGET_MB = 4096
+
+# Rough per object overheads of the retriever indexes, in bytes
+_DOCUMENT_OVERHEAD = 300
+_PACKAGE_OVERHEAD = 200
+
+
+def estimate_retriever_size(retriever: ChainOfCallsRetriever) -> int:
+    """
+    Returns an estimate of the memory held by a retriever in bytes, its documents text and a fixed overhead per
+    document and dependency.
+    """
+    size = 0
+    for documents in (retriever.documents, retriever.documents_of_types, retriever.documents_of_full_sources.values()):
+        for document in documents:
+            size += len(document.page_content) + _DOCUMENT_OVERHEAD
+    size += len(retriever.tree_dict) * _PACKAGE_OVERHEAD
+    return size
+
+
+class WarmRetriever:
+    def __init__(self, retriever: ChainOfCallsRetriever, build_time: float):
+        self.retriever = retriever
+        self.build_time = build_time
+        self.size = estimate_retriever_size(retriever)
+        self.queries = 0
+        # A query changes the retriever's state, queries of the same retriever run one at a time
+        self.lock = threading.Lock()
+
+
+class RetrieverPool:
+    """
+    Warm retrievers keyed by (repository, commit, ecosystem name), in least recently used first order.
+    """
+
+    def __init__(self, memory_budget: int, build=build_retriever):
+        self.memory_budget = memory_budget
+        self._build = build
+        self._lock = threading.Lock()
+        self._retrievers: collections.OrderedDict[tuple, WarmRetriever] = collections.OrderedDict()
+        self._in_flight: dict[tuple, Future] = dict()
+        # Retrievers of the same repository share its clone directory, they are built one at a time
+        self._repository_locks: dict[str, threading.Lock] = collections.defaultdict(threading.Lock)
+
+    def get(self, key: tuple[str, str, str]) -> tuple[WarmRetriever, bool]:
+        """
+        Returns the warm retriever of a key, building it if needed, and whether it was already warm.
+        """
+        with self._lock:
+            warm_retriever = self._retrievers.get(key)
+            if warm_retriever is not None:
+                self._retrievers.move_to_end(key)
+                return warm_retriever, True
+            future = self._in_flight.get(key)
+            building = future is None
+            if building:
+                future = self._in_flight[key] = Future()
+                repository_lock = self._repository_locks[key[0]]
+
+        if not building:
+            return future.result(), False
+
+        try:
+            start = time.perf_counter()
+            with repository_lock:
+                retriever = self._build(key[0], key[1], Ecosystem[key[2]])
+            warm_retriever = WarmRetriever(retriever, time.perf_counter() - start)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            self._retrievers[key] = warm_retriever
+            self._evict()
+        logger.info("Built retriever of %s in %.1fs, estimated %.1f MB", key, warm_retriever.build_time,
+                    warm_retriever.size / (1 << 20))
+        future.set_result(warm_retriever)
+        return warm_retriever, False
+
+    def _evict(self):
+        # The most recently built retriever is kept even if it exceeds the budget alone
+        while len(self._retrievers) > 1 and self.memory_size() > self.memory_budget:
+            key, evicted_retriever = self._retrievers.popitem(last=False)
+            logger.info("Evicted retriever of %s, estimated %.1f MB", key, evicted_retriever.size / (1 << 20))
+
+    def memory_size(self) -> int:
+        return sum(warm_retriever.size for warm_retriever in self._retrievers.values())
+
+    def describe(self) -> list[dict]:
+        with self._lock:
+            return [{"repository": key[0], "commit": key[1], "ecosystem": key[2], "estimated_bytes": warm.size,
+                     "build_s": warm.build_time, "queries": warm.queries}
+                    for key, warm in self._retrievers.items()]
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    server: "QueryHTTPServer"
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status: HTTPStatus, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+            return
+        pool = self.server.pool
+        self._send_json(HTTPStatus.OK, {"status": "ok", "retrievers": pool.describe(),
+                                        "estimated_bytes": pool.memory_size(), "memory_budget": pool.memory_budget})
+
+    def do_POST(self):
+        if self.path != "/query":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+            return
+        job = dict()
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if "input" not in job and "package" in job and "function" in job:
+                job["input"] = f"{job['package']},{job['function']}"
+            validate_job(job)
+        except (ValueError, TypeError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, create_result(job if isinstance(job, dict) else {}, error=e))
+            return
+
+        start = time.perf_counter()
+        try:
+            warm_retriever, warm = self.server.pool.get((job["repository"], job["commit"], job["ecosystem"]))
+        except Exception as e:
+            logger.warning("Unable to build the retriever of %s@%s: %s", job["repository"], job["commit"], e)
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, create_result(job, error=e))
+            return
+        retriever_time = time.perf_counter() - start
+
+        with warm_retriever.lock:
+            result = run_job(warm_retriever.retriever, job, timeout=None, result_cache=self.server.result_cache)
+            warm_retriever.queries += 1
+        result["warm"] = warm
+        result["timings"]["retriever_s"] = retriever_time
+        self._send_json(HTTPStatus.OK, result)
+
+
+class QueryHTTPServer(ThreadingHTTPServer):
+    def __init__(self, server_address, pool: RetrieverPool, result_cache: QueryResultCache | None = None):
+        super().__init__(server_address, QueryRequestHandler)
+        self.pool = pool
+        self.result_cache = result_cache
+
+
+class QueryUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, pool: RetrieverPool, result_cache: QueryResultCache | None = None):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, QueryRequestHandler)
+        self.pool = pool
+        self.result_cache = result_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix-socket", help="Listen on a Unix socket instead of a TCP port")
+    parser.add_argument("--memory-budget-mb", type=int,
+                        default=int(os.environ.get(MEMORY_BUDGET_MB_ENV, DEFAULT_MEMORY_BUDGET_MB)),
+                        help="Estimated memory of the warm retrievers above which the least recently used are evicted")
+    parser.add_argument("--no-result-cache", action="store_true",
+                        help="Answer every query with its retriever instead of the query results cache")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    pool = RetrieverPool(memory_budget=args.memory_budget_mb << 20)
+    result_cache = None if args.no_result_cache else QueryResultCache.from_environment()
+    if args.unix_socket:
+        server = QueryUnixHTTPServer(args.unix_socket, pool, result_cache)
+        logger.info("Listening on %s", args.unix_socket)
+    else:
+        server = QueryHTTPServer((args.host, args.port), pool, result_cache)
+        logger.info("Listening on %s:%d", args.host, args.port)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if result_cache is not None:
+            result_cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,21 @@
+import hashlib
 import logging
 import re
 from pathlib import Path
-from typing import List, Any, Optional
+from typing import List, Any, Optional, Iterable, Mapping
 
 from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
 
-from functions_parsers.lang_functions_parsers import LanguageFunctionsParser
+from functions_parsers.lang_functions_parsers import LanguageFunctionsParser, LazyLocalVariablesIndex
 from functions_parsers.lang_functions_parsers_factory import get_language_function_parser
-from utils.dep_tree import DependencyTree, Ecosystem, get_dependency_tree_builder, ROOT_LEVEL_SENTINEL
+from utils import instrumentation
+from utils import memory_accounting
+from utils.code_units import CodeUnit
+from utils.dep_tree import DependencyGraphIndex, DependencyTree, Ecosystem, get_dependency_tree_builder, \
+    ROOT_LEVEL_SENTINEL
+from utils.symbol_index import SymbolIndex
 
 PARENTS_INDEX = 0
 
@@ -54,6 +60,9 @@ def get_functions_for_package(package_name: str, documents: list[Document], lang
 
 
 def is_function_callable(document: Document, language_parser, callee_function_file_name: str) -> bool:
+    # The JavaScript parser keeps the default of `is_exported_function`, all functions: the ones that aren't exported by
+    # name are still reachable from other modules through exported objects, classes and callbacks. Whether they call
+    # the callee is decided by the import tables of their files, in `search_for_called_function`.
     return (language_parser.is_exported_function(document) or
             document.metadata['source'].lower() == callee_function_file_name.lower())
 
@@ -63,12 +72,12 @@ def function_called_from_caller_body(document, function_to_search, language_pars
         return True
     function_word = language_parser.get_function_reserved_word()
     func_header_template = rf"${function_word} (\(.*\))?\s?${function_to_search}"
-    return (re.search(pattern=function_to_search, string=document.page_content,
-                      flags=re.IGNORECASE | re.MULTILINE)
-            # verify caller function or method is not the function
-            and not re.search(pattern=func_header_template,
-                              string=document.page_content,
-                              flags=re.IGNORECASE | re.MULTILINE))
+    instrumentation.count("retriever.regex_evaluations")
+    if not re.search(pattern=function_to_search, string=document.page_content, flags=re.IGNORECASE | re.MULTILINE):
+        return False
+    # verify caller function or method is not the function
+    instrumentation.count("retriever.regex_evaluations")
+    return not re.search(pattern=func_header_template, string=document.page_content, flags=re.IGNORECASE | re.MULTILINE)
 
 
 def document_belongs_to_package(language_parser: LanguageFunctionsParser, document: Document,
@@ -89,23 +98,27 @@ class ChainOfCallsRetriever(BaseRetriever):
    that delegates to the sync implementation running on another thread.
    """
     last_visited_parent_package_indexes: dict | None
-    documents: List[Document] | None
-    """List of documents comprising the path of call, if exists."""
+    documents: List[CodeUnit] | None
+    """List of functions code units to search the path of calls in."""
     documents_of_full_sources: dict | None
     documents_of_types: list | None
     language_parser: Optional[LanguageFunctionsParser]
     dependency_tree: Optional[DependencyTree]
     tree_dict: Optional[dict]
+    dependency_graph_index: Optional[DependencyGraphIndex]
+    dependency_graph_version: Optional[str]
+    """Hash of the dependency graph, identifying the answers of queries on the same documents."""
     ecosystem: Optional[Ecosystem]
     manifest_path: Optional[Path]
     package_name: str
     found_path: Optional[bool]
     types_classes_fields_mapping: dict[tuple, list[tuple]] | None
-    functions_local_variables_index: dict[str, dict] | None
+    functions_local_variables_index: Mapping[str, dict] | None
+    symbol_index: Optional[SymbolIndex]
     k: int = 10
     """Number of top results to return"""
 
-    def __init__(self, documents: List[Document], ecosystem: Ecosystem, manifest_path: Path,
+    def __init__(self, documents: Iterable[Document | CodeUnit], ecosystem: Ecosystem, manifest_path: Path,
                  *args: Any, **kwargs: Any):
         super().__init__(*args, **kwargs)
         self.ecosystem = ecosystem
@@ -115,32 +128,80 @@ class ChainOfCallsRetriever(BaseRetriever):
         if self.dependency_tree.builder is None:
             raise RuntimeError("Couldn't continue as dependencies wasn't generated")
 
+        allowed_files_extensions = tuple(self.language_parser.supported_files_extensions())
+        type_reserved_word = self.language_parser.get_type_reserved_word()
+        self.documents = list()
+        self.documents_of_types = list()
+        self.documents_of_full_sources = dict()
+        # Route each document to its index as it arrives, so a lazily produced stream of documents is never
+        # materialized as a whole. Documents are kept as compact code units, and converted back to documents only when
+        # returned from the retriever.
+        with instrumentation.span("retriever.load_documents") as load_span:
+            for document in documents:
+                doc = document if isinstance(document, CodeUnit) else CodeUnit.from_document(document)
+                source = doc.metadata['source']
+                if not str(source).endswith(allowed_files_extensions):
+                    continue
+                if self.language_parser.is_function(doc):
+                    self.documents.append(doc)
+                if doc.page_content.startswith(type_reserved_word):
+                    self.documents_of_types.append(doc)
+                if doc.metadata.get('content_type') == 'simplified_code':
+                    self.documents_of_full_sources[source] = doc
+            load_span.set(functions=len(self.documents), sources=len(self.documents_of_full_sources))
+        memory_accounting.report_memory("retriever.load_documents", documents=self.documents,
+                                        documents_of_types=self.documents_of_types,
+                                        documents_of_full_sources=self.documents_of_full_sources)
+
+        # The dependency tree is built only after consuming the documents, as the repository of a lazily produced
+        # stream of documents may be cloned only while iterating it.
         self.tree_dict = dict()
 
-        for package, parents in self.dependency_tree.builder.build_tree(manifest_path=manifest_path).items():
+        with instrumentation.span("dependency_tree.build", builder=type(self.dependency_tree.builder).__name__):
+            dependency_tree = self.dependency_tree.builder.build_tree(manifest_path=manifest_path)
+        for package, parents in dependency_tree.items():
             parents.extend([package])
             self.tree_dict[package] = list()
             # [parents, []]
             self.tree_dict[package].append(parents)
             self.tree_dict[package].append([])
-        allowed_files_extensions = self.language_parser.supported_files_extensions()
-        filtered_documents = [doc for doc in documents
-                              if any([ext for ext in allowed_files_extensions if str(doc.metadata['source'])
-                                     .endswith(ext)])]
-        self.documents = [doc for doc in filtered_documents
-                          if doc.page_content.startswith(self.language_parser.get_function_reserved_word())]
-        self.documents_of_types = [doc for doc in filtered_documents
-                                   if doc.page_content.startswith(self.language_parser.get_type_reserved_word())]
+        self.dependency_graph_index = DependencyGraphIndex(
+            {package: value[PARENTS_INDEX] for package, value in self.tree_dict.items()})
+        graph_hash = hashlib.sha256()
+        for package, value in sorted(self.tree_dict.items()):
+            graph_hash.update("\0".join([package, *map(str, value[PARENTS_INDEX])]).encode("utf-8") + b"\n")
+        self.dependency_graph_version = graph_hash.hexdigest()
         self.found_path = False
-        self.documents_of_full_sources = {doc.metadata.get('source'): doc for doc in filtered_documents
-                                          if doc.metadata.get('content_type') == 'simplified_code'}
         self.last_visited_parent_package_indexes = dict()
-        self.types_classes_fields_mapping = self.language_parser.parse_all_type_struct_class_to_fields(
-            self.documents_of_types)
-
-        self.functions_local_variables_index = self.language_parser.create_map_of_local_vars(self.documents)
-
-    def __find_caller_function(self, document_function: Document, function_package: str) -> Document:
+        with instrumentation.span("retriever.parse_all_type_struct_class_to_fields"):
+            self.types_classes_fields_mapping = self.language_parser.parse_all_type_struct_class_to_fields(
+                self.documents_of_types)
+
+        with instrumentation.span("retriever.create_map_of_local_vars"):
+            # The local variables of all the functions take about as much memory as the functions, they are indexed
+            # when first looked up if the memory budget can't hold them
+            if (memory_accounting.get_memory_budget() is not None and
+                    memory_accounting.should_save_memory(memory_accounting.estimate_size(self.documents))):
+                self.functions_local_variables_index = LazyLocalVariablesIndex(self.language_parser, self.documents)
+            else:
+                self.functions_local_variables_index = self.language_parser.create_map_of_local_vars(self.documents)
+        with instrumentation.span("retriever.create_symbol_index"):
+            self.symbol_index = SymbolIndex(self.documents, self.language_parser)
+        memory_accounting.report_memory("retriever construction", documents=self.documents,
+                                        documents_of_types=self.documents_of_types,
+                                        documents_of_full_sources=self.documents_of_full_sources,
+                                        tree_dict=self.tree_dict,
+                                        types_classes_fields_mapping=self.types_classes_fields_mapping,
+                                        functions_local_variables_index=self.functions_local_variables_index,
+                                        symbol_index=self.symbol_index)
+
+    def __find_caller_function(self, document_function: CodeUnit, function_package: str) -> CodeUnit:
+        instrumentation.count("retriever.hops")
+        with instrumentation.span("retriever.find_caller_function") as hop_span:
+            return self.__find_caller_function_in_parents(document_function, function_package, hop_span)
+
+    def __find_caller_function_in_parents(self, document_function: CodeUnit, function_package: str,
+                                          hop_span) -> CodeUnit:
         package_names = self.language_parser.get_package_names(document_function)
         direct_parents = list()
         # gets list of all direct parents of function
@@ -150,6 +211,8 @@ class ChainOfCallsRetriever(BaseRetriever):
                 direct_parents.extend(list_of_packages[PARENTS_INDEX])
             # Add same package itself to search path.
         # direct_parents.extend([function_package])
+        # Search the parents closest to the application first, their callers are the fewest hops away from it
+        self.dependency_graph_index.sort_by_depth(direct_parents)
         # gets list of documents to search in only from parents of function' package.
         function_name_to_search = self.language_parser.get_function_name(document_function)
         function_file_name = document_function.metadata.get('source')
@@ -159,6 +222,9 @@ class ChainOfCallsRetriever(BaseRetriever):
                                                                                   function_name_to_search), 0))
         package_exclusions = self.tree_dict.get(function_package)[EXCLUSIONS_INDEX]
         for package_index, package in enumerate(direct_parents[last_visited_package_index:]):
+            # A caller in a package the application doesn't depend on can't be a part of a path from the application
+            if self.dependency_graph_index.is_reachable(package) is False:
+                continue
             sources_location_packages = True
             if self.tree_dict.get(package)[PARENTS_INDEX][0] == ROOT_LEVEL_SENTINEL:
                 sources_location_packages = False
@@ -172,7 +238,10 @@ class ChainOfCallsRetriever(BaseRetriever):
                                                  function_to_search=function_name_to_search,
                                                  callee_function_file_name=function_file_name):
                 relevant_docs_to_search_in.append(doc)
+        instrumentation.count("retriever.candidates", len(relevant_docs_to_search_in))
+        hop_span.set(candidates=len(relevant_docs_to_search_in))
         for doc in relevant_docs_to_search_in:
+            instrumentation.count("retriever.search_for_called_function")
             function_is_being_called = self.language_parser.search_for_called_function(caller_function=doc,
                                                                                        callee_function=
                                                                                        function_name_to_search,
@@ -198,10 +267,10 @@ class ChainOfCallsRetriever(BaseRetriever):
 
         return None
 
-    def get_possible_docs(self, function_name_to_search: str, package: str, exclusions: list[Document],
+    def get_possible_docs(self, function_name_to_search: str, package: str, exclusions: list[CodeUnit],
                           sources_location_packages: bool) \
             -> list[
-                Document]:
+                CodeUnit]:
         flatten_docs_functions_names = [self.language_parser.get_function_name(doc) for doc in exclusions]
         if sources_location_packages:
             filter_1 = [doc for doc in self.documents if package in doc.metadata.get('source')
@@ -215,6 +284,10 @@ class ChainOfCallsRetriever(BaseRetriever):
 
     def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
         """Sync implementations for retriever."""
+        with instrumentation.report_to(run_manager), instrumentation.span("retriever.query"):
+            return self.__find_path_of_calls(query)
+
+    def __find_path_of_calls(self, query: str) -> List[Document]:
         (package_name, function) = tuple(query.split(","))
         found_package = False
         matching_documents = []
@@ -223,24 +296,28 @@ class ChainOfCallsRetriever(BaseRetriever):
                 package_name = package
                 found_package = True
                 break
+        if found_package and not self.dependency_graph_index.is_reachable(package_name):
+            logger.info("Package %s is not in the dependency closure of the application, it is not reachable",
+                        package_name)
+            return []
         if found_package:
             target_function_doc = self.__find_initial_function(function, package_name=package_name,
                                                                documents=self.documents,
                                                                language_parser=self.language_parser)
         else:
             # Try to create dummy package for ecosystem standard library function
-            target_function_doc = Document(page_content=f"func {function + '()' + '{}'}"
-                                           , metadata={"source": package_name,
-                                                       "ecosystem": self.ecosystem})
+            target_function_doc = self.create_standard_library_function_doc(package_name, function)
             importing_docs = [value for (file, value) in self.documents_of_full_sources.items()
                               if re.search(
-                    rf"(import {package_name}|import\s*\(\s*[\w\s\/.\"-]*{package_name}[\w\s\/.\"-]*\s*\))"
+                    rf"(import {package_name}|import\s*\(\s*[\w\s\/.\"-]*{package_name}[\w\s\/.\"-]*\s*\)"
+                    # JavaScript require calls and import statements of built-in modules
+                    rf"|(require\(|from)\s*[\'\"](node:)?{package_name}[\'\"])"
                     , value.page_content, flags=re.MULTILINE)]
             root_package = [key for (key, value) in self.tree_dict.items() if ROOT_LEVEL_SENTINEL in value[0]]
             prefix_of_3rd_parties_libs = self.language_parser.dir_name_for_3rd_party_packages()
-            parents = set([self.language_parser.get_package_names(doc)[1] for doc in importing_docs if
+            parents = set([self.language_parser.get_package_names(doc)[-1] for doc in importing_docs if
                            doc.metadata['source'].startswith(
-                               prefix_of_3rd_parties_libs) and self.language_parser.get_package_names(doc)[1]
+                               prefix_of_3rd_parties_libs) and self.language_parser.get_package_names(doc)[-1]
                            in self.tree_dict.keys()])
             for doc in importing_docs:
                 if not doc.metadata.get('source').startswith(prefix_of_3rd_parties_libs):
@@ -273,21 +350,22 @@ class ChainOfCallsRetriever(BaseRetriever):
                     end_loop = True
                 # Backtrack.
                 else:
+                    instrumentation.count("retriever.backtracks")
                     dead_end_node = matching_documents.pop()
                     # Excludes dead end function node from future searches.
                     self.tree_dict.get(current_package_name)[EXCLUSIONS_INDEX].append(dead_end_node)
                     target_function_doc = matching_documents[-1]
                     current_package_name = self.__determine_doc_package_name(target_function_doc)
 
-        return matching_documents
+        return [code_unit.to_document() for code_unit in matching_documents]
 
     def __determine_doc_package_name(self, target_function_doc):
         return [package_name for package_name in
                 self.language_parser.get_package_names(target_function_doc)
                 if self.tree_dict.get(package_name, None) is not None][0]
 
-    def __find_initial_function(self, function_name: str, package_name: str, documents: list[Document],
-                                language_parser: LanguageFunctionsParser) -> Document:
+    def __find_initial_function(self, function_name: str, package_name: str, documents: list[CodeUnit],
+                                language_parser: LanguageFunctionsParser) -> CodeUnit:
         relevant_docs = [doc for doc in documents if doc.metadata.get('source').__contains__(package_name) and
                          doc.page_content.__contains__(function_name)]
         package_exclusions = self.tree_dict.get(package_name)[EXCLUSIONS_INDEX]
@@ -301,8 +379,34 @@ class ChainOfCallsRetriever(BaseRetriever):
         else:
             return None
 
-    def print_call_hierarchy(self, call_hierarchy_list: list[Document]):
-        for i, package_function in enumerate(reversed(call_hierarchy_list)):
+    def create_standard_library_function_doc(self, package_name: str, function: str) -> CodeUnit:
+        """
+        Returns the dummy code unit standing for a function of a standard library package, which has no source.
+        """
+        function_reserved_word = self.language_parser.get_function_reserved_word()
+        return CodeUnit(source=package_name, text=f"{function_reserved_word} {function + '()' + '{}'}",
+                        extra_metadata={"ecosystem": self.ecosystem})
+
+    def reset_query_state(self):
+        """
+        Reset the state a query leaves in the retriever, the excluded functions of each package, the dummy packages
+        of standard library functions and the found path flag, so the next query starts from the built retriever.
+        """
+        for package in list(self.tree_dict):
+            if package not in self.dependency_graph_index:
+                del self.tree_dict[package]
+            else:
+                self.tree_dict[package][EXCLUSIONS_INDEX].clear()
+        self.last_visited_parent_package_indexes.clear()
+        self.found_path = False
+
+    def get_call_hierarchy(self, call_hierarchy_list: list[Document]) -> list[tuple[str, str, str]]:
+        """
+        Returns the (package, function, source) of each function of a path returned by the retriever, from the
+        application down to the searched function.
+        """
+        call_hierarchy = list()
+        for package_function in reversed(call_hierarchy_list):
             packages_names = self.language_parser.get_package_names(package_function)
             if len(packages_names) > 1:
                 maximum_length_package = max(len(packages_names[0]), len(packages_names[1]))
@@ -315,4 +419,9 @@ class ChainOfCallsRetriever(BaseRetriever):
             else:
                 package_name = package_function.metadata['source']
             function_name = self.language_parser.get_function_name(package_function)
+            call_hierarchy.append((package_name, function_name, package_function.metadata['source']))
+        return call_hierarchy
+
+    def print_call_hierarchy(self, call_hierarchy_list: list[Document]):
+        for i, (package_name, function_name, _) in enumerate(self.get_call_hierarchy(call_hierarchy_list)):
             print(f"(package={package_name},function={function_name},depth={i})")
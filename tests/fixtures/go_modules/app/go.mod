@@ -0,0 +1,19 @@
+module example.com/app
+
+go 1.21
+
+require (
+	example.com/a v1.0.0
+	example.com/local v0.0.0
+	example.com/old v1.0.0
+)
+
+require (
+	example.com/b v1.1.0 // indirect
+	example.com/c v1.0.0 // indirect
+	example.com/d v1.0.0 // indirect
+)
+
+replace example.com/old v1.0.0 => example.com/fork v1.2.0
+
+replace example.com/local => ./local
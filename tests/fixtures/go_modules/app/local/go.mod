@@ -0,0 +1,5 @@
+module example.com/local
+
+go 1.16
+
+require example.com/c v1.0.0
@@ -0,0 +1,8 @@
+module example.com/b
+
+go 1.16
+
+require (
+	example.com/c v1.0.0
+	example.com/d v1.0.0
+)
@@ -0,0 +1,5 @@
+module example.com/d
+
+go 1.16
+
+require example.com/b v1.0.0
@@ -0,0 +1,5 @@
+module example.com/old
+
+go 1.18
+
+require example.com/c v1.0.0
@@ -0,0 +1,263 @@
+import logging
+import shutil
+from pathlib import Path
+
+import pytest
+
+from utils.dep_tree import CachingDependencyTreeBuilder
+from utils.dep_tree import DependencyGraphIndex
+from utils.dep_tree import GoDependencyTreeBuilder
+from utils.dep_tree import GoModFilesDependencyTreeBuilder
+from utils.dep_tree import GoVendoredModules
+from utils.dep_tree import JavaScriptDependencyTreeBuilder
+from utils.dep_tree import ROOT_LEVEL_SENTINEL
+
+GO_MODULES_FIXTURES = Path(__file__).resolve().parent / "fixtures" / "go_modules"
+JS_PACKAGES_FIXTURES = Path(__file__).resolve().parent / "fixtures" / "js_packages"
+
+# The tree of fixtures/go_modules/app, as built from its `go mod graph` output
+EXPECTED_TREE = {
+    "example.com/a": ["example.com/app"],
+    "example.com/b": ["example.com/a", "example.com/app", "example.com/d"],
+    "example.com/c": ["example.com/app", "example.com/b", "example.com/local", "example.com/old"],
+    "example.com/d": ["example.com/app", "example.com/b"],
+    "example.com/local": ["example.com/app"],
+    "example.com/old": ["example.com/app"],
+    "go": ["example.com/app"],
+    "toolchain": ["go"],
+    "example.com/app": [ROOT_LEVEL_SENTINEL],
+}
+
+# The tree of each project of fixtures/js_packages. Requiring c from a resolves to its nested copy, which requires f
+# installed at the top level
+EXPECTED_JS_TREE = {
+    "a": ["app"],
+    "@scope/e": ["app"],
+    "d": ["app"],
+    "b": ["@scope/e", "a"],
+    "c": ["a", "b"],
+    "f": ["c"],
+    "app": [ROOT_LEVEL_SENTINEL],
+}
+
+
+def sorted_tree(tree: dict[str, list[str]]) -> dict[str, list[str]]:
+    return {package: sorted(parents) for package, parents in tree.items()}
+
+
+@pytest.fixture
+def app_path(tmp_path) -> Path:
+    app_path = tmp_path / "app"
+    shutil.copytree(GO_MODULES_FIXTURES / "app", app_path)
+    return app_path
+
+
+@pytest.fixture
+def go_environment(monkeypatch):
+    # Resolve the modules from the fixture module cache only
+    monkeypatch.setenv("GOMODCACHE", str(GO_MODULES_FIXTURES / "gomodcache"))
+    monkeypatch.setenv("GOPROXY", "off")
+    monkeypatch.setenv("GOFLAGS", "-mod=mod")
+    monkeypatch.setenv("GOTOOLCHAIN", "local")
+
+
+@pytest.fixture
+def without_go(monkeypatch):
+    monkeypatch.setattr(shutil, "which", lambda name, *args, **kwargs: None)
+
+
+def test_parse_vendored_modules():
+    vendored_modules = GoVendoredModules.parse((GO_MODULES_FIXTURES / "app" / "vendor" / "modules.txt").read_text())
+
+    assert vendored_modules.versions == {"example.com/a": "v1.0.0", "example.com/b": "v1.1.0",
+                                         "example.com/c": "v1.0.0", "example.com/d": "v1.0.0",
+                                         "example.com/local": "v0.0.0", "example.com/old": "v1.0.0"}
+    assert vendored_modules.explicit == set(vendored_modules.versions)
+    assert vendored_modules.replaces == {("example.com/local", "v0.0.0"): ("./local", None),
+                                         ("example.com/local", None): ("./local", None),
+                                         ("example.com/old", "v1.0.0"): ("example.com/fork", "v1.2.0")}
+
+
+def test_parse_vendored_modules_implicit():
+    vendored_modules = GoVendoredModules.parse("# example.com/a v1.0.0\n"
+                                               "## explicit\n"
+                                               "example.com/a\n"
+                                               "# example.com/b v1.1.0\n"
+                                               "## go 1.16\n"
+                                               "example.com/b/pkg\n")
+
+    assert vendored_modules.versions == {"example.com/a": "v1.0.0", "example.com/b": "v1.1.0"}
+    assert vendored_modules.explicit == {"example.com/a"}
+    assert vendored_modules.replaces == {}
+
+
+def test_native_tree_matches_expected_tree(app_path, without_go):
+    builder = GoModFilesDependencyTreeBuilder(module_cache_path=GO_MODULES_FIXTURES / "gomodcache")
+
+    assert sorted_tree(builder.build_tree(app_path)) == EXPECTED_TREE
+    assert builder.missing_modules == []
+
+
+@pytest.mark.skipif(shutil.which("go") is None, reason="requires the Go toolchain")
+def test_native_tree_matches_go_mod_graph(app_path, go_environment):
+    builder = GoModFilesDependencyTreeBuilder(module_cache_path=GO_MODULES_FIXTURES / "gomodcache")
+    with GoDependencyTreeBuilder.stream_go_mod_graph(app_path) as lines:
+        go_mod_graph_edges = {tuple(line.split()) for line in lines if line.strip()}
+
+    assert set(builder.get_go_mod_graph_edges(app_path)) == go_mod_graph_edges
+    assert sorted_tree(builder.build_tree(app_path)) == sorted_tree(GoDependencyTreeBuilder().build_tree(app_path))
+
+
+def test_vendored_replacements_are_applied(app_path, without_go):
+    # The replacement of example.com/old is only recorded in vendor/modules.txt
+    go_mod_path = app_path / "go.mod"
+    go_mod_path.write_text(go_mod_path.read_text().replace(
+        "replace example.com/old v1.0.0 => example.com/fork v1.2.0\n", ""))
+    builder = GoModFilesDependencyTreeBuilder(module_cache_path=GO_MODULES_FIXTURES / "gomodcache")
+
+    assert sorted_tree(builder.build_tree(app_path)) == EXPECTED_TREE
+
+
+def test_missing_go_mod_files_are_not_attached_to_the_root(app_path, tmp_path, without_go, caplog):
+    builder = GoModFilesDependencyTreeBuilder(module_cache_path=tmp_path / "empty")
+
+    with caplog.at_level(logging.WARNING, logger="poc.utils.dep_tree"):
+        tree = builder.build_tree(app_path)
+
+    # Only the requirements of the go.mod files available, the main module and the local replacement
+    assert sorted_tree(tree) == {
+        "example.com/a": ["example.com/app"],
+        "example.com/b": ["example.com/app"],
+        "example.com/c": ["example.com/app", "example.com/local"],
+        "example.com/d": ["example.com/app"],
+        "example.com/local": ["example.com/app"],
+        "example.com/old": ["example.com/app"],
+        "go": ["example.com/app"],
+        "toolchain": ["go"],
+        "example.com/app": [ROOT_LEVEL_SENTINEL],
+    }
+    # Listed in go.sum only
+    assert "example.com/stale" not in tree
+    assert sorted(builder.missing_modules) == ["example.com/a@v1.0.0", "example.com/b@v1.1.0",
+                                               "example.com/c@v1.0.0", "example.com/d@v1.0.0",
+                                               "example.com/old@v1.0.0"]
+    assert "example.com/a@v1.0.0" in caplog.text
+
+
+def test_vendored_explicit_requirements_without_go_mod_requirement(app_path, tmp_path, without_go):
+    # A go 1.16 main module only requires its direct dependencies, the vendored modules tell which ones they are
+    (app_path / "go.mod").write_text("module example.com/app\n\ngo 1.16\n\nreplace example.com/local => ./local\n")
+    (app_path / "vendor" / "modules.txt").write_text("# example.com/a v1.0.0\n"
+                                                     "## explicit\n"
+                                                     "# example.com/b v1.1.0\n"
+                                                     "# example.com/local v0.0.0 => ./local\n"
+                                                     "## explicit\n")
+    builder = GoModFilesDependencyTreeBuilder(module_cache_path=tmp_path / "empty")
+
+    tree = builder.build_tree(app_path)
+
+    assert sorted_tree(tree) == {
+        "example.com/a": ["example.com/app"],
+        "example.com/local": ["example.com/app"],
+        "example.com/c": ["example.com/local"],
+        "example.com/app": [ROOT_LEVEL_SENTINEL],
+    }
+    assert builder.missing_modules == ["example.com/a@v1.0.0", "example.com/c@v1.0.0"]
+
+
+@pytest.mark.skipif(shutil.which("go") is None, reason="requires the Go toolchain")
+def test_missing_go_mod_files_keep_the_incomplete_tree(app_path, tmp_path, go_environment):
+    builder = GoModFilesDependencyTreeBuilder(module_cache_path=tmp_path / "empty")
+
+    tree = builder.build_tree(app_path)
+    assert sorted_tree(tree) != EXPECTED_TREE
+    assert "example.com/a" not in tree["example.com/b"]
+    assert builder.missing_modules != []
+
+
+def test_missing_go_mod_files_fall_back_to_go_mod_graph(app_path, tmp_path, go_environment):
+    builder = GoModFilesDependencyTreeBuilder(module_cache_path=tmp_path / "empty", fall_back_to_go_mod_graph=True)
+
+    assert sorted_tree(builder.build_tree(app_path)) == EXPECTED_TREE
+    assert builder.missing_modules == []
+
+
+def test_incomplete_trees_are_not_cached(app_path, tmp_path, without_go, monkeypatch):
+    monkeypatch.setattr(CachingDependencyTreeBuilder, "_memory_cache", dict())
+    cache_path = tmp_path / "dep_trees"
+
+    empty_cache_builder = CachingDependencyTreeBuilder(
+        GoModFilesDependencyTreeBuilder(module_cache_path=tmp_path / "empty"), cache_path)
+    assert "example.com/a" not in empty_cache_builder.build_tree(app_path)["example.com/b"]
+    assert not cache_path.exists()
+
+    # Once the modules are downloaded, the same manifest files build the complete tree
+    (tmp_path / "empty").symlink_to(GO_MODULES_FIXTURES / "gomodcache")
+    assert sorted_tree(empty_cache_builder.build_tree(app_path)) == EXPECTED_TREE
+    assert len(list(cache_path.glob("*.pcdt"))) == 1
+
+    # Builders with other module caches don't share the cached tree
+    other_builder = CachingDependencyTreeBuilder(
+        GoModFilesDependencyTreeBuilder(module_cache_path=tmp_path / "other"), cache_path)
+    assert other_builder.get_cache_key(app_path) != empty_cache_builder.get_cache_key(app_path)
+
+
+def test_dependency_graph_index():
+    index = DependencyGraphIndex({
+        "app": [ROOT_LEVEL_SENTINEL],
+        "a": ["app"],
+        "b": ["a", "c"],
+        "c": ["unused"],
+        "unused": [],
+    })
+
+    assert [index.is_reachable(package) for package in ["app", "a", "b", "c", "unused", "unknown"]] == [
+        True, True, True, False, False, None]
+    assert index.reachable_count == 3
+    assert [index.depth_to_root(package) for package in ["app", "a", "b", "c", "unknown"]] == [0, 1, 2, None, None]
+
+    parents = ["unknown", "b", "c", "a", "app"]
+    index.sort_by_depth(parents)
+    assert parents == ["app", "a", "b", "unknown", "c"]
+
+
+@pytest.mark.parametrize("project", ["lockfile_v1", "lockfile_v2", "lockfile_v3"])
+def test_javascript_tree_from_lockfile(project):
+    builder = JavaScriptDependencyTreeBuilder()
+
+    assert sorted_tree(builder.build_tree(JS_PACKAGES_FIXTURES / project)) == EXPECTED_JS_TREE
+    assert [path.name for path in builder.get_manifest_files(JS_PACKAGES_FIXTURES / project) if path.is_file()] == [
+        "package.json", "package-lock.json"]
+
+
+def test_javascript_lockfiles_have_the_same_packages():
+    packages = JavaScriptDependencyTreeBuilder.read_lockfile_packages(
+        JS_PACKAGES_FIXTURES / "lockfile_v3" / "package-lock.json")
+
+    assert packages["node_modules/a/node_modules/c"] == ("c", ["f"])
+    for project in ("lockfile_v1", "lockfile_v2"):
+        other_packages = JavaScriptDependencyTreeBuilder.read_lockfile_packages(
+            JS_PACKAGES_FIXTURES / project / "package-lock.json")
+        assert {location: (name, sorted(dependencies)) for location, (name, dependencies) in other_packages.items()} \
+            == {location: (name, sorted(dependencies)) for location, (name, dependencies) in packages.items()}
+
+
+def test_javascript_tree_from_installed_packages(tmp_path):
+    builder = JavaScriptDependencyTreeBuilder()
+
+    assert sorted_tree(builder.build_tree(JS_PACKAGES_FIXTURES / "installed")) == EXPECTED_JS_TREE
+    # Without a lockfile, the tree isn't cached by the content of the manifest files
+    assert builder.get_manifest_files(JS_PACKAGES_FIXTURES / "installed") == []
+
+    # The hidden lockfile of node_modules is preferred to scanning the installed packages
+    project_path = tmp_path / "app"
+    shutil.copytree(JS_PACKAGES_FIXTURES / "installed", project_path)
+    shutil.copy(JS_PACKAGES_FIXTURES / "lockfile_v3" / "package-lock.json",
+                project_path / "node_modules" / ".package-lock.json")
+    shutil.rmtree(project_path / "node_modules" / "f")
+    assert sorted_tree(builder.build_tree(project_path)) == EXPECTED_JS_TREE
+
+
+def test_javascript_tree_without_package_json(tmp_path):
+    with pytest.raises(ValueError):
+        JavaScriptDependencyTreeBuilder().build_tree(tmp_path)
@@ -0,0 +1,94 @@
+import pytest
+from langchain_core.documents import Document
+
+import main
+from utils.document_store import DocumentStore
+from utils.document_store import write_document_store
+
+DOCUMENTS = [
+    Document(page_content="package main\n\nfunc main() {\n\tprintln(\"héllo\")\n}\n",
+             metadata={"source": "main.go", "language": "go", "content_type": "functions_classes"}),
+    Document(page_content="",
+             metadata={"source": "pkg/empty.go", "start_index": 0, "score": 0.5, "vendored": False,
+                       "parent": None}),
+    Document(page_content="function run() {}\n" * 100,
+             metadata={"source": "node_modules/a/index.js", "language": "js", "start_index": 1200,
+                       "duplicates": [{"source": "node_modules/b/index.js", "start_index": 3}],
+                       "ranges": {"lines": [1, 100], "name": "run"}, "tags": ["a", 1, None]}),
+    # String metadata that looks like JSON stays a string
+    Document(page_content="x", metadata={"source": "12", "language": "null"}),
+    Document(page_content="no metadata", metadata={}),
+]
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    store_path = tmp_path / "documents.pcds"
+    write_document_store(store_path, DOCUMENTS, parser_version=3)
+    return store_path
+
+
+def read_all(store: DocumentStore) -> list[Document]:
+    return list(store.documents())
+
+
+def test_round_trip(store_path):
+    with DocumentStore(store_path, parser_version=3) as store:
+        assert len(store) == len(DOCUMENTS)
+        assert store.parser_version == 3
+        documents = read_all(store)
+
+        # Each document is also readable alone
+        assert store[2].page_content == DOCUMENTS[2].page_content
+        assert store[3].metadata == {"source": "12", "language": "null"}
+        with pytest.raises(IndexError):
+            store[len(DOCUMENTS)]
+
+    assert [document.page_content for document in documents] == [document.page_content for document in DOCUMENTS]
+    assert [document.metadata for document in documents] == [document.metadata for document in DOCUMENTS]
+    for document, expected_document in zip(documents, DOCUMENTS):
+        for key, value in expected_document.metadata.items():
+            assert type(document.metadata[key]) is type(value)
+
+
+def test_round_trip_without_documents(tmp_path):
+    write_document_store(tmp_path / "empty.pcds", [], parser_version=1)
+
+    with DocumentStore(tmp_path / "empty.pcds") as store:
+        assert read_all(store) == []
+
+
+def test_other_parser_version_is_rejected(store_path, monkeypatch):
+    with pytest.raises(ValueError, match="parser version 3, expected 4"):
+        DocumentStore(store_path, parser_version=4)
+
+    # Any version is accepted when none is expected
+    with DocumentStore(store_path) as store:
+        assert store.parser_version == 3
+
+    monkeypatch.setattr(main, "PARSER_VERSION", 4)
+    assert main.load_cached_documents(store_path) is None
+    assert main.stream_cached_documents(store_path) is None
+    monkeypatch.setattr(main, "PARSER_VERSION", 3)
+    assert main.load_cached_documents(store_path) == DOCUMENTS
+
+
+def test_truncated_store_is_rejected(store_path):
+    content = store_path.read_bytes()
+
+    for length in range(len(content)):
+        store_path.write_bytes(content[:length])
+        # Either opening the store or reading its documents fails, a truncated store never yields documents silently
+        with pytest.raises(ValueError):
+            with DocumentStore(store_path) as store:
+                read_all(store)
+
+    store_path.write_bytes(content[:len(content) - 1])
+    assert main.load_cached_documents(store_path) is None
+
+
+def test_other_files_are_rejected(tmp_path):
+    (tmp_path / "other.pcds").write_bytes(b"PK\x03\x04" + bytes(100))
+
+    with pytest.raises(ValueError, match="not a document store"):
+        DocumentStore(tmp_path / "other.pcds")
@@ -0,0 +1,114 @@
+from hashlib import sha256
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from utils.documents_loader import DocumentEmbedding
+from utils.embedding_cache import get_embedding_model_identity
+
+VENDORED_FUNCTION = "func Verify(token string) bool {\n\treturn len(strings.Split(token, \".\")) == 3\n}"
+
+
+class HashEmbeddings(Embeddings):
+    """
+    A deterministic embedding, derived from the hash of each text, counting the embedded texts.
+    """
+
+    def __init__(self, model: str = "hash-embeddings"):
+        self.model = model
+        self.embedded_texts = []
+
+    @staticmethod
+    def _embed(text: str) -> list[float]:
+        return [byte / 255 for byte in sha256(text.encode()).digest()[:16]]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.embedded_texts.extend(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+@pytest.fixture(name="embedding")
+def fixture_embedding():
+    return HashEmbeddings()
+
+
+def create_document_embedding(tmp_path, embedding, **kwargs):
+    return DocumentEmbedding(embedding=embedding, vdb_directory=tmp_path / "vdb", **kwargs)
+
+
+def test_search_results_expand_to_every_path_of_duplicated_chunks(tmp_path, embedding):
+    documents = [
+        Document(page_content=VENDORED_FUNCTION, metadata={"source": "vendor/example.com/jwt/verify.go"}),
+        Document(page_content=VENDORED_FUNCTION, metadata={"source": "third_party/jwt/verify.go"}),
+    ]
+    document_embedding = create_document_embedding(tmp_path, embedding, embedding_cache_path=None)
+    vdb_path = tmp_path / "vdb" / "app"
+
+    created_db = document_embedding._create_vdb_from_documents(documents, vdb_path)
+    loaded_db = document_embedding.load_vdb(vdb_path)
+
+    # The duplicated chunk is embedded once
+    assert embedding.embedded_texts == [VENDORED_FUNCTION]
+    for db in (created_db, loaded_db):
+        results = db.similarity_search(VENDORED_FUNCTION, k=1)
+        assert sorted(doc.metadata["source"] for doc in results) == ["third_party/jwt/verify.go",
+                                                                      "vendor/example.com/jwt/verify.go"]
+        assert all(doc.page_content == VENDORED_FUNCTION for doc in results)
+
+
+def create_documents(contents: list[str]) -> list[Document]:
+    return [Document(page_content=content, metadata={"source": f"pkg/file_{i}.go"})
+            for i, content in enumerate(contents)]
+
+
+def create_cached_vdb(tmp_path, embedding, name, contents, **kwargs):
+    document_embedding = create_document_embedding(tmp_path, embedding,
+                                                   embedding_cache_path=tmp_path / "embeddings.sqlite", **kwargs)
+    return document_embedding._create_vdb_from_documents(create_documents(contents), tmp_path / "vdb" / name)
+
+
+def test_cached_vectors_are_only_embedded_once(tmp_path, embedding):
+    contents = ["func A() {}", "func B() {}", "func C() {}"]
+
+    create_cached_vdb(tmp_path, embedding, "first", contents)
+    assert sorted(embedding.embedded_texts) == contents
+
+    # The second VDB only embeds the chunks that were never embedded
+    embedding.embedded_texts.clear()
+    db = create_cached_vdb(tmp_path, embedding, "second", [*contents, "func D() {}"])
+    assert embedding.embedded_texts == ["func D() {}"]
+    assert db.index.ntotal == 4
+    assert db.similarity_search("func B() {}", k=1)[0].page_content == "func B() {}"
+
+
+def test_cached_vectors_are_not_reused_by_other_models(tmp_path):
+    contents = ["func A() {}", "func B() {}"]
+    create_cached_vdb(tmp_path, HashEmbeddings(model="first-model"), "first", contents)
+
+    other_embedding = HashEmbeddings(model="second-model")
+    create_cached_vdb(tmp_path, other_embedding, "second", contents)
+    assert sorted(other_embedding.embedded_texts) == contents
+
+    # An explicit model identity tells apart models behind the same name
+    identified_embedding = HashEmbeddings(model="first-model")
+    create_cached_vdb(tmp_path, identified_embedding, "third", contents, embedding_model_identity="first-model-v2")
+    assert sorted(identified_embedding.embedded_texts) == contents
+
+
+def test_embeddings_without_model_name_need_a_model_identity(tmp_path):
+    embedding = HashEmbeddings()
+    del embedding.model
+
+    with pytest.raises(ValueError):
+        get_embedding_model_identity(embedding)
+    with pytest.raises(ValueError):
+        create_cached_vdb(tmp_path, embedding, "app", ["func A() {}"])
+    assert embedding.embedded_texts == []
+
+    assert get_embedding_model_identity(embedding, "hash-v1") == "HashEmbeddings:hash-v1"
+    create_cached_vdb(tmp_path, embedding, "app", ["func A() {}"], embedding_model_identity="hash-v1")
+    assert embedding.embedded_texts == ["func A() {}"]
@@ -0,0 +1,119 @@
+import pytest
+from langchain_core.documents import Document
+
+from functions_parsers.golang_functions_parsers import GoLanguageFunctionsParser
+from functions_parsers.javascript_functions_parsers import JavaScriptFunctionsParser
+from utils import instrumentation
+
+
+@pytest.fixture
+def recorder(monkeypatch) -> instrumentation.Recorder:
+    recorder = instrumentation.Recorder()
+    monkeypatch.setattr(instrumentation, "_recorder", recorder)
+    return recorder
+
+
+def test_go_parser_counts_regex_evaluations(recorder):
+    parser = GoLanguageFunctionsParser()
+    caller = Document(page_content="func Run(value int) {\n\tvar limit int\n\tresult := Clamp(value, limit)\n}",
+                      metadata={"source": "main.go"})
+    main_file = Document(page_content="package main\n\n" + caller.page_content, metadata={"source": "main.go"})
+
+    parser.create_map_of_local_vars([caller])
+    local_vars_evaluations = recorder.counters["parser.regex_evaluations"]
+    parser.search_for_called_function(caller_function=caller, callee_function="Clamp", callee_function_package="main",
+                                      code_documents={"main.go": main_file}, type_documents=[],
+                                      callee_function_file_name="main.go", fields_of_types={},
+                                      functions_local_variables_index={})
+
+    # The search of the parameters lists, of the parameters of each list, and the `var` block check
+    assert local_vars_evaluations == 3
+    assert recorder.counters["parser.regex_evaluations"] > local_vars_evaluations
+
+
+def test_javascript_parser_counts_regex_evaluations(recorder):
+    parser = JavaScriptFunctionsParser()
+    caller = Document(page_content="function run(value) {\n  const limit = 10;\n  return clamp(value, limit);\n}",
+                      metadata={"source": "index.js"})
+
+    parser.create_map_of_local_vars([caller])
+    local_vars_evaluations = recorder.counters["parser.regex_evaluations"]
+    parser.search_for_called_function(caller_function=caller, callee_function="clamp", callee_function_package="app",
+                                      code_documents={"index.js": caller}, type_documents=[],
+                                      callee_function_file_name="index.js", fields_of_types={},
+                                      functions_local_variables_index={})
+
+    # The arrow parameter match, the parameter and two regexes per body row
+    assert local_vars_evaluations == 2 + 2 * 3
+    assert recorder.counters["parser.regex_evaluations"] > local_vars_evaluations
+
+
+def javascript_function(content: str, source: str) -> Document:
+    return Document(page_content=content, metadata={"source": source, "content_type": "functions_classes"})
+
+
+def is_javascript_call_resolved(caller_file: str, caller_source: str, callee_function: str, callee_package: str,
+                                callee_file_name: str) -> bool:
+    """
+    Returns whether the JavaScript parser resolves a call of the last function of a file to a callee.
+    """
+    parser = JavaScriptFunctionsParser()
+    caller = javascript_function(caller_file[caller_file.rfind("\nfunction") + 1:], caller_source)
+    return parser.search_for_called_function(
+        caller_function=caller, callee_function=callee_function, callee_function_package=callee_package,
+        code_documents={caller_source: Document(page_content=caller_file, metadata={"source": caller_source})},
+        type_documents=[], callee_function_file_name=callee_file_name, fields_of_types={},
+        functions_local_variables_index=parser.create_map_of_local_vars([caller]))
+
+
+@pytest.mark.parametrize("imports, call", [
+    ("const { clamp } = require('lodash');", "clamp(value, 0, 10)"),
+    ("const clamp = require('lodash/clamp');", "clamp(value, 0, 10)"),
+    ("import { clamp } from 'lodash';", "clamp(value, 0, 10)"),
+    ("import * as _ from 'lodash';", "_.clamp(value, 0, 10)"),
+    ("const _ = require('lodash');", "_.clamp(value, 0, 10)"),
+    ("const _ = require('lodash');", "const utils = _;\n  return utils.clamp(value, 0, 10)"),
+])
+def test_javascript_calls_resolved_through_imports(imports, call):
+    caller_file = f"{imports}\n\nfunction run(value) {{\n  {call};\n}}\n"
+
+    assert is_javascript_call_resolved(caller_file, "src/index.js", "clamp", "lodash",
+                                       "node_modules/lodash/clamp.js")
+    # The same call of a function of another package
+    assert not is_javascript_call_resolved(caller_file, "src/index.js", "clamp", "underscore",
+                                           "node_modules/underscore/underscore.js")
+
+
+def test_javascript_calls_of_unimported_functions_are_not_resolved():
+    caller_file = "const { clamp } = require('underscore');\n\nfunction run(value) {\n  clamp(value);\n}\n"
+
+    assert not is_javascript_call_resolved(caller_file, "src/index.js", "clamp", "lodash",
+                                           "node_modules/lodash/clamp.js")
+
+
+def test_javascript_calls_resolved_through_relative_imports():
+    caller_file = "const { parse } = require('./parser');\n\nfunction run(text) {\n  return parse(text);\n}\n"
+
+    # Relative modules resolve to files of the caller's package
+    assert is_javascript_call_resolved(caller_file, "node_modules/purl/lib/index.js", "parse", "purl",
+                                       "node_modules/purl/lib/parser.js")
+    assert not is_javascript_call_resolved(caller_file, "node_modules/purl/lib/index.js", "parse", "other",
+                                           "node_modules/other/lib/parser.js")
+    assert is_javascript_call_resolved(caller_file, "src/index.js", "parse", "app", "src/parser.js")
+    assert not is_javascript_call_resolved(caller_file, "src/index.js", "parse", "app", "lib/parser.js")
+
+
+def test_javascript_requires_in_the_function_shadow_the_file_imports():
+    caller_file = ("const { parse } = require('./parser');\n\n"
+                   "function run(text) {\n  const { parse } = require('semver');\n  return parse(text);\n}\n")
+
+    assert is_javascript_call_resolved(caller_file, "src/index.js", "parse", "semver",
+                                       "node_modules/semver/functions/parse.js")
+    assert not is_javascript_call_resolved(caller_file, "src/index.js", "parse", "app", "src/parser.js")
+
+
+def test_javascript_functions_are_all_exported():
+    parser = JavaScriptFunctionsParser()
+
+    # Also reachable from other modules through exported objects, classes and callbacks
+    assert parser.is_exported_function(javascript_function("function helper() {\n}", "node_modules/a/index.js"))
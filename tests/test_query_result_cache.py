@@ -0,0 +1,44 @@
+import gc
+import weakref
+
+from langchain_core.documents import Document
+
+from utils.query_result_cache import QueryResultCache
+
+
+class FakeLanguageParser:
+    @staticmethod
+    def get_function_name(code_unit: Document) -> str:
+        return code_unit.page_content.split("(")[0]
+
+
+class FakeRetriever:
+    def __init__(self):
+        self.language_parser = FakeLanguageParser()
+        self.documents = [Document(page_content="Clamp(x)", metadata={"source": "a.go"}),
+                          Document(page_content="Clamp(y)", metadata={"source": "a.go"}),
+                          Document(page_content="Main()", metadata={"source": "main.go"})]
+
+
+def test_functions_by_name_are_indexed_once_per_retriever(tmp_path):
+    cache = QueryResultCache(tmp_path / "query_results.sqlite")
+    retriever = FakeRetriever()
+
+    functions_by_name = cache._get_functions_by_name(retriever)
+
+    assert functions_by_name == {("a.go", "Clamp"): retriever.documents[:2],
+                                 ("main.go", "Main"): retriever.documents[2:]}
+    assert cache._get_functions_by_name(retriever) is functions_by_name
+
+
+def test_functions_by_name_do_not_keep_retrievers_alive(tmp_path):
+    cache = QueryResultCache(tmp_path / "query_results.sqlite")
+    retriever = FakeRetriever()
+    cache._get_functions_by_name(retriever)
+    retriever_ref = weakref.ref(retriever)
+
+    del retriever
+    gc.collect()
+
+    assert retriever_ref() is None
+    assert cache._functions_by_name == {}
@@ -0,0 +1,293 @@
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from git import GitCommandError
+from git import Repo
+
+import main
+from utils import instrumentation
+from utils.dep_tree import Ecosystem
+from utils.documents_loader import DocumentEmbedding
+from utils.documents_loader import SourceDocumentsInfo
+from utils.git_mirrors import GIT_MIRROR_PATH_ENV
+from utils.git_mirrors import GitMirrorPool
+from utils.git_mirrors import get_alternates_path
+from utils.git_mirrors import has_missing_alternates
+from utils.source_code_git_loader import SourceCodeGitLoader
+from utils.source_code_git_loader import get_sparse_checkout_patterns
+
+INCLUDE = ["**/*.go"]
+EXCLUDE = ["**/*test*", "**/*tst*"]
+
+REMOTE_FILES = {
+    "main.go": "package main\n",
+    "pkg/x.go": "package pkg\n",
+    "pkg/x_test.go": "package pkg\n",
+    "pkg/testdata/fixture.go": "package testdata\n",
+    "testify/assert.go": "package assert\n",
+    "sub/deep/y.go": "package deep\n",
+    "docs/big.bin": "binary\n" * 1000,
+    "README.md": "# app\n",
+    "go.mod": "module example.com/app\n",
+    "go.sum": "",
+}
+
+
+def git(cwd: Path, *args: str) -> str:
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture(autouse=True)
+def git_environment(tmp_path, monkeypatch):
+    # The loader adds its clones to the safe directories of the global git config
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(tmp_path / "home" / ".gitconfig"))
+    (tmp_path / "home").mkdir()
+    monkeypatch.delenv(GIT_MIRROR_PATH_ENV, raising=False)
+    for variable in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(variable, "test")
+    for variable in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(variable, "test@example.com")
+
+
+def create_remote(path: Path, allow_filter: bool = True, commits: int = 1) -> list[str]:
+    """
+    Create a repository served through file://, with `commits` commits of REMOTE_FILES, and returns their ids, the
+    latest first.
+    """
+    path.mkdir()
+    git(path, "init", "-q", "-b", "main")
+    for commit in range(commits):
+        for file_path, content in REMOTE_FILES.items():
+            (path / file_path).parent.mkdir(parents=True, exist_ok=True)
+            (path / file_path).write_text(f"{content}// {commit}\n")
+        git(path, "add", "-A")
+        git(path, "commit", "-q", "-m", f"commit {commit}")
+    git(path, "config", "uploadpack.allowAnySHA1InWant", "true")
+    if allow_filter:
+        git(path, "config", "uploadpack.allowFilter", "true")
+    return git(path, "rev-list", "HEAD").split()
+
+
+@pytest.fixture
+def recorder(monkeypatch) -> instrumentation.Recorder:
+    recorder = instrumentation.Recorder()
+    monkeypatch.setattr(instrumentation, "_recorder", recorder)
+    return recorder
+
+
+def load(tmp_path: Path, remote: str, ref: str, clone: str = "clone", **kwargs) -> SourceCodeGitLoader:
+    loader = SourceCodeGitLoader(repo_path=tmp_path / clone, clone_url=f"file://{tmp_path / remote}", ref=ref,
+                                 include=INCLUDE, exclude=EXCLUDE, **kwargs)
+    loader.load_repo()
+    return loader
+
+
+def get_yielded_paths(loader: SourceCodeGitLoader) -> set[str]:
+    return {blob.metadata["source"] for blob in loader.yield_blobs()}
+
+
+def is_object_local(repo_path: Path, object_id: str) -> bool:
+    return subprocess.run(["git", "cat-file", "-e", object_id], cwd=repo_path, capture_output=True,
+                          env={**os.environ, "GIT_NO_LAZY_FETCH": "1"}).returncode == 0
+
+
+def get_commits_count(repo_path: Path) -> int:
+    return get_commits_count_of(repo_path, "HEAD")
+
+
+def get_commits_count_of(repo_path: Path, commit: str) -> int:
+    return int(git(repo_path, "rev-list", "--count", commit))
+
+
+def test_sparse_checkout_patterns():
+    assert get_sparse_checkout_patterns(INCLUDE, EXCLUDE) == ["/**/*.go", "!/**/*test*", "!/**/*tst*"]
+    assert get_sparse_checkout_patterns(["/go.mod", "*.md"], None) == ["/go.mod", "/*.md"]
+    assert get_sparse_checkout_patterns(None, EXCLUDE) == ["/*"]
+
+
+def test_partial_clone_fetches_only_checked_out_contents(tmp_path):
+    commits = create_remote(tmp_path / "remote")
+
+    load(tmp_path, "remote", commits[0])
+
+    clone_path = tmp_path / "clone"
+    assert git(clone_path, "rev-parse", "HEAD") == commits[0]
+    assert git(clone_path, "config", "remote.origin.partialclonefilter") == "blob:none"
+    assert is_object_local(clone_path, "HEAD:pkg/x.go")
+    assert not is_object_local(clone_path, "HEAD:docs/big.bin")
+    assert not (clone_path / "docs").exists()
+    assert get_commits_count(clone_path) == 1
+
+
+def test_clone_without_filter_support_sends_all_contents(tmp_path):
+    commits = create_remote(tmp_path / "remote", allow_filter=False)
+
+    loader = load(tmp_path, "remote", commits[0])
+
+    clone_path = tmp_path / "clone"
+    assert is_object_local(clone_path, "HEAD:docs/big.bin")
+    assert get_yielded_paths(loader) == {"main.go", "pkg/x.go", "pkg/testdata/fixture.go", "testify/assert.go",
+                                         "sub/deep/y.go"}
+
+
+def test_failed_partial_clone_falls_back_to_full_clone(tmp_path, monkeypatch):
+    commits = create_remote(tmp_path / "remote")
+    clone_from = Repo.clone_from
+
+    def clone_from_without_filter(url, to_path, **kwargs):
+        if "filter" in kwargs:
+            Path(to_path).mkdir(parents=True)
+            raise GitCommandError(["git", "clone"], 128, b"fatal: filtering not supported")
+        return clone_from(url, to_path, **kwargs)
+
+    monkeypatch.setattr(Repo, "clone_from", clone_from_without_filter)
+
+    loader = load(tmp_path, "remote", commits[0])
+
+    clone_path = tmp_path / "clone"
+    assert is_object_local(clone_path, "HEAD:docs/big.bin")
+    assert "main.go" in get_yielded_paths(loader)
+
+
+def test_sparse_checkout_yields_the_files_of_a_full_checkout(tmp_path):
+    commits = create_remote(tmp_path / "remote")
+
+    sparse_loader = load(tmp_path, "remote", commits[0], clone="sparse")
+    full_loader = load(tmp_path, "remote", commits[0], clone="full", partial_clone=False, sparse_checkout=False)
+
+    # The directories matched by an exclude pattern, e.g. testify and testdata by **/*test*, keep their files in both
+    assert get_yielded_paths(sparse_loader) == get_yielded_paths(full_loader) == {
+        "main.go", "pkg/x.go", "pkg/testdata/fixture.go", "testify/assert.go", "sub/deep/y.go"}
+    checked_out_paths = {str(path.relative_to(tmp_path / "sparse")) for path in (tmp_path / "sparse").rglob("*")
+                         if path.is_file() and ".git" not in path.parts}
+    assert checked_out_paths == get_yielded_paths(sparse_loader)
+
+
+def test_clone_at_the_commit_is_not_fetched(tmp_path, recorder, monkeypatch):
+    commits = create_remote(tmp_path / "remote")
+    load(tmp_path, "remote", commits[0])
+
+    def fail_fetch(self, repo, ref):
+        raise AssertionError(f"{ref} was fetched")
+
+    monkeypatch.setattr(SourceCodeGitLoader, "_fetch", fail_fetch)
+    load(tmp_path, "remote", commits[0])
+
+    assert recorder.counters["git.up_to_date"] == 1
+
+
+def test_missing_commit_is_fetched_without_its_history(tmp_path):
+    commits = create_remote(tmp_path / "remote", commits=5)
+    load(tmp_path, "remote", commits[0])
+
+    loader = load(tmp_path, "remote", commits[3])
+
+    clone_path = tmp_path / "clone"
+    assert git(clone_path, "rev-parse", "HEAD") == commits[3]
+    assert get_commits_count(clone_path) == 1
+    assert not is_object_local(clone_path, commits[4])
+
+    changed, deleted = loader.changed_paths(commits[1])
+
+    assert changed == {"main.go", "pkg/x.go", "pkg/x_test.go", "pkg/testdata/fixture.go", "testify/assert.go",
+                       "sub/deep/y.go", "docs/big.bin", "README.md", "go.mod", "go.sum"}
+    assert deleted == set()
+    assert not is_object_local(clone_path, commits[2])
+
+
+def test_manifests_are_checked_out_apart_from_the_sources(tmp_path, monkeypatch):
+    commits = create_remote(tmp_path / "remote")
+    clone_url = f"file://{tmp_path / 'remote'}"
+    monkeypatch.setattr(main, "MANIFESTS_DIRECTORY", str(tmp_path / "manifests"))
+    source_info = SourceDocumentsInfo(type="code", git_repo=clone_url, ref=commits[0],
+                                      include=main.get_includes(Ecosystem.GO), exclude=main.get_exclude())
+    sources_path = DocumentEmbedding(embedding=None, git_directory=tmp_path / "sources").get_repo_path(source_info)
+    SourceCodeGitLoader(repo_path=sources_path, clone_url=clone_url, ref=commits[0], include=source_info.include,
+                        exclude=source_info.exclude).load_repo()
+
+    main.checkout_manifests(clone_url, commits[0], Ecosystem.GO)
+
+    manifest_path = Path(main.get_manifest_path(clone_url))
+    assert manifest_path != sources_path
+    assert (manifest_path / "go.mod").is_file() and not (manifest_path / "main.go").exists()
+    assert (sources_path / "main.go").is_file() and not (sources_path / "go.mod").exists()
+
+
+def test_clones_share_the_objects_of_one_mirror(tmp_path, recorder):
+    commits = create_remote(tmp_path / "remote")
+    mirror_pool = GitMirrorPool(tmp_path / "mirrors")
+
+    first_loader = load(tmp_path, "remote", commits[0], clone="first", mirror_pool=mirror_pool)
+    second_loader = load(tmp_path, "remote", commits[0], clone="second", mirror_pool=mirror_pool)
+
+    mirror_objects_path = str((mirror_pool.get_mirror_path(f"file://{tmp_path / 'remote'}") / "objects").absolute())
+    for clone in ("first", "second"):
+        clone_path = tmp_path / clone
+        assert get_alternates_path(clone_path / ".git").read_text().splitlines() == [mirror_objects_path]
+        assert git(clone_path, "rev-parse", "HEAD") == commits[0]
+        # The objects are only in the mirror
+        assert git(clone_path, "count-objects", "-v").splitlines()[0] == "count: 0"
+        assert not list((clone_path / ".git" / "objects" / "pack").glob("*.pack"))
+    assert get_yielded_paths(first_loader) == get_yielded_paths(second_loader)
+    assert len(list(mirror_pool.root.glob("*.git"))) == 1
+    assert recorder.counters["git.mirror_misses"] == 1
+    assert recorder.counters["git.mirror_hits"] == 1
+
+
+def test_fetching_a_mirrored_commit_again_is_a_hit(tmp_path, recorder):
+    commits = create_remote(tmp_path / "remote", commits=2)
+    mirror_pool = GitMirrorPool(tmp_path / "mirrors")
+    clone_url = f"file://{tmp_path / 'remote'}"
+
+    assert mirror_pool.fetch(clone_url, commits[1]) == commits[1]
+    assert mirror_pool.fetch(clone_url, commits[1][:12]) == commits[1]
+    assert recorder.counters["git.mirror_misses"] == 1
+    assert recorder.counters["git.mirror_hits"] == 1
+
+    # Branches may move, they are always fetched
+    assert mirror_pool.fetch(clone_url, "main") == commits[0]
+    assert recorder.counters["git.mirror_misses"] == 2
+
+
+def test_sharing_objects_marks_the_mirrored_commits_shallow(tmp_path):
+    commits = create_remote(tmp_path / "remote", commits=3)
+    mirror_pool = GitMirrorPool(tmp_path / "mirrors")
+    clone_url = f"file://{tmp_path / 'remote'}"
+    mirror_pool.fetch(clone_url, commits[0])
+    mirror_pool.fetch(clone_url, commits[1])
+
+    repo = Repo.init(tmp_path / "clone", mkdir=True)
+    mirror_pool.share_objects(repo, clone_url)
+
+    shallow_commits = (tmp_path / "clone" / ".git" / "shallow").read_text().split()
+    assert sorted(shallow_commits) == sorted(commits[:2])
+    # Without the shallow commits, the missing parents of the fetched commits break walking their history
+    assert get_commits_count_of(tmp_path / "clone", commits[0]) == 1
+    assert get_commits_count_of(tmp_path / "clone", commits[1]) == 1
+
+    # Sharing again doesn't repeat the commits
+    mirror_pool.share_objects(repo, clone_url)
+    assert (tmp_path / "clone" / ".git" / "shallow").read_text().split() == shallow_commits
+    assert len(get_alternates_path(repo.git_dir).read_text().splitlines()) == 1
+
+
+def test_clone_of_a_deleted_mirror_is_cloned_again(tmp_path, recorder):
+    commits = create_remote(tmp_path / "remote")
+    mirror_pool = GitMirrorPool(tmp_path / "mirrors")
+    load(tmp_path, "remote", commits[0], mirror_pool=mirror_pool)
+
+    shutil.rmtree(mirror_pool.get_mirror_path(f"file://{tmp_path / 'remote'}"))
+    assert has_missing_alternates(tmp_path / "clone" / ".git")
+
+    loader = load(tmp_path, "remote", commits[0], mirror_pool=mirror_pool)
+
+    clone_path = tmp_path / "clone"
+    assert not has_missing_alternates(clone_path / ".git")
+    assert git(clone_path, "rev-parse", "HEAD") == commits[0]
+    assert is_object_local(clone_path, "HEAD:pkg/x.go")
+    assert "pkg/x.go" in get_yielded_paths(loader)
+    assert recorder.counters["git.mirror_misses"] == 2
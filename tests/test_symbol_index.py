@@ -0,0 +1,107 @@
+import os
+import re
+
+import pytest
+from langchain_core.documents import Document
+
+import main
+from functions_parsers.golang_functions_parsers import GoLanguageFunctionsParser
+from utils.symbol_index import SymbolIndex
+from utils.symbol_index import traverse_all_parameters
+
+GO_JOSE_INPUT = 'github.com/go-jose/go-jose/v4,strings.Split(token, ".")'
+CRYPTO_RSA_INPUT = "crypto/rsa,Verify"
+
+DOCUMENTS = [
+    Document(page_content="func main() {\n\tparts := strings.Split(os.Args[1], \".\")\n\tfmt.Println(parts)\n}",
+             metadata={"source": "cmd/main.go"}),
+    Document(page_content="func (b builder) Token() (string, error) {\n"
+                          "\t// The token is split by strings.Split(token, \".\") in ParseSigned\n"
+                          "\treturn b.token, nil\n}",
+             metadata={"source": "vendor/github.com/go-jose/go-jose/v4/jwt/builder.go"}),
+    Document(page_content="func ParseSigned(s string) (*JSONWebToken, error) {\n"
+                          "\ttoken := strings.TrimSpace(s)\n"
+                          "\tparts := strings.Split(token, \".\")\n"
+                          "\tif len(parts) != 3 {\n\t\treturn nil, errInvalidToken\n\t}\n"
+                          "\treturn parse(parts)\n}",
+             metadata={"source": "vendor/github.com/go-jose/go-jose/v4/jwt/jwt.go"}),
+    Document(page_content="func parseCompact(token string) (*JSONWebSignature, error) {\n"
+                          "\tparts := strings.Split(token, \".\")\n\treturn parseParts(parts)\n}",
+             metadata={"source": "vendor/github.com/go-jose/go-jose/v3/jws.go"}),
+]
+
+
+def infer_if_short_package_name_match(package: str, package_names: list[str], final_package: set[str]) -> bool:
+    match = re.search(r"[./][vV][1-9]+$", package)
+    if match:
+        short_package_name = package.split(match.group())[-2].split("/")[-1]
+    else:
+        short_package_name = package.split("/")[-1]
+    for current_package in package_names:
+        if short_package_name in current_package:
+            final_package.add(current_package)
+            return True
+    return False
+
+
+def baseline_extract_using_function_name(input_string: str, documents: list[Document], lang_parser) -> str:
+    """
+    The resolution of main.extract_using_function_name before the symbol index, scanning all the documents.
+    """
+    package, function = input_string.split(",", 1)
+
+    final_package = set()
+    package_functions = [doc for doc in documents if
+                         lang_parser.get_package_name(doc, package)
+                         or infer_if_short_package_name_match(package, lang_parser.get_package_names(doc),
+                                                              final_package)]
+    the_final_package = list(final_package)
+    if len(the_final_package) > 0 and the_final_package[0] != package:
+        package = the_final_package[0]
+
+    if function.__contains__(".") and "(" or ")" in function:
+        function_builder = traverse_all_parameters(function.rfind(")"), function.find("(") + 1, function)
+    else:
+        return input_string
+    new_function_name = ""
+    comment_line_character = lang_parser.get_comment_line_notation()
+    for func in package_functions:
+        if match := re.search(rf"{function_builder}", func.page_content, flags=re.MULTILINE):
+            current_offset = match.start() - 1
+            while func.page_content[current_offset] != os.linesep:
+                current_offset -= 1
+            if not func.page_content[current_offset: match.start()].strip().startswith(comment_line_character):
+                new_function_name = lang_parser.get_function_name(func)
+                break
+    return f"{package},{new_function_name}"
+
+
+@pytest.fixture(name="symbol_index")
+def fixture_symbol_index() -> SymbolIndex:
+    return SymbolIndex(DOCUMENTS, GoLanguageFunctionsParser())
+
+
+def test_call_expression_resolves_to_the_calling_function(symbol_index):
+    resolved_input = main.extract_using_function_name(GO_JOSE_INPUT, symbol_index)
+    baseline_input = baseline_extract_using_function_name(GO_JOSE_INPUT, DOCUMENTS, GoLanguageFunctionsParser())
+
+    # The commented call is skipped. The package of the input is kept, the baseline picked any package sharing its
+    # short name, e.g. "github.com/go-jose/v3"
+    assert resolved_input == "github.com/go-jose/go-jose/v4,ParseSigned"
+    assert resolved_input.split(",", 1)[1] == baseline_input.split(",", 1)[1]
+
+
+def test_function_name_input_is_kept(symbol_index):
+    resolved_input = main.extract_using_function_name(CRYPTO_RSA_INPUT, symbol_index)
+
+    assert resolved_input == CRYPTO_RSA_INPUT
+    assert resolved_input == baseline_extract_using_function_name(CRYPTO_RSA_INPUT, DOCUMENTS,
+                                                                  GoLanguageFunctionsParser())
+
+
+def test_call_expression_without_caller(symbol_index):
+    missing_call_input = 'github.com/go-jose/go-jose/v4,strings.Join(parts, ".")'
+
+    assert main.extract_using_function_name(missing_call_input, symbol_index) == "github.com/go-jose/go-jose/v4,"
+    assert baseline_extract_using_function_name(missing_call_input, DOCUMENTS,
+                                                GoLanguageFunctionsParser()).endswith(",")
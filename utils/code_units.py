@@ -0,0 +1,136 @@
+import sys
+import typing
+from collections.abc import Mapping
+from enum import Enum
+
+if typing.TYPE_CHECKING:
+    from langchain_core.documents import Document  # pragma: no cover
+
+
+class ContentType(Enum):
+    FUNCTIONS_CLASSES = "functions_classes"
+    SIMPLIFIED_CODE = "simplified_code"
+
+
+_CONTENT_TYPES = {content_type.value: content_type for content_type in ContentType}
+
+_SLOT_METADATA_KEYS = ("source", "content_type", "language", "containing_scope")
+
+
+def _intern(value: str | None) -> str | None:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class CodeUnitMetadata(Mapping):
+    """
+    A read only `Document.metadata` like view over the fields of a `CodeUnit`, so code written against LangChain
+    documents (`unit.metadata['source']`, `unit.metadata.get('content_type')`) works unchanged with code units.
+    """
+
+    __slots__ = ("_unit",)
+
+    def __init__(self, unit: "CodeUnit"):
+        self._unit = unit
+
+    def __getitem__(self, key: str):
+        unit = self._unit
+        if key == "source":
+            return unit.source
+        elif key == "content_type" and unit.content_type is not None:
+            return unit.content_type.value
+        elif key == "language" and unit.language is not None:
+            return unit.language
+        elif key == "containing_scope" and unit.containing_scope is not None:
+            return unit.containing_scope
+        elif unit.extra_metadata is not None and key in unit.extra_metadata:
+            return unit.extra_metadata[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> typing.Iterator[str]:
+        unit = self._unit
+        yield "source"
+        if unit.content_type is not None:
+            yield "content_type"
+        if unit.language is not None:
+            yield "language"
+        if unit.containing_scope is not None:
+            yield "containing_scope"
+        if unit.extra_metadata is not None:
+            yield from unit.extra_metadata
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class CodeUnit:
+    """
+    A compact record of a function, type or simplified file produced by the code segmentation, used internally instead
+    of a LangChain `Document` with its own metadata dict.
+
+    Source paths and languages are interned, the content type is an enum, and the content is stored as offsets into
+    the text of the file it was segmented from, which is shared by all the units of that file. The unit exposes
+    `page_content` and `metadata` like a `Document`, and is converted to one with `to_document` only when returned to
+    callers.
+    """
+
+    __slots__ = ("source", "content_type", "language", "containing_scope", "extra_metadata", "_text", "_start",
+                 "_end")
+
+    def __init__(self,
+                 source: str,
+                 text: str,
+                 start: int = 0,
+                 end: int | None = None,
+                 content_type: ContentType | None = None,
+                 language: str | None = None,
+                 containing_scope: str | None = None,
+                 extra_metadata: dict | None = None):
+        self.source = _intern(source)
+        self.content_type = content_type
+        self.language = _intern(language)
+        self.containing_scope = containing_scope
+        self.extra_metadata = extra_metadata or None
+        self._text = text
+        self._start = start
+        self._end = len(text) if end is None else end
+
+    @classmethod
+    def from_text(cls, source: str, text: str, content: str, **kwargs) -> "CodeUnit":
+        """
+        Create a code unit for `content`, stored as offsets into `text` if it is a part of it, otherwise on its own.
+        """
+        start = text.find(content)
+        if start == -1:
+            return cls(source, content, **kwargs)
+        return cls(source, text, start, start + len(content), **kwargs)
+
+    @classmethod
+    def from_document(cls, document: "Document") -> "CodeUnit":
+        metadata = document.metadata
+        content_type = metadata.get("content_type")
+        return cls(source=metadata.get("source"),
+                   text=document.page_content,
+                   content_type=_CONTENT_TYPES.get(content_type),
+                   language=metadata.get("language"),
+                   containing_scope=metadata.get("containing_scope"),
+                   extra_metadata={key: value for key, value in metadata.items()
+                                   if key not in _SLOT_METADATA_KEYS or
+                                   (key == "content_type" and content_type not in _CONTENT_TYPES)})
+
+    @property
+    def page_content(self) -> str:
+        # Slicing the whole string returns the string itself without copying it
+        return self._text[self._start:self._end]
+
+    @property
+    def metadata(self) -> CodeUnitMetadata:
+        return CodeUnitMetadata(self)
+
+    def to_document(self) -> "Document":
+        from langchain_core.documents import Document
+
+        return Document(page_content=self.page_content, metadata=dict(self.metadata))
+
+    def __repr__(self):
+        return f"CodeUnit(source={self.source!r}, content_type={self.content_type}, start={self._start}, " \
+               f"end={self._end})"
@@ -0,0 +1,32 @@
+import typing
+
+from langchain_community.vectorstores.faiss import FAISS
+from langchain_core.documents import Document
+
+from .documents_loader import expand_duplicate_chunks
+
+
+class DeduplicatedFAISS(FAISS):
+    """
+    A FAISS database of chunks merged by `deduplicate_chunks`. Each search result standing for several chunks with the
+    same content is expanded to a document per originating chunk, with the same score, so the results reach every path
+    of the duplicated code (e.g. vendored copies) although its text is embedded and stored once.
+    """
+
+    @staticmethod
+    def _expand_results(docs_and_scores: list[tuple[Document, float]]) -> list[tuple[Document, float]]:
+        return [(expanded_doc, score)
+                for doc, score in docs_and_scores
+                for expanded_doc in expand_duplicate_chunks([doc])]
+
+    def similarity_search_with_score_by_vector(self, embedding: list[float], k: int = 4,
+                                               filter: typing.Callable | dict[str, typing.Any] | None = None,
+                                               fetch_k: int = 20, **kwargs: typing.Any) -> list[tuple[Document, float]]:
+        return self._expand_results(super().similarity_search_with_score_by_vector(embedding, k, filter, fetch_k,
+                                                                                   **kwargs))
+
+    def max_marginal_relevance_search_with_score_by_vector(
+            self, embedding: list[float], *, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5,
+            filter: typing.Callable | dict[str, typing.Any] | None = None) -> list[tuple[Document, float]]:
+        return self._expand_results(super().max_marginal_relevance_search_with_score_by_vector(
+            embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter))
@@ -1,13 +1,47 @@
+import collections
+import contextlib
+import json
 import logging
+import os
+import re
+import shutil
+import struct
 import subprocess
+import sys
+import tempfile
+import threading
+import typing
 from abc import ABC, abstractmethod
+from array import array
 from enum import Enum
+from hashlib import sha256
 from pathlib import Path
 
 logger = logging.getLogger(f"poc.{__name__}")
 
 ROOT_LEVEL_SENTINEL = 'root-top-level-agent-morpheus'
 
+# Selects the Go dependency tree builder: "go" runs `go mod graph`, "native" reads go.mod and vendor/modules.txt,
+# "native+go" is "native" running `go mod graph` when go.mod files are missing from the module cache, and "auto" uses
+# "go" when a Go toolchain is installed and "native" otherwise.
+GO_DEPENDENCY_TREE_BUILDER_ENV = "poc_GO_DEPENDENCY_TREE_BUILDER"
+
+# Go module graph pruning applies to dependencies whose go.mod declares this Go version or higher
+_GO_MODULE_GRAPH_PRUNING_VERSION = (1, 17)
+# The go and toolchain directives are requirements of the module graph from this Go version
+_GO_TOOLCHAIN_REQUIREMENT_VERSION = (1, 21)
+
+# Location of the persisted dependency trees, an empty value disables the cache
+DEPENDENCY_TREE_CACHE_PATH_ENV = "poc_DEPENDENCY_TREE_CACHE_PATH"
+DEFAULT_DEPENDENCY_TREE_CACHE_PATH = "./.cache/am_cache/dep_trees"
+
+_DEPENDENCY_TREE_MAGIC = b"PCDT"
+_DEPENDENCY_TREE_FORMAT_VERSION = 1
+# magic, format version, strings count, packages count, parents count
+_DEPENDENCY_TREE_HEADER = struct.Struct("<4sHIII")
+
+_GO_MOD_DIRECTIVE = re.compile(r"^(module|go|toolchain|require|replace|exclude|retract)\b\s*(.*)$")
+
 
 class Ecosystem(Enum):
     GO = 1
@@ -27,43 +61,31 @@ class DependencyTreeBuilder(ABC):
     def extract_package_name(self, package_name: str) -> str:
         pass
 
+    # Return the files the tree is built from, the tree is the same as long as their content is the same
+    def get_manifest_files(self, manifest_path: Path) -> list[Path]:
+        return []
 
-class GoDependencyTreeBuilder(DependencyTreeBuilder):
+    # Return what identifies the builder beyond its manifest files, builders of different identities build different
+    # trees from the same manifest files
+    def get_cache_identity(self) -> str:
+        return self.__class__.__qualname__
 
-    @staticmethod
-    def _parent_son_separator(line: str) -> list[str]:
-        return line.split(" ")
+    # Return whether the tree built last is complete, an incomplete tree was built while some of its inputs were
+    # missing and may change without its manifest files changing
+    def is_complete(self) -> bool:
+        return True
 
-    def _get_parent(self, line: str):
-        parts = self._parent_son_separator(line)
-        return parts[0]
 
-    def _get_son(self, line: str):
-        parts = self._parent_son_separator(line)
-        return parts[1]
+class GoDependencyTreeBuilder(DependencyTreeBuilder):
 
     def __init__(self):
         pass
 
     def build_tree(self, manifest_path: Path) -> dict[str, list[str]]:
-        # Get go version from manifest
-        # TODO - download go binary of this version and run the go mod graph using it for optimal performance.
-        go_version = self.determine_go_version(manifest_path)
-
-        go_mod_tree = self.get_go_mod_graph_tree(manifest_path)
-        lines = go_mod_tree.splitlines()
-        root_package_name = self._get_parent(lines[0])
-        tree = dict()
-        for line in lines:
-            line.split(" ")
-            parent = self.extract_package_name(self._get_parent(line))
-            son = self.extract_package_name(self._get_son(line))
-            if tree.get(son, None) is None:
-                tree[son] = [parent]
-            else:
-                tree.get(son).append(parent)
-        # Mark the top level for
-        tree[root_package_name] = [ROOT_LEVEL_SENTINEL]
+        with self.stream_go_mod_graph(manifest_path) as lines:
+            tree = parse_go_mod_graph(lines)
+        if not tree:
+            raise ValueError(f"go mod graph returned no dependencies for {manifest_path}")
         return tree
 
     @staticmethod
@@ -77,9 +99,47 @@ class GoDependencyTreeBuilder(DependencyTreeBuilder):
         return go_version
 
     @staticmethod
-    def get_go_mod_graph_tree(manifest_path) -> str:
-        return subprocess.run(["bash", "-c", f" cd {manifest_path} ; go mod graph -modfile {manifest_path}/go.mod"],
-                              capture_output=True, text=True).stdout
+    @contextlib.contextmanager
+    def stream_go_mod_graph(manifest_path) -> typing.Iterator[typing.Iterator[str]]:
+        """
+        Run `go mod graph` and yield its output lines as they are produced, without holding the whole output.
+
+        Raises
+        ------
+        subprocess.CalledProcessError
+            If `go mod graph` fails, with its standard error, once the output was consumed.
+        """
+        command = ["go", "mod", "graph", "-modfile", f"{manifest_path}/go.mod"]
+        with tempfile.TemporaryFile() as stderr_file:
+            process = subprocess.Popen(command,
+                                       cwd=manifest_path,
+                                       stdout=subprocess.PIPE,
+                                       stderr=stderr_file,
+                                       text=True)
+            try:
+                yield process.stdout
+            finally:
+                process.stdout.close()
+                return_code = process.wait()
+
+            if return_code != 0:
+                stderr_file.seek(0)
+                stderr = stderr_file.read().decode("utf-8", errors="replace").strip()
+                logger.error("go mod graph failed for '%s' with exit code %d: %s", manifest_path, return_code, stderr)
+                raise subprocess.CalledProcessError(return_code, command, stderr=stderr)
+
+    def get_manifest_files(self, manifest_path: Path) -> list[Path]:
+        manifest_path = Path(manifest_path)
+        manifest_files = [manifest_path / "go.mod", manifest_path / "go.sum", manifest_path / "vendor" / "modules.txt"]
+        try:
+            main_module = GoModule.parse((manifest_path / "go.mod").read_text())
+        except OSError:
+            return manifest_files
+        # Dependencies replaced by local directories are part of the main module's repository
+        for replacement_path, _ in main_module.replaces.values():
+            if GoModFilesDependencyTreeBuilder._is_local_path(replacement_path):
+                manifest_files.append(manifest_path / replacement_path / "go.mod")
+        return manifest_files
 
     def extract_package_name(self, package_name: str) -> str:
         if package_name.__contains__("@"):
@@ -89,12 +149,786 @@ class GoDependencyTreeBuilder(DependencyTreeBuilder):
             return package_name
 
 
-def get_dependency_tree_builder(programming_language: Ecosystem) -> DependencyTreeBuilder:
-    if programming_language == Ecosystem.GO.value:
+class GoModule:
+    """
+    The directives of a go.mod file used to build the module graph.
+
+    - path: the module path, None if the go.mod has no module directive.
+    - go_version: the version of the go directive, None if there is none.
+    - toolchain: the version of the toolchain directive, None if there is none.
+    - requires: the (module path, version) requirements.
+    - replaces: maps (module path, version or None for all versions) to the replacement (module path or local
+      directory, version or None for a local directory).
+    """
+
+    def __init__(self):
+        self.path: str | None = None
+        self.go_version: str | None = None
+        self.toolchain: str | None = None
+        self.requires: list[tuple[str, str]] = []
+        self.replaces: dict[tuple[str, str | None], tuple[str, str | None]] = dict()
+
+    @classmethod
+    def parse(cls, content: str) -> "GoModule":
+        go_module = cls()
+        block_directive = None
+        for line in content.splitlines():
+            line = line.split("//", 1)[0].strip()
+            if not line:
+                continue
+            if block_directive is not None:
+                if line == ")":
+                    block_directive = None
+                else:
+                    go_module._add_directive(block_directive, line)
+                continue
+            match = _GO_MOD_DIRECTIVE.match(line)
+            if match is None:
+                continue
+            directive, arguments = match.groups()
+            if arguments == "(":
+                block_directive = directive
+            else:
+                go_module._add_directive(directive, arguments)
+        return go_module
+
+    def _add_directive(self, directive: str, arguments: str):
+        fields = [field.strip('"`') for field in arguments.split()]
+        if not fields:
+            return
+        if directive == "module":
+            self.path = fields[0]
+        elif directive == "go":
+            self.go_version = fields[0]
+        elif directive == "toolchain":
+            self.toolchain = fields[0]
+        elif directive == "require" and len(fields) >= 2:
+            self.requires.append((fields[0], fields[1]))
+        elif directive == "replace" and "=>" in fields:
+            arrow = fields.index("=>")
+            old, new = fields[:arrow], fields[arrow + 1:]
+            if old and new:
+                self.replaces[(old[0], old[1] if len(old) > 1 else None)] = (new[0], new[1] if len(new) > 1 else None)
+
+    def _go_version_at_least(self, version: tuple[int, int]) -> bool:
+        if self.go_version is None:
+            return False
+        try:
+            go_version = tuple(int(part) for part in self.go_version.split(".")[:2])
+        except ValueError:
+            return False
+        return go_version >= version
+
+    def is_pruned(self) -> bool:
+        """
+        Returns whether the transitive requirements of this module are pruned out of the module graph of dependent
+        modules (go 1.17 and higher).
+        """
+        return self._go_version_at_least(_GO_MODULE_GRAPH_PRUNING_VERSION)
+
+    def requires_toolchain(self) -> bool:
+        """
+        Returns whether the go and toolchain directives are requirements in the module graph (go 1.21 and higher).
+        """
+        return self._go_version_at_least(_GO_TOOLCHAIN_REQUIREMENT_VERSION)
+
+
+class GoVendoredModules:
+    """
+    The modules listed in vendor/modules.txt by `go mod vendor`, each introduced by a "# path version" line, optionally
+    followed by "=> replacement" and by a "## explicit" line when the go.mod of the main module requires it.
+
+    - versions: maps each vendored module path to its version.
+    - explicit: the module paths required by the go.mod of the main module.
+    - replaces: the replacements of the vendored modules, in the format of `GoModule.replaces`.
+    """
+
+    def __init__(self):
+        self.versions: dict[str, str] = dict()
+        self.explicit: set[str] = set()
+        self.replaces: dict[tuple[str, str | None], tuple[str, str | None]] = dict()
+
+    @classmethod
+    def parse(cls, content: str) -> "GoVendoredModules":
+        vendored_modules = cls()
+        module_path = None
+        for line in content.splitlines():
+            if line.startswith("## "):
+                if module_path is not None and "explicit" in (part.strip() for part in line[3:].split(";")):
+                    vendored_modules.explicit.add(module_path)
+                continue
+            if not line.startswith("# "):
+                continue
+            fields = line[2:].split()
+            module_path = None
+            if "=>" in fields:
+                arrow = fields.index("=>")
+                old, new = fields[:arrow], fields[arrow + 1:]
+                if old and new:
+                    vendored_modules.replaces[(old[0], old[1] if len(old) > 1 else None)] = (
+                        new[0], new[1] if len(new) > 1 else None)
+                fields = old
+            # A replacement without version applies to every version and lists no vendored module
+            if len(fields) == 2:
+                module_path = fields[0]
+                vendored_modules.versions[module_path] = fields[1]
+        return vendored_modules
+
+
+class GoModFilesDependencyTreeBuilder(GoDependencyTreeBuilder):
+    """
+    Builds the same tree as `GoDependencyTreeBuilder` without running the Go toolchain.
+
+    The module graph is rebuilt from the go.mod of the main module, its `replace` directives, and the go.mod files of
+    the dependencies, found in local replacement directories or in the module cache (GOMODCACHE). Like
+    `go mod graph`, the requirements of dependencies declaring go 1.17 or higher are not expanded further (module graph
+    pruning). vendor/modules.txt completes the go.mod of the main module with the modules it marks as explicitly
+    required and with their replacements.
+
+    The requirements of a module whose go.mod is not available can't be known, and the modules only it requires are
+    missing from the tree. They are listed in `missing_modules` after a build, and the incomplete tree is returned
+    unless `fall_back_to_go_mod_graph` is set, building the tree with `go mod graph` instead if a Go toolchain is
+    installed. The go command may then download the missing modules.
+    """
+
+    def __init__(self, module_cache_path: Path | None = None, fall_back_to_go_mod_graph: bool = False):
+        super().__init__()
+        self._module_cache_path = module_cache_path or self.determine_module_cache_path()
+        self._fall_back_to_go_mod_graph = fall_back_to_go_mod_graph
+        # The modules of the last built tree whose go.mod was not available
+        self.missing_modules: list[str] = []
+
+    @staticmethod
+    def determine_module_cache_path() -> Path:
+        if os.environ.get("GOMODCACHE"):
+            return Path(os.environ["GOMODCACHE"])
+        go_path = os.environ.get("GOPATH", "").split(os.pathsep)[0] or str(Path.home() / "go")
+        return Path(go_path) / "pkg" / "mod"
+
+    @staticmethod
+    def _escape_module_path(module_path: str) -> str:
+        # The module cache escapes upper case letters as "!" followed by the lower case letter
+        return re.sub(r"[A-Z]", lambda match: "!" + match.group(0).lower(), module_path)
+
+    @staticmethod
+    def _is_local_path(module_path: str) -> bool:
+        return module_path.startswith(("./", "../", "/")) or module_path in (".", "..")
+
+    def get_cache_identity(self) -> str:
+        return f"{super().get_cache_identity()}:{self._module_cache_path.absolute()}"
+
+    def is_complete(self) -> bool:
+        return not self.missing_modules
+
+    def _read_dependency_go_mod(self, manifest_path: Path, replaces: dict, module_path: str,
+                                version: str) -> GoModule | None:
+        replacement_path, replacement_version = replaces.get((module_path, version),
+                                                             replaces.get((module_path, None), (module_path, version)))
+        if self._is_local_path(replacement_path):
+            go_mod_path = manifest_path / replacement_path / "go.mod"
+        else:
+            go_mod_path = (self._module_cache_path / "cache" / "download" /
+                           self._escape_module_path(replacement_path) / "@v" /
+                           f"{self._escape_module_path(replacement_version or '')}.mod")
+        try:
+            return GoModule.parse(go_mod_path.read_text())
+        except OSError:
+            return None
+
+    @staticmethod
+    def _read_vendored_modules(manifest_path: Path) -> GoVendoredModules:
+        try:
+            return GoVendoredModules.parse((manifest_path / "vendor" / "modules.txt").read_text())
+        except OSError:
+            return GoVendoredModules()
+
+    def get_go_mod_graph_edges(self, manifest_path: Path) -> list[tuple[str, str]]:
+        """
+        Returns the edges of the module graph in the format of `go mod graph`, a (module@version, requirement@version)
+        tuple per edge, the main module without a version.
+        """
+        return self._get_module_graph(manifest_path)[0]
+
+    def _get_module_graph(self, manifest_path: Path) -> tuple[list[tuple[str, str]], list[str]]:
+        """
+        Returns the edges of the module graph, and the module@version of the modules whose go.mod is not available.
+        """
+        main_module = GoModule.parse((manifest_path / "go.mod").read_text())
+        root_package_name = main_module.path
+
+        vendored_modules = self._read_vendored_modules(manifest_path)
+        main_module.replaces = {**vendored_modules.replaces, **main_module.replaces}
+        required_paths = {required_path for required_path, _ in main_module.requires}
+        main_module.requires.extend((module_path, vendored_modules.versions[module_path])
+                                    for module_path in sorted(vendored_modules.explicit)
+                                    if module_path not in required_paths)
+
+        edges = list()
+
+        def add_module_edges(module_name: str, go_module: GoModule):
+            for required_path, required_version in go_module.requires:
+                edges.append((module_name, f"{required_path}@{required_version}"))
+            if go_module.requires_toolchain():
+                edges.append((module_name, f"go@{go_module.go_version}"))
+                if go_module.toolchain is not None:
+                    edges.append((module_name, f"toolchain@{go_module.toolchain}"))
+
+        add_module_edges(root_package_name, main_module)
+
+        # The requirements of the main module are always expanded, the requirements of a dependency only if it or
+        # the main module is not pruned
+        expanded_modules = set()
+        missing_modules = list()
+        pending_modules = collections.deque(main_module.requires)
+        while pending_modules:
+            module = pending_modules.popleft()
+            if module in expanded_modules:
+                continue
+            expanded_modules.add(module)
+
+            go_module = self._read_dependency_go_mod(manifest_path, main_module.replaces, *module)
+            if go_module is None:
+                missing_modules.append(f"{module[0]}@{module[1]}")
+                continue
+            add_module_edges(f"{module[0]}@{module[1]}", go_module)
+
+            if not go_module.is_pruned() or not main_module.is_pruned():
+                pending_modules.extend(go_module.requires)
+
+        if main_module.requires_toolchain():
+            edges.append((f"go@{main_module.go_version}", f"toolchain@go{main_module.go_version}"))
+
+        return edges, missing_modules
+
+    def build_tree(self, manifest_path: Path) -> dict[str, list[str]]:
+        manifest_path = Path(manifest_path)
+        edges, self.missing_modules = self._get_module_graph(manifest_path)
+
+        if self.missing_modules:
+            logger.warning("The go.mod of %d modules required by '%s' are not in the module cache at '%s', the modules "
+                           "they require are missing from its dependency tree: %s", len(self.missing_modules),
+                           manifest_path, self._module_cache_path, ", ".join(self.missing_modules))
+            if self._fall_back_to_go_mod_graph and shutil.which("go") is not None:
+                logger.info("Building the dependency tree of '%s' with go mod graph", manifest_path)
+                try:
+                    tree = super().build_tree(manifest_path)
+                except (subprocess.CalledProcessError, ValueError) as e:
+                    logger.warning("Keeping the incomplete dependency tree of '%s': %s", manifest_path, e)
+                else:
+                    self.missing_modules = []
+                    return tree
+
+        root_package_name = GoModule.parse((manifest_path / "go.mod").read_text()).path
+        tree = parse_go_mod_graph(f"{parent} {son}" for parent, son in edges)
+
+        # Mark the top level for
+        tree.pop(root_package_name, None)
+        tree[root_package_name] = [ROOT_LEVEL_SENTINEL]
+        return tree
+
+
+def parse_go_mod_graph(lines: typing.Iterable[str]) -> dict[str, list[str]]:
+    """
+    Build the dependency tree of `GoDependencyTreeBuilder.build_tree` from `go mod graph` output lines, each
+    "module@version requirement@version", the first module being the main module.
+
+    The lines are consumed one by one. Module names are stripped of their version and interned, each distinct name is
+    stored once and identified by an integer, and duplicate edges (e.g. from several versions of the same modules) are
+    dropped as they arrive, so memory grows with the number of distinct modules and edges instead of the output size.
+
+    Returns
+    -------
+    dict[str, list[str]]
+        Returns a mapping of each module name to the names of the modules requiring it, the main module mapped to
+        `ROOT_LEVEL_SENTINEL`. Empty if there are no lines.
+    """
+    name_ids: dict[str, int] = dict()
+    names: list[str] = []
+    parent_ids: list[list[int] | None] = []
+    edges: set[int] = set()
+    sons_order: list[int] = []
+    root_id = None
+
+    def get_name_id(token: str) -> int:
+        version_start = token.find("@")
+        name = token[:version_start] if version_start != -1 else token
+        name_id = name_ids.get(name)
+        if name_id is None:
+            name_id = len(names)
+            name_ids[name] = name_id
+            names.append(sys.intern(name))
+            parent_ids.append(None)
+        return name_id
+
+    for line in lines:
+        separator = line.find(" ")
+        if separator == -1:
+            continue
+        parent_id = get_name_id(line[:separator])
+        son_id = get_name_id(line[separator + 1:].rstrip())
+
+        if root_id is None:
+            root_id = parent_id
+
+        edge = son_id << 32 | parent_id
+        if edge in edges:
+            continue
+        edges.add(edge)
+
+        son_parents = parent_ids[son_id]
+        if son_parents is None:
+            son_parents = parent_ids[son_id] = []
+            sons_order.append(son_id)
+        son_parents.append(parent_id)
+
+    tree = {names[son_id]: [names[parent_id] for parent_id in parent_ids[son_id]] for son_id in sons_order}
+    if root_id is not None:
+        # Mark the top level for
+        tree[names[root_id]] = [ROOT_LEVEL_SENTINEL]
+    return tree
+
+
+class JavaScriptDependencyTreeBuilder(DependencyTreeBuilder):
+    """
+    Builds the tree of an npm project without running npm.
+
+    The installed packages are read from npm-shrinkwrap.json or package-lock.json (lockfile versions 1 to 3), or from
+    the hidden lockfile npm keeps in node_modules/.package-lock.json. Without any lockfile, the package.json files of
+    the installed packages are read, listing only node_modules directories and never walking the package contents.
+    The dependencies of each installed package are resolved like Node.js resolves `require`, from the nearest
+    node_modules directory up to the project's one.
+    """
+
+    LOCKFILE_NAMES = ("npm-shrinkwrap.json", "package-lock.json", "node_modules/.package-lock.json")
+    # The dependencies installed with a package, and with the project itself
+    DEPENDENCY_FIELDS = ("dependencies", "optionalDependencies", "peerDependencies")
+    ROOT_DEPENDENCY_FIELDS = DEPENDENCY_FIELDS + ("devDependencies",)
+
+    def build_tree(self, manifest_path: Path) -> dict[str, list[str]]:
+        manifest_path = Path(manifest_path)
+        packages = None
+        for lockfile_name in self.LOCKFILE_NAMES:
+            lockfile_path = manifest_path / lockfile_name
+            if lockfile_path.is_file():
+                packages = self.read_lockfile_packages(lockfile_path)
+                break
+        if packages is None:
+            packages = self.read_installed_packages(manifest_path)
+        if "" not in packages:
+            raise ValueError(f"No package.json or package-lock.json found in {manifest_path}")
+
+        # Same as `go mod graph` output, parents are kept in first seen order and duplicate edges are dropped
+        tree = dict()
+        edges = set()
+        for location, (name, dependencies) in packages.items():
+            for dependency in dependencies:
+                dependency_location = self._resolve_location(packages, location, dependency)
+                if dependency_location is None:
+                    continue
+                son = packages[dependency_location][0]
+                if son == name or (son, name) in edges:
+                    continue
+                edges.add((son, name))
+                tree.setdefault(son, []).append(name)
+
+        root_package_name = packages[""][0]
+        # Mark the top level for
+        tree.pop(root_package_name, None)
+        tree[root_package_name] = [ROOT_LEVEL_SENTINEL]
+        return tree
+
+    @staticmethod
+    def _get_package_name(location: str) -> str:
+        # "node_modules/a/node_modules/@scope/b" -> "@scope/b"
+        return location[location.rfind("node_modules/") + len("node_modules/"):]
+
+    @staticmethod
+    def _resolve_location(packages: dict[str, tuple[str, list[str]]], location: str, dependency: str) -> str | None:
+        """
+        Returns the location of the package a package at `location` gets when requiring `dependency`, looking in the
+        node_modules directory of the package and then in the ones of its ancestors.
+        """
+        while True:
+            candidate = f"{location}/node_modules/{dependency}" if location else f"node_modules/{dependency}"
+            if candidate in packages:
+                return candidate
+            if not location:
+                return None
+            parent_end = location.rfind("/node_modules/")
+            location = location[:parent_end] if parent_end != -1 else ""
+
+    @classmethod
+    def read_lockfile_packages(cls, lockfile_path: Path) -> dict[str, tuple[str, list[str]]]:
+        """
+        Returns the packages of a lockfile, keyed by their location relative to the project ("" for the project
+        itself), each with its name and the names of its dependencies.
+        """
+        with open(lockfile_path, encoding="utf-8") as lockfile:
+            lock = json.load(lockfile)
+
+        packages = dict()
+        if "packages" in lock:
+            # Lockfile version 2 and 3, a flat mapping of locations
+            for location, package in lock["packages"].items():
+                if package.get("link"):
+                    # Links to workspace packages, whose dependencies are in the entry of the link's target
+                    continue
+                if location.startswith("node_modules/") or "/node_modules/" in location:
+                    name = cls._get_package_name(location)
+                elif location == "":
+                    name = package.get("name") or lock.get("name", "")
+                else:
+                    name = package.get("name") or location[location.rfind("/") + 1:]
+                fields = cls.ROOT_DEPENDENCY_FIELDS if location == "" else cls.DEPENDENCY_FIELDS
+                packages[location] = (name, [dependency for field in fields
+                                             for dependency in package.get(field, {})])
+            # Workspace packages are linked from node_modules, requiring them resolves to the link location
+            for location, package in lock["packages"].items():
+                if package.get("link") and package.get("resolved") in packages:
+                    packages[location] = packages[package["resolved"]]
+        else:
+            # Lockfile version 1, the dependencies of each package are nested in it, the ones of the project are in
+            # its package.json
+            root_dependencies = cls._read_package_json(lockfile_path.parent)
+            if root_dependencies is not None:
+                packages[""] = (lock.get("name") or root_dependencies[0], root_dependencies[1])
+            else:
+                packages[""] = (lock.get("name", ""), list(lock.get("dependencies", {})))
+            pending = [("", lock.get("dependencies", {}))]
+            while pending:
+                parent_location, dependencies = pending.pop()
+                for name, package in dependencies.items():
+                    location = f"{parent_location}/node_modules/{name}" if parent_location else f"node_modules/{name}"
+                    packages[location] = (name, list(package.get("requires", {})))
+                    if package.get("dependencies"):
+                        pending.append((location, package["dependencies"]))
+        return packages
+
+    @classmethod
+    def _read_package_json(cls, package_path: Path, root: bool = True) -> tuple[str, list[str]] | None:
+        try:
+            with open(package_path / "package.json", encoding="utf-8") as package_file:
+                package = json.load(package_file)
+        except (OSError, ValueError):
+            return None
+        fields = cls.ROOT_DEPENDENCY_FIELDS if root else cls.DEPENDENCY_FIELDS
+        return package.get("name", package_path.name), [dependency for field in fields
+                                                        for dependency in package.get(field) or {}]
+
+    @classmethod
+    def read_installed_packages(cls, manifest_path: Path) -> dict[str, tuple[str, list[str]]]:
+        """
+        Returns the packages installed in the node_modules directories of a project, in the format of
+        `read_lockfile_packages`. Only node_modules and scope directories are listed, and only the package.json of each
+        package is read.
+        """
+        packages = dict()
+        root_package = cls._read_package_json(manifest_path)
+        if root_package is None:
+            return packages
+        packages[""] = root_package
+
+        pending = [""]
+        while pending:
+            parent_location = pending.pop()
+            node_modules_location = f"{parent_location}/node_modules" if parent_location else "node_modules"
+            for entry in cls._scan_directories(manifest_path / node_modules_location):
+                if entry.name.startswith("@"):
+                    package_entries = [(f"{entry.name}/{scoped_entry.name}", scoped_entry)
+                                       for scoped_entry in cls._scan_directories(Path(entry.path))]
+                else:
+                    package_entries = [(entry.name, entry)]
+                for name, package_entry in package_entries:
+                    package = cls._read_package_json(Path(package_entry.path), root=False)
+                    if package is None:
+                        continue
+                    location = f"{node_modules_location}/{name}"
+                    # Required by the location's name, regardless of the name in package.json (e.g. aliases)
+                    packages[location] = (name, package[1])
+                    pending.append(location)
+        return packages
+
+    @staticmethod
+    def _scan_directories(path: Path) -> list[os.DirEntry]:
+        try:
+            with os.scandir(path) as entries:
+                return [entry for entry in entries if not entry.name.startswith(".") and entry.is_dir()]
+        except OSError:
+            return []
+
+    def get_manifest_files(self, manifest_path: Path) -> list[Path]:
+        manifest_path = Path(manifest_path)
+        lockfiles = [manifest_path / lockfile_name for lockfile_name in self.LOCKFILE_NAMES]
+        # Without a lockfile the tree depends on the whole node_modules content, which isn't worth hashing
+        if not any(lockfile.is_file() for lockfile in lockfiles):
+            return []
+        return [manifest_path / "package.json"] + lockfiles
+
+    def extract_package_name(self, package_name: str) -> str:
+        # "name@version", the name of a scoped package starts with "@"
+        version_start = package_name.find("@", 1)
+        return package_name[:version_start] if version_start != -1 else package_name
+
+
+class DependencyGraphIndex:
+    """
+    A precomputed index of a dependency tree (package -> packages requiring it): each package is interned to an
+    integer ID, and its minimal depth to the root package (the package required by `ROOT_LEVEL_SENTINEL`) is computed
+    once with a breadth first search. The packages from which the root can be reached, i.e. the root's dependency
+    closure, are flagged in a byte per package ID.
+    """
+
+    def __init__(self, tree: dict[str, typing.Iterable[str]]):
+        self.package_ids: dict[str, int] = {package: package_id for package_id, package in enumerate(tree)}
+
+        children: list[list[int]] = [[] for _ in self.package_ids]
+        roots = list()
+        for package, parents in tree.items():
+            package_id = self.package_ids[package]
+            for parent in parents:
+                if parent == ROOT_LEVEL_SENTINEL:
+                    roots.append(package_id)
+                else:
+                    parent_id = self.package_ids.get(parent)
+                    if parent_id is not None:
+                        children[parent_id].append(package_id)
+
+        self._depths = array("i", [-1]) * len(self.package_ids)
+        self._reachable = bytearray(len(self.package_ids))
+        pending = collections.deque()
+        for root_id in roots:
+            self._depths[root_id] = 0
+            pending.append(root_id)
+        while pending:
+            package_id = pending.popleft()
+            self._reachable[package_id] = 1
+            for child_id in children[package_id]:
+                if self._depths[child_id] == -1:
+                    self._depths[child_id] = self._depths[package_id] + 1
+                    pending.append(child_id)
+
+    def __contains__(self, package: str) -> bool:
+        return package in self.package_ids
+
+    def is_reachable(self, package: str) -> bool | None:
+        """
+        Returns whether the root package depends on a package, directly or transitively, None for unknown packages.
+        """
+        package_id = self.package_ids.get(package)
+        if package_id is None:
+            return None
+        return self._reachable[package_id] == 1
+
+    def depth_to_root(self, package: str) -> int | None:
+        """
+        Returns the minimal number of requirement edges between the root package and a package, None for unknown or
+        unreachable packages.
+        """
+        package_id = self.package_ids.get(package)
+        if package_id is None or self._depths[package_id] == -1:
+            return None
+        return self._depths[package_id]
+
+    def sort_by_depth(self, packages: list[str]):
+        """
+        Sort packages in place from the closest to the root package to the farthest, unknown and unreachable packages
+        last, keeping the order of packages at the same depth.
+        """
+        packages.sort(key=lambda package: _depth_sort_key(self.depth_to_root(package)))
+
+    @property
+    def reachable_count(self) -> int:
+        return self._reachable.count(1)
+
+
+def _depth_sort_key(depth: int | None) -> int:
+    return depth if depth is not None else sys.maxsize
+
+
+def write_dependency_tree(path: Path, tree: dict[str, list[str]]):
+    """
+    Write a dependency tree in a compact binary form: a header, a table of the distinct package names, then for each
+    package its name id, the number of its parents and their name ids.
+    """
+    strings: dict[str, int] = dict()
+    for package, parents in tree.items():
+        strings.setdefault(package, len(strings))
+        for parent in parents:
+            strings.setdefault(parent, len(strings))
+
+    encoded_strings = [value.encode("utf-8") for value in strings]
+    entries = array("I")
+    for package, parents in tree.items():
+        entries.append(strings[package])
+        entries.append(len(parents))
+        entries.extend(strings[parent] for parent in parents)
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(temp_path, "wb") as tree_file:
+        tree_file.write(_DEPENDENCY_TREE_HEADER.pack(_DEPENDENCY_TREE_MAGIC, _DEPENDENCY_TREE_FORMAT_VERSION,
+                                                     len(encoded_strings), len(tree), len(entries)))
+        tree_file.write(array("I", (len(encoded_string) for encoded_string in encoded_strings)).tobytes())
+        tree_file.write(b"".join(encoded_strings))
+        tree_file.write(entries.tobytes())
+    os.replace(temp_path, path)
+
+
+def read_dependency_tree(path: Path) -> dict[str, list[str]]:
+    """
+    Read a dependency tree written by `write_dependency_tree`.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a dependency tree of the current format.
+    """
+    data = memoryview(path.read_bytes())
+    try:
+        magic, format_version, strings_count, packages_count, entries_count = _DEPENDENCY_TREE_HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError(f"{path} is not a dependency tree")
+    if magic != _DEPENDENCY_TREE_MAGIC or format_version != _DEPENDENCY_TREE_FORMAT_VERSION:
+        raise ValueError(f"{path} is not a dependency tree of format version {_DEPENDENCY_TREE_FORMAT_VERSION}")
+
+    offset = _DEPENDENCY_TREE_HEADER.size
+    lengths = array("I")
+    lengths.frombytes(data[offset:offset + strings_count * 4])
+    offset += strings_count * 4
+    strings = list()
+    for length in lengths:
+        strings.append(str(data[offset:offset + length], "utf-8"))
+        offset += length
+    entries = array("I")
+    entries.frombytes(data[offset:offset + entries_count * 4])
+
+    tree = dict()
+    position = 0
+    for _ in range(packages_count):
+        package, parents_count = entries[position], entries[position + 1]
+        tree[strings[package]] = [strings[parent] for parent in entries[position + 2:position + 2 + parents_count]]
+        position += 2 + parents_count
+    return tree
+
+
+class CachingDependencyTreeBuilder(DependencyTreeBuilder):
+    """
+    Wraps a dependency tree builder, caching the trees it builds by the identity of the builder and the content of the
+    manifest files they are built from, both in memory and on disk, so the tree of a manifest is built only once across
+    queries, commits and processes. Incomplete trees, e.g. built before the modules they require were downloaded, are
+    not cached.
+    """
+
+    # Trees built in this process, shared by all the caching builders
+    _memory_cache: dict[str, dict[str, list[str]]] = dict()
+    _memory_cache_lock = threading.Lock()
+    _memory_cache_max_size = 64
+
+    def __init__(self, builder: DependencyTreeBuilder, cache_path: Path | None):
+        self.builder = builder
+        self.cache_path = Path(cache_path) if cache_path else None
+
+    def get_cache_key(self, manifest_path: Path) -> str | None:
+        """
+        Returns the cache key of the tree of a manifest, None if the builder doesn't declare its manifest files.
+        """
+        manifest_files = self.builder.get_manifest_files(manifest_path)
+        if not manifest_files:
+            return None
+        key_hash = sha256(f"{self.builder.get_cache_identity()}:{_DEPENDENCY_TREE_FORMAT_VERSION}".encode("utf-8"))
+        for manifest_file in manifest_files:
+            key_hash.update(f"\0{Path(manifest_file).name}\0".encode("utf-8"))
+            try:
+                key_hash.update(sha256(Path(manifest_file).read_bytes()).digest())
+            except OSError:
+                key_hash.update(b"missing")
+        return key_hash.hexdigest()
+
+    @staticmethod
+    def _copy_tree(tree: dict[str, list[str]]) -> dict[str, list[str]]:
+        # Callers extend the lists of parents, never hand out the cached ones
+        return {package: list(parents) for package, parents in tree.items()}
+
+    def build_tree(self, manifest_path: Path) -> dict[str, list[str]]:
+        cache_key = self.get_cache_key(manifest_path)
+        if cache_key is None:
+            return self.builder.build_tree(manifest_path)
+
+        with self._memory_cache_lock:
+            tree = self._memory_cache.get(cache_key)
+        if tree is not None:
+            logger.debug("Dependency tree of '%s' found in memory cache", manifest_path)
+            return self._copy_tree(tree)
+
+        tree_path = self.cache_path / f"{cache_key}.pcdt" if self.cache_path is not None else None
+        if tree_path is not None and tree_path.exists():
+            try:
+                tree = read_dependency_tree(tree_path)
+                logger.debug("Dependency tree of '%s' loaded from '%s'", manifest_path, tree_path)
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable cached dependency tree '%s': %s", tree_path, e)
+
+        if tree is None:
+            tree = self.builder.build_tree(manifest_path)
+            if not self.builder.is_complete():
+                logger.info("Not caching the incomplete dependency tree of '%s'", manifest_path)
+                return tree
+            if tree_path is not None:
+                try:
+                    write_dependency_tree(tree_path, tree)
+                except OSError as e:
+                    logger.warning("Unable to cache the dependency tree in '%s': %s", tree_path, e)
+
+        with self._memory_cache_lock:
+            if len(self._memory_cache) >= self._memory_cache_max_size:
+                # Evict the oldest tree
+                del self._memory_cache[next(iter(self._memory_cache))]
+            self._memory_cache[cache_key] = self._copy_tree(tree)
+
+        return tree
+
+    def extract_package_name(self, package_name: str) -> str:
+        return self.builder.extract_package_name(package_name)
+
+    def get_manifest_files(self, manifest_path: Path) -> list[Path]:
+        return self.builder.get_manifest_files(manifest_path)
+
+    def get_cache_identity(self) -> str:
+        return self.builder.get_cache_identity()
+
+    def is_complete(self) -> bool:
+        return self.builder.is_complete()
+
+
+def get_go_dependency_tree_builder(builder_type: str | None = None) -> GoDependencyTreeBuilder:
+    builder_type = builder_type or os.environ.get(GO_DEPENDENCY_TREE_BUILDER_ENV, "auto")
+    if builder_type == "auto":
+        builder_type = "go" if shutil.which("go") is not None else "native"
+    if builder_type == "go":
         return GoDependencyTreeBuilder()
+    elif builder_type == "native":
+        return GoModFilesDependencyTreeBuilder()
+    elif builder_type == "native+go":
+        return GoModFilesDependencyTreeBuilder(fall_back_to_go_mod_graph=True)
+    else:
+        raise ValueError(f'Unsupported Go dependency tree builder {builder_type}')
+
+
+def get_dependency_tree_builder(programming_language: Ecosystem,
+                                builder_type: str | None = None,
+                                use_cache: bool = True) -> DependencyTreeBuilder:
+    if programming_language == Ecosystem.GO.value:
+        builder = get_go_dependency_tree_builder(builder_type)
+    elif programming_language == Ecosystem.JAVASCRIPT.value:
+        builder = JavaScriptDependencyTreeBuilder()
     else:
         raise ValueError(f'Unsupported Ecosystem {programming_language}')
 
+    if use_cache:
+        cache_path = os.environ.get(DEPENDENCY_TREE_CACHE_PATH_ENV, DEFAULT_DEPENDENCY_TREE_CACHE_PATH)
+        builder = CachingDependencyTreeBuilder(builder, Path(cache_path) if cache_path else None)
+    return builder
+
 
 class DependencyTree:
     builder: DependencyTreeBuilder
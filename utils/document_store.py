@@ -0,0 +1,280 @@
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import typing
+import zlib
+from pathlib import Path
+
+if typing.TYPE_CHECKING:
+    from langchain_core.documents import Document  # pragma: no cover
+
+PathLike = typing.Union[str, os.PathLike]
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+DOCUMENT_STORE_MAGIC = b"PCDS"
+DOCUMENT_STORE_SCHEMA_VERSION = 1
+DOCUMENT_STORE_SUFFIX = ".pcds"
+
+# magic, schema version, parser version, document count, string table offset, index offset, metadata offset,
+# content offset
+_HEADER = struct.Struct("<4sHHQQQQQ")
+# content offset (relative to the content region), compressed length, first metadata pair, metadata pairs count
+_INDEX_ENTRY = struct.Struct("<QIII")
+# key string id, value string id
+_METADATA_PAIR = struct.Struct("<II")
+_STRING_LENGTH = struct.Struct("<I")
+
+# Set on a value string id when the string holds a JSON encoded (non string) metadata value
+_JSON_VALUE_FLAG = 1 << 31
+
+
+def document_store_key(repository_url: str) -> str:
+    """
+    Returns a file system safe key for a repository URL, e.g. "https.github.com.openshift.oc".
+    """
+    return re.sub(r"[^A-Za-z0-9_-]+", ".", repository_url).strip(".")
+
+
+def get_document_store_path(cache_path: PathLike, repository_url: str, repository_digest: str) -> Path:
+    """
+    Returns the location of the document store of a repository at a certain commit.
+    """
+    return Path(cache_path) / f"{document_store_key(repository_url)}-{repository_digest}{DOCUMENT_STORE_SUFFIX}"
+
+
+def write_document_store(path: PathLike, documents: typing.Iterable["Document"], parser_version: int):
+    """
+    Write documents into a document store file.
+
+    The file holds a header with the schema and parser versions, a string table that interns all the metadata keys and
+    values (mostly repeated source paths and languages), a fixed size index entry per document and a contiguous region
+    of individually compressed `page_content`, so a single document can be read without touching the others.
+
+    Parameters
+    ----------
+    path : PathLike
+        The location of the document store. The file is replaced atomically.
+    documents : typing.Iterable[Document]
+        The documents to store.
+    parser_version : int
+        The version of the parser that produced the documents. Readers expecting another version treat the store as
+        stale.
+    """
+
+    path = Path(path)
+
+    strings: dict[str, int] = dict()
+
+    def string_id(value: str) -> int:
+        current_id = strings.get(value)
+        if current_id is None:
+            current_id = len(strings)
+            strings[value] = current_id
+        return current_id
+
+    index = bytearray()
+    metadata_pairs = bytearray()
+    content = bytearray()
+    document_count = 0
+    metadata_pairs_count = 0
+
+    for document in documents:
+        compressed_content = zlib.compress(document.page_content.encode("utf-8", errors="surrogatepass"))
+
+        for key, value in document.metadata.items():
+            if isinstance(value, str):
+                value_id = string_id(value)
+            else:
+                value_id = string_id(json.dumps(value)) | _JSON_VALUE_FLAG
+            metadata_pairs += _METADATA_PAIR.pack(string_id(key), value_id)
+
+        index += _INDEX_ENTRY.pack(len(content), len(compressed_content), metadata_pairs_count,
+                                   len(document.metadata))
+        metadata_pairs_count += len(document.metadata)
+        content += compressed_content
+        document_count += 1
+
+    encoded_strings = [value.encode("utf-8", errors="surrogatepass") for value in strings]
+    string_table = bytearray(_STRING_LENGTH.pack(len(encoded_strings)))
+    for encoded_string in encoded_strings:
+        string_table += _STRING_LENGTH.pack(len(encoded_string))
+    string_table += b"".join(encoded_strings)
+
+    string_table_offset = _HEADER.size
+    index_offset = string_table_offset + len(string_table)
+    metadata_offset = index_offset + len(index)
+    content_offset = metadata_offset + len(metadata_pairs)
+
+    header = _HEADER.pack(DOCUMENT_STORE_MAGIC, DOCUMENT_STORE_SCHEMA_VERSION, parser_version, document_count,
+                          string_table_offset, index_offset, metadata_offset, content_offset)
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(temp_path, "wb") as store_file:
+        for region in (header, string_table, index, metadata_pairs, content):
+            store_file.write(region)
+    os.replace(temp_path, path)
+
+    logger.debug("Wrote %d documents to document store '%s'", document_count, path)
+
+
+class StoredDocument:
+    """
+    A lazy view of a single document in a `DocumentStore`. The metadata is decoded from the interned string table and
+    the `page_content` is decompressed only when accessed.
+    """
+
+    __slots__ = ("_store", "_position", "metadata")
+
+    def __init__(self, store: "DocumentStore", position: int, metadata: dict):
+        self._store = store
+        self._position = position
+        self.metadata = metadata
+
+    @property
+    def page_content(self) -> str:
+        return self._store.read_page_content(self._position)
+
+    def to_document(self) -> "Document":
+        from langchain_core.documents import Document
+
+        return Document(page_content=self.page_content, metadata=dict(self.metadata))
+
+
+class DocumentStore:
+    """
+    A read only, memory mapped document store written by `write_document_store`.
+
+    Iterating the store yields `StoredDocument` instances in the order the documents were written, without reading
+    their content. Use `documents()` to get LangChain `Document` instances.
+    """
+
+    def __init__(self, path: PathLike, parser_version: int | None = None):
+        """
+        Open a document store.
+
+        Parameters
+        ----------
+        path : PathLike
+            The location of the document store.
+        parser_version : int | None, optional
+            The parser version the caller expects, by default None which accepts any version.
+
+        Raises
+        ------
+        ValueError
+            If the file is not a document store, was written with another schema or parser version, or is corrupted.
+            Reading the documents of a corrupted store also raises a ValueError.
+        """
+
+        self.path = Path(path)
+
+        with open(self.path, "rb") as store_file:
+            self._mmap = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            (magic, schema_version, self.parser_version, self._document_count, string_table_offset, self._index_offset,
+             self._metadata_offset, self._content_offset) = _HEADER.unpack_from(self._mmap, 0)
+
+            if magic != DOCUMENT_STORE_MAGIC:
+                raise ValueError(f"{self.path} is not a document store")
+            if schema_version != DOCUMENT_STORE_SCHEMA_VERSION:
+                raise ValueError(f"Unsupported document store schema version {schema_version} in {self.path}, "
+                                 f"expected {DOCUMENT_STORE_SCHEMA_VERSION}")
+            if parser_version is not None and self.parser_version != parser_version:
+                raise ValueError(f"Document store {self.path} was written by parser version {self.parser_version}, "
+                                 f"expected {parser_version}")
+
+            if not (_HEADER.size <= string_table_offset <= self._index_offset <= self._metadata_offset
+                    <= self._content_offset <= len(self._mmap)) or \
+                    self._index_offset + self._document_count * _INDEX_ENTRY.size != self._metadata_offset or \
+                    (self._content_offset - self._metadata_offset) % _METADATA_PAIR.size != 0:
+                raise ValueError(f"Document store {self.path} is corrupted, its regions are inconsistent")
+            self._metadata_pairs_count = (self._content_offset - self._metadata_offset) // _METADATA_PAIR.size
+
+            self._strings = self._read_string_table(string_table_offset)
+        except struct.error as e:
+            self.close()
+            raise ValueError(f"Document store {self.path} is corrupted: {e}") from e
+        except ValueError:
+            self.close()
+            raise
+
+    def _read_string_table(self, offset: int) -> list[str]:
+        (strings_count, ) = _STRING_LENGTH.unpack_from(self._mmap, offset)
+        lengths = struct.unpack_from(f"<{strings_count}I", self._mmap, offset + _STRING_LENGTH.size)
+        current_offset = offset + _STRING_LENGTH.size * (strings_count + 1)
+        if current_offset + sum(lengths) > self._index_offset:
+            raise ValueError(f"Document store {self.path} is corrupted, its string table overflows")
+        strings = list()
+        for length in lengths:
+            value = self._mmap[current_offset:current_offset + length].decode("utf-8", errors="surrogatepass")
+            strings.append(sys.intern(value))
+            current_offset += length
+        return strings
+
+    def __len__(self) -> int:
+        return self._document_count
+
+    def __getitem__(self, position: int) -> StoredDocument:
+        if not 0 <= position < self._document_count:
+            raise IndexError(f"Document position {position} is out of range")
+
+        _, _, first_pair, pairs_count = _INDEX_ENTRY.unpack_from(self._mmap,
+                                                                 self._index_offset + position * _INDEX_ENTRY.size)
+        if first_pair + pairs_count > self._metadata_pairs_count:
+            raise ValueError(f"Document store {self.path} is corrupted, document {position} has invalid metadata")
+        metadata = dict()
+        for pair in range(first_pair, first_pair + pairs_count):
+            key_id, value_id = _METADATA_PAIR.unpack_from(self._mmap,
+                                                          self._metadata_offset + pair * _METADATA_PAIR.size)
+            value_string_id = value_id & ~_JSON_VALUE_FLAG
+            if key_id >= len(self._strings) or value_string_id >= len(self._strings):
+                raise ValueError(f"Document store {self.path} is corrupted, document {position} has invalid "
+                                 f"metadata strings")
+            if value_id & _JSON_VALUE_FLAG:
+                # A JSONDecodeError is a ValueError
+                metadata[self._strings[key_id]] = json.loads(self._strings[value_string_id])
+            else:
+                metadata[self._strings[key_id]] = self._strings[value_string_id]
+
+        return StoredDocument(self, position, metadata)
+
+    def __iter__(self) -> typing.Iterator[StoredDocument]:
+        for position in range(self._document_count):
+            yield self[position]
+
+    def read_page_content(self, position: int) -> str:
+        content_offset, compressed_length, _, _ = _INDEX_ENTRY.unpack_from(self._mmap,
+                                                                           self._index_offset +
+                                                                           position * _INDEX_ENTRY.size)
+        start = self._content_offset + content_offset
+        if start + compressed_length > len(self._mmap):
+            raise ValueError(f"Document store {self.path} is corrupted, the content of document {position} overflows")
+        try:
+            # A UnicodeDecodeError is a ValueError
+            return zlib.decompress(self._mmap[start:start + compressed_length]).decode("utf-8", errors="surrogatepass")
+        except zlib.error as e:
+            raise ValueError(f"Document store {self.path} is corrupted, the content of document {position} can't be "
+                             f"decompressed: {e}") from e
+
+    def documents(self) -> typing.Iterator["Document"]:
+        """
+        Lazily yield the stored documents as LangChain `Document` instances.
+        """
+        for stored_document in self:
+            yield stored_document.to_document()
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
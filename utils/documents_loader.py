@@ -1,198 +1,97 @@
-import copy
+import collections
 import json
 import logging
 import os
+import queue
+import shutil
 import sys
+import threading
 import time
 import typing
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import sha512
 from pathlib import Path
 from pathlib import PurePath
 
-from langchain.docstore.document import Document
-from langchain.document_loaders.generic import GenericLoader
-from langchain.document_loaders.parsers.language.language_parser import LanguageParser
-from langchain.text_splitter import Language
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores.faiss import FAISS
-from langchain_community.document_loaders.parsers.language.code_segmenter import CodeSegmenter
-from langchain_community.document_loaders.parsers.language.language_parser import LANGUAGE_EXTENSIONS
-from langchain_community.document_loaders.parsers.language.language_parser import LANGUAGE_SEGMENTERS
-from langchain_core.document_loaders.blob_loaders import Blob
+from langchain_core.documents import Document
 
 from data_models.input import SourceDocumentsInfo
-from .go_segmenters_with_methods import GoSegmenterWithMethods
-from .js_extended_segmenter import ExtendedJavaScriptSegmenter, CONTAINING_SCOPE_SYMBOL
-from .source_code_git_loader import SourceCodeGitLoader
-
+from . import instrumentation
+from . import memory_accounting
+from .code_units import CodeUnit
+from .embedding_cache import EmbeddingCache
+from .embedding_cache import get_embedding_model_identity
+from .embedding_cache import hash_text
+from .faiss_indexes import FaissIndexConfig
+from .faiss_indexes import create_faiss_index
+from .faiss_indexes import load_faiss
+
+# The parser, the splitter, the git loader and FAISS import heavy dependencies (esprima, tree-sitter grammars,
+# GitPython, numpy, faiss), they are imported on first use so that importing this module stays fast
 if typing.TYPE_CHECKING:
+    from langchain_community.vectorstores.faiss import FAISS  # pragma: no cover
     from langchain_core.embeddings import Embeddings  # pragma: no cover
 
+    from .source_code_git_loader import SourceCodeGitLoader  # pragma: no cover
+
 PathLike = typing.Union[str, os.PathLike]
 
-logger = logging.getLogger(f"poc.{__name__}")
+# Called with the number of embedded chunks and the total number of chunks
+ProgressCallback = typing.Callable[[int, int], None]
 
+logger = logging.getLogger(f"poc.{__name__}")
 
-class MultiLanguageRecursiveCharacterTextSplitter(RecursiveCharacterTextSplitter):
-    """
-    A version of langchain's RecursiveCharacterTextSplitter that supports multiple languages.
-    """
+# Bump whenever a change to the segmentation logic changes the documents produced for the same source code, so that
+# persisted documents produced by an older parser are not reused.
+PARSER_VERSION = 1
 
-    def __init__(
-            self,
-            keep_separator: bool = True,
-            **kwargs,
-    ) -> None:
-        """Create a new RecursiveCharacterTextSplitter."""
-        super().__init__(is_separator_regex=True, keep_separator=keep_separator, **kwargs)
+# Metadata key listing the metadata of the other chunks with the same content as a stored chunk
+DUPLICATES_METADATA_KEY = "duplicates"
 
-    def _get_separators(self, language: Language) -> list[str]:
-        try:
-            return RecursiveCharacterTextSplitter.get_separators_for_language(language)
-        except ValueError:
-            return self._separators
-
-    def create_documents(self, texts: list[str], metadatas: list[dict] | None = None) -> list[Document]:
-        """Create documents from a list of texts."""
-        _metadatas = metadatas or [{}] * len(texts)
-        documents = []
-        for i, text in enumerate(texts):
-            index = 0
-            previous_chunk_len = 0
-
-            # Determine the language of the text from the metadata
-            language = _metadatas[i].get("language", None)
-
-            for chunk in self._split_text(text, separators=self._get_separators(language)):
-                metadata = copy.deepcopy(_metadatas[i])
-                if self._add_start_index:
-                    offset = index + previous_chunk_len - self._chunk_overlap
-                    index = text.find(chunk, max(0, offset))
-                    metadata["start_index"] = index
-                    previous_chunk_len = len(chunk)
-                new_doc = Document(page_content=chunk, metadata=metadata)
-                documents.append(new_doc)
-        return documents
+# How many times smaller the embedded batches are when the memory budget is about to be reached
+LOW_MEMORY_BATCH_SIZE_DIVISOR = 4
 
 
-class ExtendedLanguageParser(LanguageParser):
+def deduplicate_chunks(chunked_documents: list[Document]) -> list[Document]:
     """
-    A version of langchain's LanguageParser that supports extended file extension and language parsing.
+    Merge chunks with identical content into a single document, so each distinct text is embedded and stored once.
+    The merged document keeps the metadata of the first chunk, and lists the metadata of the other chunks with the
+    same content under the `DUPLICATES_METADATA_KEY` metadata key. Use `expand_duplicate_chunks` to get back a document
+    per originating chunk from search results, as the VDBs created by `DocumentEmbedding` do.
     """
+    unique_documents: dict[bytes, Document] = dict()
+    for doc in chunked_documents:
+        text_hash = hash_text(doc.page_content)
+        unique_document = unique_documents.get(text_hash)
+        if unique_document is None:
+            unique_documents[text_hash] = doc
+        else:
+            if DUPLICATES_METADATA_KEY not in unique_document.metadata:
+                # Chunks may share their metadata dict, so never modify it in place
+                unique_document = Document(page_content=unique_document.page_content,
+                                           metadata={**unique_document.metadata, DUPLICATES_METADATA_KEY: []})
+                unique_documents[text_hash] = unique_document
+            unique_document.metadata[DUPLICATES_METADATA_KEY].append(doc.metadata)
+    return list(unique_documents.values())
 
-    LANGUAGE_EXTENSIONS: dict[str, str] = {
-        **LANGUAGE_EXTENSIONS,
-        "h": "c",
-        "hpp": "cpp",
-    }
-
-    LANGUAGE_SEGMENTERS: dict[str, type[CodeSegmenter]] = {
-        **LANGUAGE_SEGMENTERS,
-        "go": GoSegmenterWithMethods,
-        "js": ExtendedJavaScriptSegmenter,
-    }
-
-    def lazy_parse(self, blob: Blob) -> typing.Iterator[Document]:
-        try:
-            code = blob.as_string()
-        except Exception as e:
-            logger.warning("Failed to read code for '%s'. Ignoring this file. Error: %s", blob.source, e)
-            return
-
-        language = self.language or (self.LANGUAGE_EXTENSIONS.get(blob.source.rsplit(".", 1)[-1]) if isinstance(
-            blob.source, str) else None)
-
-        if language is None:
-            yield Document(
-                page_content=code,
-                metadata={
-                    "source": blob.source,
-                },
-            )
-            return
-
-        if self.parser_threshold >= len(code.splitlines()):
-            yield Document(
-                page_content=code,
-                metadata={
-                    "source": blob.source,
-                    "language": language,
-                },
-            )
-            return
-
-        segmenter = self.LANGUAGE_SEGMENTERS[language](blob.as_string())
 
-        try:
-            extracted_functions_classes = segmenter.extract_functions_classes()
-
-        except Exception as e:
-
-            logger.warning("Failed to parse code for '%s'. Ignoring this file. Error: %s",
-                           blob.source,
-                           e,
-                           exc_info=True)
-            extracted_functions_classes = []
-
-        # If the code didnt parse, and there are no functions or classes, return the original code
-        if not segmenter.is_valid() and len(extracted_functions_classes) == 0:
-            yield Document(
-                page_content=code,
-                metadata={
-                    "source": blob.source,
-                    "language": language,
-                },
-            )
-            return
-
-        for functions_classes in extracted_functions_classes:
-            if (isinstance(segmenter, ExtendedJavaScriptSegmenter) and
-                    functions_classes.strip().startswith(CONTAINING_SCOPE_SYMBOL)):
-                start_of_func_method_index = functions_classes.find("\n")
-                end_of_containing_scope_name = functions_classes.find("{")
-                yield Document(
-                    page_content=functions_classes[start_of_func_method_index:],
-                    metadata={
-                        "source": blob.source,
-                        "content_type": "functions_classes",
-                        "language": language,
-                        "containing_scope": functions_classes[len(CONTAINING_SCOPE_SYMBOL):end_of_containing_scope_name]
-                    },
-                )
-            else:
-                yield Document(
-                    page_content=functions_classes,
-                    metadata={
-                        "source": blob.source,
-                        "content_type": "functions_classes",
-                        "language": language,
-                    },
-                )
-
-        try:
-            simplified_code = segmenter.simplify_code()
-        # If simplifying the code fails, return the original code
-        except Exception as e:
-            logger.warning("Failed to simplify code for '%s'. Returning original code. Error: %s",
-                           blob.source,
-                           e,
-                           exc_info=True)
-            yield Document(
-                page_content=code,
-                metadata={
-                    "source": blob.source,
-                    "language": language,
-                },
-            )
-        else:
-            yield Document(
-                page_content=simplified_code,
-                metadata={
-                    "source": blob.source,
-                    "content_type": "simplified_code",
-                    "language": language,
-                },
-            )
+def expand_duplicate_chunks(documents: typing.Iterable[Document]) -> list[Document]:
+    """
+    Expand documents merged by `deduplicate_chunks` (e.g. returned from a similarity search) to a document per
+    originating chunk, in place of each merged document.
+    """
+    expanded_documents = []
+    for doc in documents:
+        duplicates = doc.metadata.get(DUPLICATES_METADATA_KEY)
+        if duplicates is None:
+            expanded_documents.append(doc)
+            continue
+        metadata = {key: value for key, value in doc.metadata.items() if key != DUPLICATES_METADATA_KEY}
+        expanded_documents.append(Document(page_content=doc.page_content, metadata=metadata))
+        for duplicate_metadata in duplicates:
+            expanded_documents.append(Document(page_content=doc.page_content, metadata=dict(duplicate_metadata)))
+    return expanded_documents
 
 
 class DocumentEmbedding:
@@ -204,10 +103,17 @@ class DocumentEmbedding:
     def __init__(self,
                  *,
                  embedding: "Embeddings",
+                 embedding_model_identity: str | None = None,
                  vdb_directory: PathLike = "./.cache/am_cache/vdb",
                  git_directory: PathLike = "./.cache/am_cache/git",
+                 embedding_cache_path: PathLike | None = "./.cache/am_cache/embeddings.sqlite",
                  chunk_size: int = 800,
-                 chunk_overlap: int = 160):
+                 chunk_overlap: int = 160,
+                 chunking_workers: int = 1,
+                 collection_workers: int = 4,
+                 embedding_batch_size: int = 1024,
+                 checkpoint_interval: int = 10,
+                 index_config: FaissIndexConfig | None = None):
         """
         Create a new DocumentEmbedding instance.
 
@@ -215,22 +121,50 @@ class DocumentEmbedding:
         ----------
         embedding : Embeddings
             The embedding to use for the FAISS database.
+        embedding_model_identity : str | None, optional
+            Identifies the model of the embedding in the embedding cache and in checkpoints. Required when the
+            embedding has no model name attribute, by default None which uses its model name attribute
         vdb_directory : PathLike
             The directory to save the FAISS database. The database will be saved in a subdirectory based on the hash of
             the source documents.
         git_directory : PathLike, optional
             The directory to use for the Git repository cloning, by default "./.tmp/git_cache"
+        embedding_cache_path : PathLike | None, optional
+            The location of the persistent embedding cache, keyed by embedding model and chunk text, so rebuilding a
+            VDB only embeds chunks that were never embedded before. None disables the cache, by default
+            "./.cache/am_cache/embeddings.sqlite"
         chunk_size : int, optional
             Maximum size of a single chunk, by default 1000
         chunk_overlap : int, optional
             Overlap between chunks, by default 200
+        chunking_workers : int, optional
+            Number of processes used to chunk the documents, by default 1
+        collection_workers : int, optional
+            Number of threads cloning and parsing source repositories concurrently. Sources cloned into the same
+            repository path are always collected one after the other, by default 4
+        embedding_batch_size : int, optional
+            Number of chunks embedded and added to the FAISS database at once, by default 1024
+        checkpoint_interval : int, optional
+            Number of embedded batches between checkpoints of a partially created FAISS database. 0 disables
+            checkpoints, by default 10
+        index_config : FaissIndexConfig | None, optional
+            The FAISS index type and vector encoding of the created VDBs, and whether to load them memory mapped, by
+            default None which creates exact search float32 flat indexes
         """
 
         self._embedding = embedding
+        self._embedding_model_identity = embedding_model_identity
         self._vdb_directory = Path(vdb_directory)
         self._git_directory = Path(git_directory)
+        self._embedding_cache_path = Path(embedding_cache_path) if embedding_cache_path is not None else None
+        self._embedding_cache: EmbeddingCache | None = None
         self._chunk_size = chunk_size
         self._chunk_overlap = chunk_overlap
+        self._chunking_workers = chunking_workers
+        self._collection_workers = collection_workers
+        self._embedding_batch_size = embedding_batch_size
+        self._checkpoint_interval = checkpoint_interval
+        self._index_config = index_config or FaissIndexConfig()
 
     @property
     def embedding(self):
@@ -244,6 +178,16 @@ class DocumentEmbedding:
     def git_directory(self):
         return self._git_directory
 
+    @property
+    def embedding_cache(self) -> EmbeddingCache | None:
+        if self._embedding_cache is None and self._embedding_cache_path is not None:
+            self._embedding_cache = EmbeddingCache(self._embedding_cache_path)
+        return self._embedding_cache
+
+    @property
+    def index_config(self) -> FaissIndexConfig:
+        return self._index_config
+
     @property
     def chunk_size(self):
         return self._chunk_size
@@ -276,6 +220,9 @@ class DocumentEmbedding:
             "chunk_size": self._chunk_size,
             "chunk_overlap": self._chunk_overlap,
         }
+        # Keep the hash of VDBs with the default flat index unchanged
+        if not self._index_config.is_default():
+            obj_to_hash["index"] = self._index_config.get_build_parameters()
 
         # Hash the source documents info
         hash_val = int.from_bytes(bytes=sha512(f"{json.dumps(obj_to_hash)}".encode('utf-8', errors='ignore')).digest(),
@@ -289,9 +236,12 @@ class DocumentEmbedding:
         """
         Chunk the documents into smaller pieces for embedding.
         """
+        from .text_splitters import MultiLanguageRecursiveCharacterTextSplitter
 
         splitter = MultiLanguageRecursiveCharacterTextSplitter(chunk_size=self._chunk_size,
-                                                               chunk_overlap=self._chunk_overlap)
+                                                               chunk_overlap=self._chunk_overlap,
+                                                               offset_chunking=True,
+                                                               max_workers=self._chunking_workers)
         split_documents = splitter.split_documents(documents)
 
         return split_documents
@@ -331,23 +281,203 @@ class DocumentEmbedding:
 
         repo_path = self.get_repo_path(source_info)
 
-        blob_loader = SourceCodeGitLoader(repo_path=repo_path,
-                                          clone_url=source_info.git_repo,
-                                          ref=source_info.ref,
-                                          include=source_info.include,
-                                          exclude=source_info.exclude)
+        from langchain_community.document_loaders.generic import GenericLoader
+
+        from .extended_language_parser import ExtendedLanguageParser
+
+        blob_loader = self._create_blob_loader(source_info)
 
         blob_parser = ExtendedLanguageParser()
 
         loader = GenericLoader(blob_loader=blob_loader, blob_parser=blob_parser)
 
-        documents = loader.load()
+        with instrumentation.span("embedding.collect_documents"):
+            documents = loader.load()
 
         logger.debug("Collected documents for '%s', Document count: %d", repo_path, len(documents))
 
         return documents
 
-    def create_vdb(self, source_infos: list[SourceDocumentsInfo], output_path: PathLike):
+    def iter_documents(self, source_info: SourceDocumentsInfo, buffer_size: int = 256) -> typing.Iterator[Document]:
+        """
+        Lazily collect documents from a source document info. This behaves like `collect_documents`, but instead of
+        building the full list of documents, the files are loaded and segmented by a background thread and yielded as
+        soon as they are produced. At most `buffer_size` documents are buffered ahead of the consumer, so consumers
+        routing each document to their own indexes never hold the full list of documents in memory.
+
+        Parameters
+        ----------
+        source_info : SourceDocumentsInfo
+            The source document info to collect documents
+        buffer_size : int, optional
+            Maximum number of segmented documents waiting for the consumer, by default 256
+
+        Yields
+        ------
+        Document
+            The documents collected from the source document info.
+        """
+        for code_unit in self.iter_code_units(source_info, buffer_size=buffer_size):
+            yield code_unit.to_document()
+
+    def iter_code_units(self, source_info: SourceDocumentsInfo, buffer_size: int = 256) -> typing.Iterator[CodeUnit]:
+        """
+        Same as `iter_documents`, but yields the compact `CodeUnit` records produced by the parser, which
+        `ChainOfCallsRetriever` consumes without converting them to LangChain documents.
+        """
+        from .extended_language_parser import ExtendedLanguageParser
+
+        repo_path = self.get_repo_path(source_info)
+
+        blob_loader = self._create_blob_loader(source_info)
+        blob_parser = ExtendedLanguageParser()
+
+        units_buffer: queue.Queue = queue.Queue(maxsize=buffer_size)
+        stop_event = threading.Event()
+        end_of_units = object()
+
+        def put(item) -> bool:
+            # Give up waiting for the consumer if it stopped iterating
+            while not stop_event.is_set():
+                try:
+                    units_buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for blob in blob_loader.yield_blobs():
+                    for code_unit in blob_parser.lazy_parse_code_units(blob):
+                        if not put(code_unit):
+                            return
+            except Exception as e:
+                put(e)
+            else:
+                put(end_of_units)
+
+        producer = threading.Thread(target=produce, name=f"code-units-producer-{repo_path.name}", daemon=True)
+        producer.start()
+
+        units_count = 0
+        try:
+            while True:
+                item = units_buffer.get()
+                if item is end_of_units:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                units_count += 1
+                yield item
+        finally:
+            stop_event.set()
+            producer.join()
+
+        logger.debug("Streamed code units for '%s', Unit count: %d", repo_path, units_count)
+
+    def collect_documents_incremental(self,
+                                      source_info: SourceDocumentsInfo,
+                                      base_ref: str,
+                                      base_documents: list[Document]) -> list[Document]:
+        """
+        Collect documents for a source document info, reusing the documents that were already collected for the same
+        repository at `base_ref`. Only the files that were added or modified between `base_ref` and `source_info.ref`
+        are parsed and segmented again, documents of deleted files are dropped and all other documents are shared with
+        `base_documents`.
+
+        Parameters
+        ----------
+        source_info : SourceDocumentsInfo
+            The source document info to collect documents
+        base_ref : str
+            The git reference that `base_documents` were collected from.
+        base_documents : list[Document]
+            The documents previously collected for the same repository, include and exclude patterns at `base_ref`.
+
+        Returns
+        -------
+        list[Document]
+            Returns a list of documents equivalent to the ones `collect_documents` would return for `source_info`.
+        """
+        from langchain_community.document_loaders.generic import GenericLoader
+
+        from .extended_language_parser import ExtendedLanguageParser
+
+        repo_path = self.get_repo_path(source_info)
+
+        blob_loader = self._create_blob_loader(source_info)
+
+        changed_paths, deleted_paths = blob_loader.changed_paths(base_ref)
+
+        stale_paths = changed_paths.union(deleted_paths)
+        unchanged_documents = [doc for doc in base_documents if doc.metadata.get("source") not in stale_paths]
+
+        # Only parse the files that were added or modified since the base ref
+        blob_loader.paths = changed_paths
+
+        loader = GenericLoader(blob_loader=blob_loader, blob_parser=ExtendedLanguageParser())
+
+        changed_documents = loader.load()
+
+        logger.debug("Incrementally collected documents for '%s' from '%s', Reused: %d, Re-parsed: %d",
+                     repo_path,
+                     base_ref,
+                     len(unchanged_documents),
+                     len(changed_documents))
+
+        return unchanged_documents + changed_documents
+
+    def _create_blob_loader(self, source_info: SourceDocumentsInfo) -> "SourceCodeGitLoader":
+        from .source_code_git_loader import SourceCodeGitLoader
+
+        return SourceCodeGitLoader(repo_path=self.get_repo_path(source_info),
+                                   clone_url=source_info.git_repo,
+                                   ref=source_info.ref,
+                                   include=source_info.include,
+                                   exclude=source_info.exclude)
+
+    def _submit_document_collection(self,
+                                    executor: ThreadPoolExecutor,
+                                    source_infos: list[SourceDocumentsInfo]) -> list[Future]:
+        """
+        Collect the documents of several source document infos concurrently on `executor`. Source document infos
+        sharing a repository path are collected one after the other by the same task, since they check out the same
+        working tree.
+
+        Returns
+        -------
+        list[Future]
+            Returns a future of the `collect_documents` result for each source document info, in the same order.
+        """
+
+        logger.debug("Collecting documents from git repos. Source Infos: %s",
+                     json.dumps([x.model_dump(mode="json") for x in source_infos]))
+
+        futures = [Future() for _ in source_infos]
+
+        source_infos_by_repo_path: dict[Path, list[tuple[SourceDocumentsInfo, Future]]] = collections.defaultdict(list)
+        for source_info, future in zip(source_infos, futures):
+            source_infos_by_repo_path[self.get_repo_path(source_info)].append((source_info, future))
+
+        def collect_repo_documents(repo_source_infos: list[tuple[SourceDocumentsInfo, Future]]):
+            for source_info, future in repo_source_infos:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(self.collect_documents(source_info))
+                except BaseException as e:
+                    future.set_exception(e)
+
+        for repo_source_infos in source_infos_by_repo_path.values():
+            executor.submit(collect_repo_documents, repo_source_infos)
+
+        return futures
+
+    def create_vdb(self,
+                   source_infos: list[SourceDocumentsInfo],
+                   output_path: PathLike,
+                   progress_callback: ProgressCallback | None = None):
         """
         Create a FAISS database from a list of input directories.
 
@@ -358,6 +488,9 @@ class DocumentEmbedding:
             documents.
         output_path : PathLike
             The location to save the FAISS database.
+        progress_callback : ProgressCallback | None, optional
+            Called with the number of embedded chunks and the total number of chunks after each embedded batch, by
+            default None
 
         Returns
         -------
@@ -365,8 +498,18 @@ class DocumentEmbedding:
             Returns an instance of the FAISS database.
         """
 
-        logger.debug("Collecting documents from git repos. Source Infos: %s",
-                     json.dumps([x.model_dump(mode="json") for x in source_infos]))
+        with ThreadPoolExecutor(max_workers=self._collection_workers,
+                                thread_name_prefix="collect-documents") as executor:
+            documents_futures = self._submit_document_collection(executor, source_infos)
+
+            documents = [doc for documents_future in documents_futures for doc in documents_future.result()]
+
+        return self._create_vdb_from_documents(documents, output_path, progress_callback)
+
+    def _create_vdb_from_documents(self,
+                                   documents: list[Document],
+                                   output_path: PathLike,
+                                   progress_callback: ProgressCallback | None = None) -> "FAISS":
 
         output_path = Path(output_path)
 
@@ -375,33 +518,31 @@ class DocumentEmbedding:
 
             logger.warning("Vector Database already exists and will be overwritten: %s", output_path)
 
-        documents = []
-        for input_dir in source_infos:
-            documents.extend(self.collect_documents(input_dir))
-
         # Apply chunking on the source documents
-        chunked_documents = self._chunk_documents(documents)
-
-        logger.debug("Creating FAISS database from source documents. Doc count: %d, Chunks: %s, Location: %s",
+        with instrumentation.span("embedding.chunk_documents"):
+            chunked_documents = self._chunk_documents(documents)
+
+            # Embed each distinct chunk text once, e.g. for vendored code found in several paths
+            unique_chunked_documents = deduplicate_chunks(chunked_documents)
+        instrumentation.count("embedding.chunks", len(chunked_documents))
+        instrumentation.count("embedding.unique_chunks", len(unique_chunked_documents))
+        memory_accounting.report_memory("chunking", documents=documents, chunked_documents=chunked_documents,
+                                        unique_chunked_documents=unique_chunked_documents)
+
+        logger.debug("Creating FAISS database from source documents. Doc count: %d, Chunks: %s, Unique chunks: %d, "
+                     "Location: %s",
                      len(documents),
                      len(chunked_documents),
+                     len(unique_chunked_documents),
                      output_path)
 
-        saved_show_progress = getattr(self._embedding, "show_progress", None)
-        saved_show_progress_bar = getattr(self._embedding, "show_progress_bar", None)
-
-        # Attempt to enable progress bar for VDB generation if supported
-        if (hasattr(self._embedding, "show_progress")):
-            setattr(self._embedding, "show_progress", True)
-        if (hasattr(self._embedding, "show_progress_bar")):
-            setattr(self._embedding, "show_progress_bar", True)
-
         embedding_start_time = time.time()
 
         # Create the FAISS database
-        db = FAISS.from_documents(chunked_documents, self._embedding)
+        db = self._build_faiss_in_batches(unique_chunked_documents, output_path, progress_callback)
 
         logger.debug("Completed embedding in %.2f seconds for '%s'", time.time() - embedding_start_time, output_path)
+        memory_accounting.report_memory("embedding", faiss=lambda: memory_accounting.estimate_faiss_size(db))
 
         # Clear the CUDA cache if torch is available. This is to prevent the pytorch cache from growing when it will not be reused
         try:
@@ -410,17 +551,168 @@ class DocumentEmbedding:
         except ImportError:
             pass
 
-        # Revert progress bar setting
-        if (saved_show_progress is not None):
-            setattr(self._embedding, "show_progress", saved_show_progress)
-        if (saved_show_progress_bar is not None):
-            setattr(self._embedding, "show_progress_bar", saved_show_progress_bar)
-
         # Ensure the directory exists
         output_path.mkdir(exist_ok=True, parents=True)
 
         # Save the database
-        db.save_local(str(output_path))
+        with instrumentation.span("embedding.save_vdb"):
+            db.save_local(str(output_path))
+
+        return db
+
+    def _get_checkpoint_path(self, output_path: Path) -> Path:
+        try:
+            relative_output_path = output_path.relative_to(self._vdb_directory)
+        except ValueError:
+            relative_output_path = Path(output_path.name)
+        return self._vdb_directory / "checkpoints" / relative_output_path
+
+    def _build_faiss_in_batches(self,
+                                chunked_documents: list[Document],
+                                output_path: Path,
+                                progress_callback: ProgressCallback | None = None) -> "FAISS":
+        """
+        Embed the chunks in batches of `embedding_batch_size` and add each batch to the FAISS database, instead of
+        embedding all the chunks at once. Every `checkpoint_interval` batches, the partial database is saved under
+        `vdb_directory`/checkpoints, and a later build of the same chunks resumes from the last checkpoint.
+
+        Index types that need training keep the embedded batches until `training_sample_size` vectors (or all of
+        them) are available, train the index on them and then add them.
+
+        When the memory budget is about to be reached, the batches are `LOW_MEMORY_BATCH_SIZE_DIVISOR` times smaller,
+        to hold fewer texts and vectors at once.
+        """
+
+        checkpoint_path = self._get_checkpoint_path(output_path)
+        checkpoint_state_path = checkpoint_path / "checkpoint.json"
+
+        chunks_hash = sha512()
+        for doc in chunked_documents:
+            chunks_hash.update(hash_text(doc.page_content))
+        checkpoint_key = {
+            "embedding": get_embedding_model_identity(self._embedding, self._embedding_model_identity),
+            "chunks": chunks_hash.hexdigest(),
+            "index": self._index_config.get_build_parameters(),
+        }
+
+        total_chunks = len(chunked_documents)
+        embedded_chunks = 0
+        db: "FAISS | None" = None
+
+        if checkpoint_state_path.exists():
+            with open(checkpoint_state_path) as checkpoint_state_file:
+                checkpoint_state = json.load(checkpoint_state_file)
+            if checkpoint_state.get("key") == checkpoint_key:
+                from .deduplicated_faiss import DeduplicatedFAISS
+
+                db = load_faiss(checkpoint_path, self._embedding, vectorstore_class=DeduplicatedFAISS)
+                embedded_chunks = checkpoint_state["embedded_chunks"]
+                # The checkpoint state is written after the index, a mismatch means a crash in between
+                if db.index.ntotal != embedded_chunks:
+                    db = None
+                    embedded_chunks = 0
+                else:
+                    logger.info("Resuming VDB creation from checkpoint '%s' at chunk %d/%d",
+                                checkpoint_path,
+                                embedded_chunks,
+                                total_chunks)
+
+        # Embedded chunks waiting for enough vectors to train the index
+        training_sample_size = min(total_chunks, self._index_config.training_sample_size)
+        pending_text_embeddings: list[tuple[str, list[float]]] = []
+        pending_metadatas: list[dict] = []
+
+        batches_since_checkpoint = 0
+
+        embedding_batch_size = self._embedding_batch_size
+        if memory_accounting.should_save_memory():
+            embedding_batch_size = max(1, embedding_batch_size // LOW_MEMORY_BATCH_SIZE_DIVISOR)
+
+        for batch_start in range(embedded_chunks, total_chunks, embedding_batch_size):
+            batch = chunked_documents[batch_start:batch_start + embedding_batch_size]
+            texts = [doc.page_content for doc in batch]
+
+            # Only embed the chunks that are not in the embedding cache
+            with instrumentation.span("embedding.embed_batch"):
+                if self.embedding_cache is not None:
+                    vectors = self.embedding_cache.embed_documents(self._embedding, texts,
+                                                                   self._embedding_model_identity)
+                else:
+                    vectors = self._embedding.embed_documents(texts)
+
+            text_embeddings = list(zip(texts, vectors))
+            metadatas = [doc.metadata for doc in batch]
+            if db is not None:
+                db.add_embeddings(text_embeddings=text_embeddings, metadatas=metadatas)
+            else:
+                pending_text_embeddings.extend(text_embeddings)
+                pending_metadatas.extend(metadatas)
+                if not self._index_config.requires_training() or len(pending_text_embeddings) >= training_sample_size:
+                    db = self._create_faiss(pending_text_embeddings, pending_metadatas, total_chunks)
+                    pending_text_embeddings = []
+                    pending_metadatas = []
+
+            embedded_chunks = batch_start + len(batch)
+            batches_since_checkpoint += 1
+
+            if progress_callback is not None:
+                progress_callback(embedded_chunks, total_chunks)
+            else:
+                logger.debug("Embedded %d/%d chunks for '%s'", embedded_chunks, total_chunks, output_path)
+
+            if self._checkpoint_interval > 0 and batches_since_checkpoint >= self._checkpoint_interval and \
+                    embedded_chunks < total_chunks and db is not None:
+                db.save_local(str(checkpoint_path))
+                temp_state_path = checkpoint_state_path.with_suffix(".tmp")
+                with open(temp_state_path, "w") as checkpoint_state_file:
+                    json.dump({"key": checkpoint_key, "embedded_chunks": embedded_chunks}, checkpoint_state_file)
+                os.replace(temp_state_path, checkpoint_state_path)
+                batches_since_checkpoint = 0
+
+        if db is None:
+            raise ValueError(f"No chunks to create the VDB '{output_path}' from")
+
+        shutil.rmtree(checkpoint_path, ignore_errors=True)
+
+        return db
+
+    def _create_faiss(self,
+                      text_embeddings: list[tuple[str, list[float]]],
+                      metadatas: list[dict],
+                      total_chunks: int) -> "FAISS":
+        """
+        Create the FAISS database of the configured index type from its first embedded chunks, which are also used to
+        train the index if required.
+        """
+        import numpy as np
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+
+        from .deduplicated_faiss import DeduplicatedFAISS
+
+        if self._index_config.is_default():
+            return DeduplicatedFAISS.from_embeddings(text_embeddings=text_embeddings,
+                                                     embedding=self._embedding,
+                                                     metadatas=metadatas)
+
+        training_vectors = np.asarray([vector for _, vector in text_embeddings], dtype=np.float32)
+        index = create_faiss_index(self._index_config, training_vectors, total_chunks)
+
+        db = DeduplicatedFAISS(embedding_function=self._embedding,
+                               index=index,
+                               docstore=InMemoryDocstore(),
+                               index_to_docstore_id={})
+        db.add_embeddings(text_embeddings=text_embeddings, metadatas=metadatas)
+
+        return db
+
+    def load_vdb(self, vdb_path: PathLike) -> "FAISS":
+        """
+        Load a FAISS database created by `create_vdb`, memory mapped if `index_config.mmap` is set.
+        """
+        from .deduplicated_faiss import DeduplicatedFAISS
+
+        db = load_faiss(vdb_path, self._embedding, mmap=self._index_config.mmap, vectorstore_class=DeduplicatedFAISS)
+        self._index_config.apply_search_parameters(db.index)
 
         return db
 
@@ -443,39 +735,79 @@ class DocumentEmbedding:
         code_vdb: Path | None = None
         doc_vdb: Path | None = None
 
-        # Create embeddings for each source type
-        for source_type in ["code", "doc"]:
+        source_types = [
+            source_type for source_type in ["code", "doc"] if not (ignore_code_embedding and source_type == "code")
+        ]
 
-            if ignore_code_embedding and source_type == "code":
-                continue
+        # Filter the source documents
+        source_infos_by_type = {
+            source_type: [source_info for source_info in input_sources if source_info.type == source_type]
+            for source_type in source_types
+        }
 
-            # Filter the source documents
-            source_infos = [source_info for source_info in input_sources if source_info.type == source_type]
+        # Determine the output path by combining the vdb_directory with the hash of the source documents
+        vdb_output_dirs = {
+            source_type: self.vdb_directory / source_type / str(self.hash_source_documents_info(source_infos))
+            for source_type, source_infos in source_infos_by_type.items() if source_infos
+        }
 
-            if source_infos:
+        rebuild_types = [
+            source_type for source_type, vdb_output_dir in vdb_output_dirs.items()
+            if not vdb_output_dir.exists() or os.environ.get("poc_ALWAYS_REBUILD_VDB", "0") == "1"
+        ]
 
-                # Determine the output path by combining the vdb_directory with the hash of the source documents
-                vdb_output_dir = self.vdb_directory / source_type / str(self.hash_source_documents_info(source_infos))
+        with ThreadPoolExecutor(max_workers=self._collection_workers,
+                                thread_name_prefix="collect-documents") as executor:
 
-                if (not vdb_output_dir.exists() or os.environ.get("poc_ALWAYS_REBUILD_VDB", "0") == "1"):
-                    vdb = self.create_vdb(source_infos=source_infos, output_path=vdb_output_dir)
-                else:
-                    logger.debug("Cache hit on VDB. Loading existing FAISS database: %s", vdb_output_dir)
+            # Clone and parse the sources of all the VDBs to build at once, so the sources of the next type are
+            # collected while the previous type is embedded
+            rebuild_source_infos = [
+                source_info for source_type in rebuild_types for source_info in source_infos_by_type[source_type]
+            ]
+            documents_futures = dict(
+                zip(map(id, rebuild_source_infos), self._submit_document_collection(executor, rebuild_source_infos)))
 
-                    vdb = FAISS.load_local(str(vdb_output_dir), self._embedding, allow_dangerous_deserialization=True)
+            # Create embeddings for each source type
+            for source_type in source_types:
 
-            else:
-                vdb_output_dir = None
-                vdb = None
-
-            if (source_type == "code"):
-                if (vdb is not None):
-                    code_vdb = vdb_output_dir
-            elif (source_type == "doc"):
-                if (vdb is not None):
-                    doc_vdb = vdb_output_dir
-            else:
-                raise ValueError(f"Unknown source type: {source_type}")  # pragma: no cover
+                source_infos = source_infos_by_type[source_type]
+
+                if source_infos:
+
+                    vdb_output_dir = vdb_output_dirs[source_type]
+
+                    if source_type in rebuild_types:
+                        documents = [
+                            doc for source_info in source_infos for doc in documents_futures[id(source_info)].result()
+                        ]
+                        vdb = self._create_vdb_from_documents(documents, output_path=vdb_output_dir)
+                    else:
+                        logger.debug("Cache hit on VDB. Loading existing FAISS database: %s", vdb_output_dir)
+
+                        vdb = self.load_vdb(vdb_output_dir)
+
+                else:
+                    vdb_output_dir = None
+                    vdb = None
+
+                if (source_type == "code"):
+                    if (vdb is not None):
+                        code_vdb = vdb_output_dir
+                elif (source_type == "doc"):
+                    if (vdb is not None):
+                        doc_vdb = vdb_output_dir
+                else:
+                    raise ValueError(f"Unknown source type: {source_type}")  # pragma: no cover
 
         return code_vdb, doc_vdb
 
+
+def __getattr__(name: str):
+    # The parser and the splitter used to be defined here, they are still importable from this module
+    if name == "ExtendedLanguageParser":
+        from .extended_language_parser import ExtendedLanguageParser
+        return ExtendedLanguageParser
+    if name == "MultiLanguageRecursiveCharacterTextSplitter":
+        from .text_splitters import MultiLanguageRecursiveCharacterTextSplitter
+        return MultiLanguageRecursiveCharacterTextSplitter
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,166 @@
+import logging
+import os
+import sqlite3
+import threading
+import typing
+from hashlib import sha256
+from pathlib import Path
+
+from . import instrumentation
+
+if typing.TYPE_CHECKING:
+    import numpy as np  # pragma: no cover
+    from langchain_core.embeddings import Embeddings  # pragma: no cover
+
+PathLike = typing.Union[str, os.PathLike]
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+# SQLite limits the number of host parameters in a single statement
+_LOOKUP_BATCH_SIZE = 500
+
+
+def get_embedding_model_identity(embedding: "Embeddings", model_identity: str | None = None) -> str:
+    """
+    Returns a string identifying the model of an embedding, used to key cached vectors. Vectors of different models
+    are never mixed.
+
+    Parameters
+    ----------
+    embedding : Embeddings
+        The embedding, identified by its class and its model name attribute.
+    model_identity : str | None, optional
+        Identifies the model of embeddings without a model name attribute, or of different models behind the same
+        name, by default None
+
+    Raises
+    ------
+    ValueError
+        If no model identity is given and the embedding has no model name attribute.
+    """
+    if model_identity is not None:
+        return f"{embedding.__class__.__qualname__}:{model_identity}"
+    for attribute in ("model_name", "model", "model_id", "deployment_name"):
+        value = getattr(embedding, attribute, None)
+        if isinstance(value, str) and value != "":
+            return f"{embedding.__class__.__qualname__}:{value}"
+    raise ValueError(f"Unable to identify the model of the {embedding.__class__.__qualname__} embedding, a model "
+                     f"identity must be given to cache its vectors")
+
+
+def hash_text(text: str) -> bytes:
+    return sha256(text.encode('utf-8', errors='surrogatepass')).digest()
+
+
+class EmbeddingCache:
+    """
+    A persistent cache of embedding vectors keyed by (embedding model identity, chunk text hash), stored in a local
+    SQLite database. Vectors are stored as float32 arrays.
+    """
+
+    def __init__(self, path: PathLike):
+        """
+        Open or create an embedding cache.
+
+        Parameters
+        ----------
+        path : PathLike
+            The location of the SQLite database file.
+        """
+        self._path = Path(path)
+        self._path.parent.mkdir(exist_ok=True, parents=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self._path), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings ("
+                                     "model TEXT NOT NULL, "
+                                     "text_hash BLOB NOT NULL, "
+                                     "vector BLOB NOT NULL, "
+                                     "PRIMARY KEY (model, text_hash)) WITHOUT ROWID")
+
+    @property
+    def path(self):
+        return self._path
+
+    def get_many(self, model: str, text_hashes: typing.Sequence[bytes]) -> "dict[bytes, np.ndarray]":
+        """
+        Returns the cached vectors of a model for the given text hashes. Missing hashes are not included.
+        """
+        import numpy as np
+
+        vectors = dict()
+        with self._lock:
+            for batch_start in range(0, len(text_hashes), _LOOKUP_BATCH_SIZE):
+                batch = text_hashes[batch_start:batch_start + _LOOKUP_BATCH_SIZE]
+                rows = self._connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN "
+                    f"({','.join('?' * len(batch))})", (model, *batch))
+                for text_hash, vector in rows:
+                    vectors[text_hash] = np.frombuffer(vector, dtype=np.float32)
+        return vectors
+
+    def put_many(self, model: str, vectors: dict[bytes, typing.Sequence[float]]):
+        """
+        Store vectors of a model keyed by their text hashes.
+        """
+        import numpy as np
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                ((model, text_hash, np.asarray(vector, dtype=np.float32).tobytes())
+                 for text_hash, vector in vectors.items()))
+
+    def embed_documents(self,
+                        embedding: "Embeddings",
+                        texts: list[str],
+                        model_identity: str | None = None) -> list[list[float]]:
+        """
+        Embed texts, only calling the embedding for texts that are not cached yet, and caching the new vectors.
+
+        Parameters
+        ----------
+        embedding : Embeddings
+            The embedding used for the cache misses.
+        texts : list[str]
+            The texts to embed.
+        model_identity : str | None, optional
+            Identifies the model of the embedding, see `get_embedding_model_identity`, by default None
+
+        Returns
+        -------
+        list[list[float]]
+            Returns the vectors of the texts, in the same order as the texts.
+        """
+        model = get_embedding_model_identity(embedding, model_identity)
+        text_hashes = [hash_text(text) for text in texts]
+
+        vectors = self.get_many(model, list(set(text_hashes)))
+
+        missing_texts = dict()
+        for text_hash, text in zip(text_hashes, texts):
+            if text_hash not in vectors:
+                missing_texts[text_hash] = text
+
+        logger.debug("Embedding cache hits: %d, misses: %d, model: '%s'",
+                     len(texts) - len(missing_texts),
+                     len(missing_texts),
+                     model)
+        instrumentation.count("embedding_cache.hits", len(texts) - len(missing_texts))
+        instrumentation.count("embedding_cache.misses", len(missing_texts))
+
+        if len(missing_texts) > 0:
+            import numpy as np
+
+            new_vectors = embedding.embed_documents(list(missing_texts.values()))
+            new_vectors_by_hash = dict(zip(missing_texts.keys(), new_vectors))
+            self.put_many(model, new_vectors_by_hash)
+            vectors.update({text_hash: np.asarray(vector, dtype=np.float32)
+                            for text_hash, vector in new_vectors_by_hash.items()})
+
+        return [vectors[text_hash].tolist() for text_hash in text_hashes]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
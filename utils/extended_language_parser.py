@@ -0,0 +1,122 @@
+import logging
+import typing
+
+from langchain_community.document_loaders.parsers.language.code_segmenter import CodeSegmenter
+from langchain_community.document_loaders.parsers.language.language_parser import LANGUAGE_EXTENSIONS
+from langchain_community.document_loaders.parsers.language.language_parser import LANGUAGE_SEGMENTERS
+from langchain_community.document_loaders.parsers.language.language_parser import LanguageParser
+from langchain_core.document_loaders.blob_loaders import Blob
+from langchain_core.documents import Document
+
+from .code_units import CodeUnit
+from .code_units import ContentType
+from . import instrumentation
+from .go_segmenters_with_methods import GoSegmenterWithMethods
+from .js_extended_segmenter import ExtendedJavaScriptSegmenter, CONTAINING_SCOPE_SYMBOL
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+
+class ExtendedLanguageParser(LanguageParser):
+    """
+    A version of langchain's LanguageParser that supports extended file extension and language parsing.
+    """
+
+    LANGUAGE_EXTENSIONS: dict[str, str] = {
+        **LANGUAGE_EXTENSIONS,
+        "h": "c",
+        "hpp": "cpp",
+    }
+
+    LANGUAGE_SEGMENTERS: dict[str, type[CodeSegmenter]] = {
+        **LANGUAGE_SEGMENTERS,
+        "go": GoSegmenterWithMethods,
+        "js": ExtendedJavaScriptSegmenter,
+    }
+
+    def lazy_parse(self, blob: Blob) -> typing.Iterator[Document]:
+        for code_unit in self.lazy_parse_code_units(blob):
+            yield code_unit.to_document()
+
+    def lazy_parse_code_units(self, blob: Blob) -> typing.Iterator[CodeUnit]:
+        """
+        Parse a blob into compact `CodeUnit` records. The functions and classes units reference the code of the file
+        by offsets instead of holding copies of it. `lazy_parse` converts these records to LangChain documents.
+        """
+        try:
+            code = blob.as_string()
+        except Exception as e:
+            logger.warning("Failed to read code for '%s'. Ignoring this file. Error: %s", blob.source, e)
+            return
+
+        language = self.language or (self.LANGUAGE_EXTENSIONS.get(blob.source.rsplit(".", 1)[-1]) if isinstance(
+            blob.source, str) else None)
+
+        if language is None:
+            yield CodeUnit(source=blob.source, text=code)
+            return
+
+        if self.parser_threshold >= len(code.splitlines()):
+            yield CodeUnit(source=blob.source, text=code, language=language)
+            return
+
+        instrumentation.count("parser.segmented_files")
+        segmenter = self.LANGUAGE_SEGMENTERS[language](blob.as_string())
+
+        try:
+            with instrumentation.span("parser.extract_functions_classes"):
+                extracted_functions_classes = segmenter.extract_functions_classes()
+
+        except Exception as e:
+
+            logger.warning("Failed to parse code for '%s'. Ignoring this file. Error: %s",
+                           blob.source,
+                           e,
+                           exc_info=True)
+            extracted_functions_classes = []
+
+        # If the code didnt parse, and there are no functions or classes, return the original code
+        if not segmenter.is_valid() and len(extracted_functions_classes) == 0:
+            yield CodeUnit(source=blob.source, text=code, language=language)
+            return
+
+        # The segmenter may preprocess the code, the extracted functions and classes are parts of its version of it
+        segmented_code = getattr(segmenter, "code", code)
+
+        for functions_classes in extracted_functions_classes:
+            if (isinstance(segmenter, ExtendedJavaScriptSegmenter) and
+                    functions_classes.strip().startswith(CONTAINING_SCOPE_SYMBOL)):
+                start_of_func_method_index = functions_classes.find("\n")
+                end_of_containing_scope_name = functions_classes.find("{")
+                yield CodeUnit.from_text(
+                    source=blob.source,
+                    text=segmented_code,
+                    content=functions_classes[start_of_func_method_index:],
+                    content_type=ContentType.FUNCTIONS_CLASSES,
+                    language=language,
+                    containing_scope=functions_classes[len(CONTAINING_SCOPE_SYMBOL):end_of_containing_scope_name]
+                )
+            else:
+                yield CodeUnit.from_text(
+                    source=blob.source,
+                    text=segmented_code,
+                    content=functions_classes,
+                    content_type=ContentType.FUNCTIONS_CLASSES,
+                    language=language
+                )
+
+        try:
+            with instrumentation.span("parser.simplify_code"):
+                simplified_code = segmenter.simplify_code()
+        # If simplifying the code fails, return the original code
+        except Exception as e:
+            logger.warning("Failed to simplify code for '%s'. Returning original code. Error: %s",
+                           blob.source,
+                           e,
+                           exc_info=True)
+            yield CodeUnit(source=blob.source, text=code, language=language)
+        else:
+            yield CodeUnit(source=blob.source,
+                           text=simplified_code,
+                           content_type=ContentType.SIMPLIFIED_CODE,
+                           language=language)
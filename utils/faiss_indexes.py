@@ -0,0 +1,191 @@
+import logging
+import math
+import os
+import pickle
+import typing
+from pathlib import Path
+
+if typing.TYPE_CHECKING:
+    import numpy as np  # pragma: no cover
+    from langchain_community.vectorstores.faiss import FAISS  # pragma: no cover
+    from langchain_core.embeddings import Embeddings  # pragma: no cover
+
+PathLike = typing.Union[str, os.PathLike]
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+VECTOR_ENCODINGS = ("float32", "float16", "sq8")
+
+_SCALAR_QUANTIZERS = {"float16": "SQfp16", "sq8": "SQ8"}
+
+
+class FaissIndexConfig:
+    """
+    The FAISS index backend of a VDB.
+
+    - index_type: "flat" (exact search, LangChain's default), "ivf_flat" or "ivf_pq" (inverted lists trained on a
+      sample of the vectors, searching only `nprobe` of `nlist` lists), or "hnsw" (graph based search).
+    - vector_encoding: how the vectors are stored by "flat", "ivf_flat" and "hnsw" indexes. "float32" as is, "float16"
+      or "sq8" (8 bit scalar quantization) to halve or quarter the memory. "ivf_pq" always stores product quantized
+      codes of `pq_m` bytes per vector.
+    - nlist: number of inverted lists, by default 4 * sqrt(number of vectors).
+    - nprobe: number of inverted lists visited per search.
+    - pq_m: number of sub quantizers of "ivf_pq", must divide the embedding dimension, by default the largest of
+      64, 32, 16 and 8 dividing it into sub vectors of at least 4 dimensions.
+    - hnsw_m: number of neighbors per node of "hnsw".
+    - hnsw_ef_search: size of the candidates list per "hnsw" search.
+    - training_sample_size: maximum number of vectors used to train "ivf_flat", "ivf_pq" and "sq8" indexes.
+    - mmap: load persisted indexes memory mapped instead of reading them into memory, where FAISS supports it.
+    """
+
+    def __init__(self,
+                 index_type: str = "flat",
+                 vector_encoding: str = "float32",
+                 nlist: int | None = None,
+                 nprobe: int = 16,
+                 pq_m: int | None = None,
+                 hnsw_m: int = 32,
+                 hnsw_ef_search: int = 64,
+                 training_sample_size: int = 50_000,
+                 mmap: bool = False):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type}, expected one of {INDEX_TYPES}")
+        if vector_encoding not in VECTOR_ENCODINGS:
+            raise ValueError(f"Unknown vector encoding {vector_encoding}, expected one of {VECTOR_ENCODINGS}")
+
+        self.index_type = index_type
+        self.vector_encoding = vector_encoding
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_search = hnsw_ef_search
+        self.training_sample_size = training_sample_size
+        self.mmap = mmap
+
+    def is_default(self) -> bool:
+        return self.index_type == "flat" and self.vector_encoding == "float32"
+
+    def requires_training(self) -> bool:
+        return self.index_type in ("ivf_flat", "ivf_pq") or self.vector_encoding == "sq8"
+
+    def get_build_parameters(self) -> dict:
+        """
+        Returns the parameters that change the content of a created index, excluding the search and load time ones.
+        """
+        return {
+            "index_type": self.index_type,
+            "vector_encoding": self.vector_encoding,
+            "nlist": self.nlist,
+            "pq_m": self.pq_m,
+            "hnsw_m": self.hnsw_m,
+            "training_sample_size": self.training_sample_size,
+        }
+
+    def apply_search_parameters(self, index):
+        """
+        Set the search time parameters of the configuration on a FAISS index, which are not persisted with it.
+        """
+        if hasattr(index, "nprobe"):
+            index.nprobe = self.nprobe
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = self.hnsw_ef_search
+
+    def get_factory_string(self, dimension: int, vectors_count: int, training_vectors_count: int) -> str:
+        """
+        Returns the FAISS `index_factory` description of the index.
+
+        Parameters
+        ----------
+        dimension : int
+            The dimension of the vectors.
+        vectors_count : int
+            The total number of vectors that will be added to the index.
+        training_vectors_count : int
+            The number of vectors available to train the index.
+        """
+        scalar_quantizer = _SCALAR_QUANTIZERS.get(self.vector_encoding)
+
+        if self.index_type == "flat":
+            return scalar_quantizer or "Flat"
+        elif self.index_type == "hnsw":
+            return f"HNSW{self.hnsw_m}_{scalar_quantizer}" if scalar_quantizer else f"HNSW{self.hnsw_m}"
+
+        # K-means can't train more centroids than training vectors
+        nlist = self.nlist or max(1, int(4 * math.sqrt(vectors_count)))
+        nlist = max(1, min(nlist, training_vectors_count))
+
+        if self.index_type == "ivf_flat":
+            return f"IVF{nlist},{scalar_quantizer or 'Flat'}"
+
+        pq_m = self.pq_m or next((m for m in (64, 32, 16, 8) if dimension % m == 0 and dimension // m >= 4), 1)
+        if dimension % pq_m != 0:
+            raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dimension}")
+        # Each sub quantizer trains 2^nbits centroids
+        pq_nbits = max(1, min(8, int(math.log2(max(2, training_vectors_count)))))
+        return f"IVF{nlist},PQ{pq_m}x{pq_nbits}"
+
+    def __repr__(self):
+        return (f"FaissIndexConfig(index_type={self.index_type!r}, vector_encoding={self.vector_encoding!r}, "
+                f"nlist={self.nlist}, nprobe={self.nprobe}, pq_m={self.pq_m}, hnsw_m={self.hnsw_m}, "
+                f"hnsw_ef_search={self.hnsw_ef_search}, training_sample_size={self.training_sample_size}, "
+                f"mmap={self.mmap})")
+
+
+def create_faiss_index(config: FaissIndexConfig, training_vectors: "np.ndarray", vectors_count: int):
+    """
+    Create an empty FAISS index for a configuration, trained on `training_vectors` if the index type requires it.
+
+    Parameters
+    ----------
+    config : FaissIndexConfig
+        The index configuration.
+    training_vectors : np.ndarray
+        A float32 matrix of sample vectors. Its number of columns is the dimension of the index.
+    vectors_count : int
+        The total number of vectors that will be added to the index.
+    """
+    from langchain_community.vectorstores.faiss import dependable_faiss_import
+
+    faiss = dependable_faiss_import()
+
+    dimension = training_vectors.shape[1]
+    factory_string = config.get_factory_string(dimension, vectors_count, len(training_vectors))
+    index = faiss.index_factory(dimension, factory_string)
+
+    if hasattr(index, "do_polysemous_training"):
+        # Polysemous codes only speed up Hamming distance filtering, which LangChain searches don't use
+        index.do_polysemous_training = False
+
+    if not index.is_trained:
+        logger.debug("Training FAISS index '%s' on %d vectors", factory_string, len(training_vectors))
+        index.train(training_vectors)
+
+    config.apply_search_parameters(index)
+
+    return index
+
+
+def load_faiss(path: PathLike, embedding: "Embeddings", mmap: bool = False,
+               vectorstore_class: "type[FAISS] | None" = None) -> "FAISS":
+    """
+    Load a FAISS database saved with `FAISS.save_local`, optionally memory mapping the index, as an instance of
+    `vectorstore_class` (a subclass of FAISS, by default FAISS).
+    """
+    from langchain_community.vectorstores.faiss import FAISS
+    from langchain_community.vectorstores.faiss import dependable_faiss_import
+
+    vectorstore_class = vectorstore_class or FAISS
+    if not mmap:
+        return vectorstore_class.load_local(str(path), embedding, allow_dangerous_deserialization=True)
+
+    faiss = dependable_faiss_import()
+
+    path = Path(path)
+    index = faiss.read_index(str(path / "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+    with open(path / "index.pkl", "rb") as docstore_file:
+        docstore, index_to_docstore_id = pickle.load(docstore_file)
+
+    return vectorstore_class(embedding, index, docstore, index_to_docstore_id)
@@ -0,0 +1,188 @@
+import contextlib
+import fcntl
+import logging
+import os
+import re
+import typing
+from pathlib import Path
+
+from git import GitCommandError
+from git import Repo
+
+from . import instrumentation
+from .document_store import document_store_key
+
+PathLike = typing.Union[str, os.PathLike]
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+# Directory of the bare mirrors shared by the clones of the same repository, unset or empty disables the mirrors
+GIT_MIRROR_PATH_ENV = "poc_GIT_MIRROR_PATH"
+
+# Refs that name a commit, and can't move once the commit is available locally, unlike branches and tags
+_COMMIT_ID_PATTERN = re.compile(r"[0-9a-fA-F]{7,64}")
+
+# Environment of the commands checking whether an object is available locally. Without it, reading a missing object
+# in a partial clone fetches it from the remote, with no depth limit, i.e. with the whole history of a commit.
+NO_LAZY_FETCH_ENV = {"GIT_NO_LAZY_FETCH": "1"}
+
+
+@contextlib.contextmanager
+def file_lock(lock_path: PathLike):
+    """
+    Hold an exclusive lock on a file between processes, waiting for other holders to release it.
+    """
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def is_commit_id(ref: str | None) -> bool:
+    return ref is not None and _COMMIT_ID_PATTERN.fullmatch(ref) is not None
+
+
+def resolve_local_commit(repo: Repo, ref: str | None) -> str | None:
+    """
+    Returns the full id of a commit id `ref` if the commit is available in the repository (or its alternates), None if
+    it's missing or `ref` isn't a commit id. A missing commit is never fetched.
+    """
+    if not is_commit_id(ref):
+        return None
+    try:
+        return repo.git.rev_parse("--verify", "--quiet", f"{ref}^{{commit}}", env=NO_LAZY_FETCH_ENV)
+    except GitCommandError:
+        return None
+
+
+def get_head_commit(repo: Repo) -> str | None:
+    """
+    Returns the id of the checked out commit, None if nothing was checked out yet.
+    """
+    # A clone made without checkout has a HEAD but no index, its working tree is empty
+    if not (Path(repo.git_dir) / "index").exists():
+        return None
+    try:
+        return repo.git.rev_parse("--verify", "--quiet", "HEAD")
+    except GitCommandError:
+        return None
+
+
+def get_alternates_path(git_dir: PathLike) -> Path:
+    return Path(git_dir) / "objects" / "info" / "alternates"
+
+
+def has_missing_alternates(git_dir: PathLike) -> bool:
+    """
+    Returns whether a repository borrows objects from an object store that no longer exists, e.g. a deleted mirror,
+    in which case its objects can't be read anymore.
+    """
+    alternates_path = get_alternates_path(git_dir)
+    if not alternates_path.is_file():
+        return False
+    return any(not Path(line).is_dir() for line in alternates_path.read_text().splitlines()
+               if line and not line.startswith("#"))
+
+
+class GitMirrorPool:
+    """
+    A pool of bare mirrors of remote repositories, one per clone URL. The clones of a repository borrow the objects of
+    its mirror through git alternates, so each commit is fetched once from the remote for all the clones and jobs of
+    the repository, and the clones only hold their working trees.
+
+    Fetches into a mirror are serialized between processes by a lock file next to it. Deleting a mirror breaks the
+    clones borrowing from it, `SourceCodeGitLoader` clones them again.
+    """
+
+    def __init__(self, root: PathLike):
+        """
+        Parameters
+        ----------
+        root : PathLike
+            The directory of the mirrors, created if missing.
+        """
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_environment(cls) -> "GitMirrorPool | None":
+        """
+        Returns the pool at poc_GIT_MIRROR_PATH, None if it's not set.
+        """
+        root = os.environ.get(GIT_MIRROR_PATH_ENV)
+        return cls(root) if root else None
+
+    @property
+    def root(self):
+        return self._root
+
+    def get_mirror_path(self, clone_url: str) -> Path:
+        return self._root / f"{document_store_key(clone_url)}.git"
+
+    def _open_mirror(self, clone_url: str) -> Repo:
+        mirror_path = self.get_mirror_path(clone_url)
+        repo = Repo.init(mirror_path, bare=True, mkdir=True)
+        # Also completes a mirror whose creation was interrupted
+        if "origin" not in [remote.name for remote in repo.remotes]:
+            repo.create_remote("origin", clone_url)
+        elif repo.remotes.origin.url != clone_url:
+            raise ValueError(f"A mirror of a different repository is already at {mirror_path}")
+        return repo
+
+    def fetch(self, clone_url: str, ref: str) -> str:
+        """
+        Make sure the commit of a ref is in the mirror of a repository, fetching it only if the ref isn't a commit id
+        already in the mirror.
+
+        Parameters
+        ----------
+        clone_url : str
+            The URL of the remote repository.
+        ref : str
+            The commit id, branch or tag to fetch.
+
+        Returns
+        -------
+        str
+            Returns the full id of the commit.
+        """
+        mirror_path = self.get_mirror_path(clone_url)
+        with instrumentation.span("git.mirror_fetch"), file_lock(f"{mirror_path}.lock"):
+            repo = self._open_mirror(clone_url)
+            commit = resolve_local_commit(repo, ref)
+            if commit is not None:
+                logger.debug("Found '%s' in the mirror of '%s'", ref, clone_url)
+                instrumentation.count("git.mirror_hits")
+                return commit
+
+            logger.debug("Fetching '%s' into the mirror of '%s' at '%s'", ref, clone_url, mirror_path)
+            instrumentation.count("git.mirror_misses")
+            repo.git.fetch("origin", ref, depth=1)
+            commit = repo.git.rev_parse("FETCH_HEAD^{commit}")
+            # FETCH_HEAD only references the last fetched commit, a ref per commit keeps the others from being pruned
+            repo.git.update_ref(f"refs/fetched/{commit}", commit)
+            return commit
+
+    def share_objects(self, repo: Repo, clone_url: str):
+        """
+        Make a clone borrow the objects of the mirror of its repository.
+        """
+        mirror_path = self.get_mirror_path(clone_url)
+        alternates_path = get_alternates_path(repo.git_dir)
+        mirror_objects_path = str((mirror_path / "objects").absolute())
+        if not alternates_path.is_file() or mirror_objects_path not in alternates_path.read_text().splitlines():
+            alternates_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(alternates_path, "a") as alternates_file:
+                alternates_file.write(f"{mirror_objects_path}\n")
+
+        # The commits fetched with depth 1 have no parents in the mirror, which the clone must know about as well
+        mirror_shallow_path = mirror_path / "shallow"
+        if mirror_shallow_path.is_file():
+            shallow_path = Path(repo.git_dir) / "shallow"
+            shallow_commits = shallow_path.read_text().split() if shallow_path.is_file() else []
+            missing_commits = set(mirror_shallow_path.read_text().split()).difference(shallow_commits)
+            if missing_commits:
+                shallow_commits.extend(sorted(missing_commits))
+                shallow_path.write_text("".join(f"{commit}\n" for commit in shallow_commits))
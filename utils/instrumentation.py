@@ -0,0 +1,254 @@
+"""
+Lightweight spans and counters of the pipeline stages: cloning, listing the files, segmentation, embedding, building the
+retriever indexes and answering queries.
+
+Instrumentation is off unless the poc_INSTRUMENTATION environment variable is set (e.g. "1"), in which case:
+    - poc_INSTRUMENTATION_SUMMARY_PATH is the path of a JSON summary (time per span, counters) written at exit,
+    - poc_INSTRUMENTATION_TRACE_PATH is the path of a Chrome trace (chrome://tracing, Perfetto) written at exit,
+    - the spans and counters of each query of `ChainOfCallsRetriever` are sent as an "instrumentation" custom event to
+      the callbacks of its run.
+The files of child processes get their process id as an extra suffix, e.g. "summary.json.1234".
+
+When off, `span` returns a shared no-op context manager and `count` returns immediately.
+"""
+import atexit
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import typing
+from pathlib import Path
+
+if typing.TYPE_CHECKING:
+    from langchain_core.callbacks import CallbackManagerForRetrieverRun  # pragma: no cover
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+INSTRUMENTATION_ENV = "poc_INSTRUMENTATION"
+SUMMARY_PATH_ENV = "poc_INSTRUMENTATION_SUMMARY_PATH"
+TRACE_PATH_ENV = "poc_INSTRUMENTATION_TRACE_PATH"
+
+# Above this number of recorded spans only their aggregates are kept, not their trace events
+MAX_TRACE_EVENTS = 1_000_000
+
+
+class Recorder:
+    """
+    Collects the spans and counters of a process. Spans are aggregated by name and kept as trace events.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start_ns = time.perf_counter_ns()
+        self.start_time = time.time()
+        # name -> [count, total ns, max ns]
+        self.span_stats: dict[str, list[int]] = dict()
+        self.counters: dict[str, int] = dict()
+        # (name, start ns, duration ns, thread id, attributes)
+        self.events: list[tuple[str, int, int, int, dict | None]] = list()
+        self.dropped_events = 0
+
+    def add_span(self, name: str, start_ns: int, duration_ns: int, attributes: dict | None):
+        with self._lock:
+            stats = self.span_stats.get(name)
+            if stats is None:
+                self.span_stats[name] = [1, duration_ns, duration_ns]
+            else:
+                stats[0] += 1
+                stats[1] += duration_ns
+                stats[2] = max(stats[2], duration_ns)
+            if len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append((name, start_ns, duration_ns, threading.get_ident(), attributes))
+            else:
+                self.dropped_events += 1
+
+    def increment(self, name: str, value: int):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def checkpoint(self) -> tuple[int, dict[str, int]]:
+        """
+        Returns the position of the next trace event and a copy of the counters, to report what happens after it.
+        """
+        with self._lock:
+            return len(self.events) + self.dropped_events, dict(self.counters)
+
+    def since(self, checkpoint: tuple[int, dict[str, int]]) -> dict:
+        """
+        Returns the spans and counters recorded since a checkpoint.
+        """
+        events_position, counters = checkpoint
+        with self._lock:
+            events = self.events[events_position:] if events_position <= len(self.events) else []
+            counters_delta = {name: value - counters.get(name, 0) for name, value in self.counters.items()
+                              if value != counters.get(name, 0)}
+        spans = dict()
+        for name, _, duration_ns, _, _ in events:
+            stats = spans.setdefault(name, {"count": 0, "total_s": 0.0})
+            stats["count"] += 1
+            stats["total_s"] += duration_ns / 1e9
+        return {"spans": spans, "counters": counters_delta}
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "start_time": self.start_time,
+                "wall_s": (time.perf_counter_ns() - self.start_ns) / 1e9,
+                "spans": {name: {"count": count, "total_s": total_ns / 1e9, "max_s": max_ns / 1e9}
+                          for name, (count, total_ns, max_ns) in
+                          sorted(self.span_stats.items(), key=lambda item: item[1][1], reverse=True)},
+                "counters": dict(sorted(self.counters.items())),
+                "dropped_trace_events": self.dropped_events,
+            }
+
+    def chrome_trace(self) -> dict:
+        """
+        Returns the spans as complete ("X") events and the counters totals as counter ("C") events of the Chrome trace
+        event format, in microseconds since the recorder started.
+        """
+        pid = os.getpid()
+        with self._lock:
+            trace_events = [{"name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": thread_id,
+                             "ts": (start_ns - self.start_ns) / 1000, "dur": duration_ns / 1000,
+                             "args": attributes or {}}
+                            for name, start_ns, duration_ns, thread_id, attributes in self.events]
+            end_ts = (time.perf_counter_ns() - self.start_ns) / 1000
+            trace_events.extend({"name": name, "ph": "C", "pid": pid, "tid": 0, "ts": end_ts, "args": {name: value}}
+                                for name, value in self.counters.items())
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+
+class _Span:
+    __slots__ = ("_recorder", "_name", "_attributes", "_start_ns")
+
+    def __init__(self, recorder: Recorder, name: str, attributes: dict | None):
+        self._recorder = recorder
+        self._name = name
+        self._attributes = attributes
+
+    def set(self, **attributes):
+        """
+        Add attributes known only at the end of the span, e.g. the number of processed items.
+        """
+        if self._attributes is None:
+            self._attributes = attributes
+        else:
+            self._attributes.update(attributes)
+
+    def __enter__(self) -> "_Span":
+        self._start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._recorder.add_span(self._name, self._start_ns, time.perf_counter_ns() - self._start_ns, self._attributes)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+_recorder: Recorder | None = None
+
+
+def is_enabled() -> bool:
+    return _recorder is not None
+
+
+def enable():
+    """
+    Start recording in this process, and export the recording at exit to the paths of the environment.
+    """
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+        atexit.register(export)
+
+
+def disable():
+    global _recorder
+    _recorder = None
+
+
+def get_recorder() -> Recorder | None:
+    return _recorder
+
+
+def span(name: str, **attributes):
+    """
+    Returns a context manager timing its block as a span named `name` (dotted, the first part is the trace category),
+    with optional attributes.
+    """
+    recorder = _recorder
+    if recorder is None:
+        return _NULL_SPAN
+    return _Span(recorder, name, attributes or None)
+
+
+def count(name: str, value: int = 1):
+    recorder = _recorder
+    if recorder is not None:
+        recorder.increment(name, value)
+
+
+@contextlib.contextmanager
+def report_to(run_manager: "CallbackManagerForRetrieverRun | None", event_name: str = "instrumentation"):
+    """
+    Send the spans and counters recorded in the block as a custom event to the callbacks of a LangChain run.
+    """
+    recorder = _recorder
+    if recorder is None or run_manager is None:
+        yield
+        return
+    checkpoint = recorder.checkpoint()
+    try:
+        yield
+    finally:
+        try:
+            run_manager.get_child().on_custom_event(event_name, recorder.since(checkpoint), run_id=run_manager.run_id)
+        except Exception as e:
+            logger.warning("Failed to report instrumentation to the run callbacks: %s", e)
+
+
+def _get_process_path(path: str) -> Path:
+    if multiprocessing.parent_process() is not None:
+        return Path(f"{path}.{os.getpid()}")
+    return Path(path)
+
+
+def export(summary_path: str | None = None, trace_path: str | None = None):
+    """
+    Write the JSON summary and the Chrome trace of the recording, by default to the paths of the environment.
+    """
+    recorder = _recorder
+    if recorder is None:
+        return
+    summary_path = summary_path or os.environ.get(SUMMARY_PATH_ENV)
+    trace_path = trace_path or os.environ.get(TRACE_PATH_ENV)
+    for path, content in ((summary_path, recorder.summary), (trace_path, recorder.chrome_trace)):
+        if not path:
+            continue
+        path = _get_process_path(path)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        with open(path, "w") as output_file:
+            json.dump(content(), output_file)
+        logger.debug("Wrote instrumentation to '%s'", path)
+
+
+if os.environ.get(INSTRUMENTATION_ENV, "").lower() not in ("", "0", "false", "no"):
+    enable()
@@ -2,7 +2,6 @@ import logging
 import re
 from typing import List, Any, Tuple
 
-import esprima
 from langchain_community.document_loaders.parsers.language.javascript import JavaScriptSegmenter
 
 from utils.segmenters_utils import get_current_block
@@ -111,6 +110,8 @@ class ExtendedJavaScriptSegmenter(JavaScriptSegmenter):
 
     def _parse_with_fallback(self) -> Any:
         """Try to parse code as script first, then as module if that fails."""
+        import esprima
+
         try:
             logger.debug("Attempting to parse as a script...")
             return esprima.parseScript(self.code, loc=True)
@@ -132,6 +133,8 @@ class ExtendedJavaScriptSegmenter(JavaScriptSegmenter):
 
     def extract_functions_classes(self) -> List[str]:
         """Extract functions, classes and exports from the code."""
+        import esprima
+
         if self.skip_file:
             return []
 
@@ -157,6 +160,8 @@ class ExtendedJavaScriptSegmenter(JavaScriptSegmenter):
 
     def simplify_code(self) -> str:
         """Simplify the code by replacing function/class bodies with comments."""
+        import esprima
+
         if self.skip_file:
             return self.code
 
@@ -0,0 +1,164 @@
+import logging
+import os
+import resource
+import sys
+import typing
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+# The memory budget of a process in MB, above a fraction of which lower memory strategies are used
+MEMORY_BUDGET_MB_ENV = "poc_MEMORY_BUDGET_MB"
+# Report the sizes of the major structures after each stage even without a budget
+MEMORY_ACCOUNTING_ENV = "poc_MEMORY_ACCOUNTING"
+
+# Fraction of the budget from which lower memory strategies are used, leaving room for the stages still to run
+LOW_MEMORY_FRACTION = 0.7
+
+# Number of elements of a large container measured to estimate the size of all its elements
+DEFAULT_SAMPLE_SIZE = 256
+_MAX_DEPTH = 32
+
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None), type)
+
+
+def get_memory_budget() -> int | None:
+    """
+    Returns the memory budget of the process in bytes, None if it has no budget.
+    """
+    budget_mb = os.environ.get(MEMORY_BUDGET_MB_ENV)
+    return int(float(budget_mb) * (1 << 20)) if budget_mb else None
+
+
+def is_accounting_enabled() -> bool:
+    return (get_memory_budget() is not None or
+            os.environ.get(MEMORY_ACCOUNTING_ENV, "").lower() not in ("", "0", "false", "no"))
+
+
+def get_rss() -> int:
+    """
+    Returns the resident set size of the process in bytes, its peak if the current one is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Kilobytes on Linux, bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def should_save_memory(expected_bytes: int = 0) -> bool:
+    """
+    Returns whether the process should switch to lower memory strategies, when its resident memory and the expected
+    memory of the next stage reach `LOW_MEMORY_FRACTION` of the budget. Always False without a budget.
+
+    Parameters
+    ----------
+    expected_bytes : int, optional
+        An estimate of the memory the next stage would allocate with its regular strategy, by default 0
+    """
+    budget = get_memory_budget()
+    if budget is None:
+        return False
+    rss = get_rss()
+    save_memory = rss + expected_bytes >= budget * LOW_MEMORY_FRACTION
+    if save_memory:
+        logger.info("Using lower memory strategies, RSS %.1f MB and expected %.1f MB reach %d%% of the %.1f MB budget",
+                    rss / (1 << 20), expected_bytes / (1 << 20), LOW_MEMORY_FRACTION * 100, budget / (1 << 20))
+    return save_memory
+
+
+def estimate_size(obj: typing.Any, sample_size: int = DEFAULT_SAMPLE_SIZE, seen: set[int] | None = None) -> int:
+    """
+    Estimate the memory held by an object and the objects it references, in bytes. Objects referenced several times
+    are counted once. The elements of containers larger than `sample_size` are estimated from evenly spaced samples.
+
+    Parameters
+    ----------
+    obj : typing.Any
+        The object to measure.
+    sample_size : int, optional
+        The number of measured elements of a large container, by default 256
+    seen : set[int] | None, optional
+        The ids of objects already counted, shared between the estimates of structures referencing the same objects,
+        by default None
+
+    Returns
+    -------
+    int
+        Returns the approximate size in bytes.
+    """
+    return _estimate_size(obj, set() if seen is None else seen, sample_size, 0)
+
+
+def _get_referenced_objects(obj: typing.Any) -> typing.Sequence | None:
+    if isinstance(obj, dict):
+        return [item for pair in obj.items() for item in pair]
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return obj if isinstance(obj, (list, tuple)) else list(obj)
+    slots = [slot for cls in type(obj).__mro__ for slot in getattr(cls, "__slots__", ())]
+    if slots:
+        return [getattr(obj, slot) for slot in slots if hasattr(obj, slot)]
+    if hasattr(obj, "__dict__"):
+        return [vars(obj)]
+    return None
+
+
+def _estimate_size(obj: typing.Any, seen: set[int], sample_size: int, depth: int) -> int:
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, _ATOMIC_TYPES) or depth >= _MAX_DEPTH:
+        return size
+
+    referenced_objects = _get_referenced_objects(obj)
+    if not referenced_objects:
+        return size
+    if len(referenced_objects) <= sample_size:
+        return size + sum(_estimate_size(item, seen, sample_size, depth + 1) for item in referenced_objects)
+
+    step = len(referenced_objects) / sample_size
+    sampled_size = sum(_estimate_size(referenced_objects[int(index * step)], seen, sample_size, depth + 1)
+                       for index in range(sample_size))
+    return size + int(sampled_size * step)
+
+
+def estimate_faiss_size(db) -> int:
+    """
+    Estimate the memory held by a FAISS vector store, its index codes and its documents.
+    """
+    index = db.index
+    code_size = getattr(index, "code_size", None) or index.d * 4
+    return index.ntotal * code_size + estimate_size(getattr(db.docstore, "_dict", {}))
+
+
+def report_memory(stage: str, **structures) -> dict[str, int] | None:
+    """
+    Log the resident memory of the process and the approximate sizes of structures after a stage, if memory
+    accounting is enabled (by poc_MEMORY_ACCOUNTING or a memory budget).
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage that just ended.
+    **structures
+        The structures to measure by name. Objects shared with a structure measured before are counted in the first
+        one. Callables are called to get the size of structures that `estimate_size` can't measure.
+
+    Returns
+    -------
+    dict[str, int] | None
+        Returns the sizes in bytes by structure name, and the RSS as "rss", None if accounting is disabled.
+    """
+    if not is_accounting_enabled():
+        return None
+    seen = set()
+    sizes = {name: structure() if callable(structure) else estimate_size(structure, seen=seen)
+             for name, structure in structures.items()}
+    sizes["rss"] = get_rss()
+    budget = get_memory_budget()
+    logger.info("Memory after %s: RSS %.1f MB%s%s", stage, sizes["rss"] / (1 << 20),
+                f" of {budget / (1 << 20):.1f} MB budget" if budget is not None else "",
+                "".join(f", {name} ~{size / (1 << 20):.1f} MB" for name, size in sizes.items() if name != "rss"))
+    return sizes
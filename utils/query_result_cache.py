@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import typing
+import weakref
+from hashlib import sha256
+from pathlib import Path
+
+from . import instrumentation
+
+if typing.TYPE_CHECKING:
+    from langchain_core.documents import Document  # pragma: no cover
+
+    from functions_parsers.lang_functions_parsers import LanguageFunctionsParser  # pragma: no cover
+    from retrievers.chain_of_calls_retriever import ChainOfCallsRetriever  # pragma: no cover
+
+PathLike = typing.Union[str, os.PathLike]
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+# Location of the query results cache, an empty value disables it
+QUERY_RESULT_CACHE_PATH_ENV = "poc_QUERY_RESULT_CACHE_PATH"
+DEFAULT_QUERY_RESULT_CACHE_PATH = "./.cache/am_cache/query_results.sqlite"
+QUERY_RESULT_CACHE_TTL_ENV = "poc_QUERY_RESULT_CACHE_TTL_SECONDS"
+DEFAULT_QUERY_RESULT_CACHE_TTL = 7 * 24 * 60 * 60
+QUERY_RESULT_CACHE_MAX_ENTRIES_ENV = "poc_QUERY_RESULT_CACHE_MAX_ENTRIES"
+DEFAULT_QUERY_RESULT_CACHE_MAX_ENTRIES = 100_000
+
+# The modules whose logic determines the path found for a query, besides the language parser's own module
+_QUERY_LOGIC_MODULES = ("retrievers.chain_of_calls_retriever", "functions_parsers.lang_functions_parsers")
+
+# The ordinal of the dummy function of a standard library package in a path, which has no code unit
+STANDARD_LIBRARY_ORDINAL = -1
+_MAX_INDEXED_RETRIEVERS = 8
+
+_parser_versions: dict[type, str] = dict()
+
+
+def get_parser_version(language_parser: "LanguageFunctionsParser") -> str:
+    """
+    Returns a version of the logic answering queries with a language parser: the segmentation `PARSER_VERSION` and a
+    hash of the source code of the parser and retriever modules, so any change to them invalidates cached results.
+    """
+    parser_class = type(language_parser)
+    parser_version = _parser_versions.get(parser_class)
+    if parser_version is None:
+        from utils.documents_loader import PARSER_VERSION
+
+        source_hash = sha256()
+        for module_name in (parser_class.__module__,) + _QUERY_LOGIC_MODULES:
+            module_file = getattr(sys.modules.get(module_name), "__file__", None)
+            source_hash.update(module_name.encode("utf-8"))
+            if module_file is not None:
+                source_hash.update(Path(module_file).read_bytes())
+        parser_version = _parser_versions[parser_class] = f"{PARSER_VERSION}:{source_hash.hexdigest()[:16]}"
+    return parser_version
+
+
+class QueryResultCache:
+    """
+    A persistent cache of the retriever's answers keyed by (repository, commit, ecosystem, query, parser version,
+    dependency graph version), stored in a local SQLite database.
+
+    The path of an answer is stored as the (source, function name, ordinal) identifiers of its functions, the ordinal
+    distinguishing functions of the same file with the same name (-1 for a standard library function), and resolved
+    back to the retriever's code units on a hit. Entries expire `ttl_seconds` after being stored, and the least
+    recently used entries are evicted above `max_entries`.
+
+    The parser version is part of the key, so results are invalidated when the parsing or retrieval logic changes.
+    """
+
+    def __init__(self,
+                 path: PathLike,
+                 ttl_seconds: float | None = DEFAULT_QUERY_RESULT_CACHE_TTL,
+                 max_entries: int | None = DEFAULT_QUERY_RESULT_CACHE_MAX_ENTRIES):
+        """
+        Open or create a query results cache.
+
+        Parameters
+        ----------
+        path : PathLike
+            The location of the SQLite database file.
+        ttl_seconds : float | None, optional
+            The time an entry is valid after being stored, None for no expiration.
+        max_entries : int | None, optional
+            The number of entries above which the least recently used are evicted, None for no limit.
+        """
+        self._path = Path(path)
+        self._path.parent.mkdir(exist_ok=True, parents=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # The retrievers' functions by (source, function name), by retriever id. The retrievers are only weakly
+        # referenced, the functions of a retriever are dropped when it's collected, e.g. once evicted from a pool.
+        self._functions_by_name: dict[int, tuple["weakref.ref[ChainOfCallsRetriever]",
+                                                 dict[tuple[str, str], list]]] = dict()
+        # Several processes may share the cache, wait for their writes instead of failing
+        self._connection = sqlite3.connect(str(self._path), check_same_thread=False, timeout=30)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS query_results ("
+                                     "key BLOB NOT NULL PRIMARY KEY, "
+                                     "repository TEXT NOT NULL, "
+                                     "commit_digest TEXT NOT NULL, "
+                                     "query TEXT NOT NULL, "
+                                     "found_path INTEGER NOT NULL, "
+                                     "path TEXT NOT NULL, "
+                                     "created_at REAL NOT NULL, "
+                                     "accessed_at REAL NOT NULL) WITHOUT ROWID")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS query_results_accessed_at "
+                                     "ON query_results (accessed_at)")
+
+    @classmethod
+    def from_environment(cls) -> "QueryResultCache | None":
+        """
+        Open the cache configured by the poc_QUERY_RESULT_CACHE_* environment variables, None if it's disabled.
+        """
+        path = os.environ.get(QUERY_RESULT_CACHE_PATH_ENV, DEFAULT_QUERY_RESULT_CACHE_PATH)
+        if not path:
+            return None
+        ttl_seconds = float(os.environ.get(QUERY_RESULT_CACHE_TTL_ENV, DEFAULT_QUERY_RESULT_CACHE_TTL))
+        max_entries = int(os.environ.get(QUERY_RESULT_CACHE_MAX_ENTRIES_ENV, DEFAULT_QUERY_RESULT_CACHE_MAX_ENTRIES))
+        return cls(path, ttl_seconds=ttl_seconds or None, max_entries=max_entries or None)
+
+    @property
+    def path(self):
+        return self._path
+
+    @staticmethod
+    def get_key(repository: str, commit: str, ecosystem: str, query: str, parser_version: str,
+                graph_version: str) -> bytes:
+        return sha256("\0".join((repository, commit, ecosystem, query, parser_version, graph_version))
+                      .encode("utf-8")).digest()
+
+    def get(self, key: bytes) -> tuple[bool, list[tuple[str, str, int]]] | None:
+        """
+        Returns the cached (found path, path identifiers) of a key, None if missing or expired.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT found_path, path, created_at FROM query_results WHERE key = ?",
+                                           (key,)).fetchone()
+            if row is None:
+                return None
+            found_path, path, created_at = row
+            if self.ttl_seconds is not None and created_at + self.ttl_seconds < now:
+                self._connection.execute("DELETE FROM query_results WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE query_results SET accessed_at = ? WHERE key = ?", (now, key))
+        return bool(found_path), [tuple(identifier) for identifier in json.loads(path)]
+
+    def put(self, key: bytes, repository: str, commit: str, query: str, found_path: bool,
+            path: list[tuple[str, str, int]]):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO query_results (key, repository, commit_digest, query, "
+                                     "found_path, path, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                     (key, repository, commit, query, int(found_path), json.dumps(path), now, now))
+            self._evict(now)
+
+    def _evict(self, now: float):
+        if self.ttl_seconds is not None:
+            self._connection.execute("DELETE FROM query_results WHERE created_at < ?", (now - self.ttl_seconds,))
+        if self.max_entries is not None:
+            self._connection.execute("DELETE FROM query_results WHERE key IN (SELECT key FROM query_results "
+                                     "ORDER BY accessed_at LIMIT max(0, (SELECT COUNT(*) FROM query_results) - ?))",
+                                     (self.max_entries,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM query_results").fetchone()[0]
+
+    def _get_functions_by_name(self, retriever: "ChainOfCallsRetriever") -> dict[tuple[str, str], list]:
+        """
+        Returns the code units of a retriever's functions by (source, function name), in documents order.
+        """
+        with self._lock:
+            entry = self._functions_by_name.get(id(retriever))
+            if entry is not None and entry[0]() is retriever:
+                return entry[1]
+        functions_by_name = dict()
+        for code_unit in retriever.documents:
+            name = (code_unit.metadata['source'], retriever.language_parser.get_function_name(code_unit))
+            functions_by_name.setdefault(name, []).append(code_unit)
+        functions_by_name_of_retrievers = self._functions_by_name
+        retriever_id = id(retriever)
+
+        def forget_retriever(retriever_ref: weakref.ref):
+            # Runs when the retriever is collected, possibly while the lock is held by the same thread, so without it
+            entry = functions_by_name_of_retrievers.get(retriever_id)
+            if entry is not None and entry[0] is retriever_ref:
+                functions_by_name_of_retrievers.pop(retriever_id, None)
+
+        with self._lock:
+            # Retrievers are mostly queried one after another, only the functions of the last ones are kept
+            while len(self._functions_by_name) >= _MAX_INDEXED_RETRIEVERS:
+                self._functions_by_name.pop(next(iter(self._functions_by_name)), None)
+            self._functions_by_name[retriever_id] = (weakref.ref(retriever, forget_retriever), functions_by_name)
+        return functions_by_name
+
+    def invoke(self, retriever: "ChainOfCallsRetriever", repository: str, commit: str,
+               query: str) -> tuple[list["Document"], bool]:
+        """
+        Answer a query from the cache, or with the retriever, caching its answer. The retriever's `found_path` is set
+        either way.
+
+        Parameters
+        ----------
+        retriever : ChainOfCallsRetriever
+            The retriever of the repository at the commit.
+        repository : str
+            The repository URL.
+        commit : str
+            The commit of the repository.
+        query : str
+            The retriever query "package,function".
+
+        Returns
+        -------
+        tuple[list[Document], bool]
+            Returns the documents of the path, and whether they came from the cache.
+        """
+        key = self.get_key(repository, commit, retriever.ecosystem.name, query,
+                           get_parser_version(retriever.language_parser), retriever.dependency_graph_version)
+        cached = self.get(key)
+        if cached is not None:
+            found_path, path = cached
+            functions_by_name = self._get_functions_by_name(retriever)
+            code_units = list()
+            for source, function_name, ordinal in path:
+                functions = functions_by_name.get((source, function_name), [])
+                if 0 <= ordinal < len(functions):
+                    code_units.append(functions[ordinal])
+                elif ordinal == STANDARD_LIBRARY_ORDINAL:
+                    code_units.append(retriever.create_standard_library_function_doc(source, function_name))
+                else:
+                    logger.warning("Ignoring the cached result of '%s' at %s, function %s of %s is not found", query,
+                                   commit, function_name, source)
+                    break
+            else:
+                instrumentation.count("query_result_cache.hits")
+                retriever.found_path = found_path
+                return [code_unit.to_document() for code_unit in code_units], True
+
+        instrumentation.count("query_result_cache.misses")
+
+        documents = retriever.invoke(query)
+        functions_by_name = self._get_functions_by_name(retriever)
+        path = list()
+        for document in documents:
+            name = (document.metadata['source'], retriever.language_parser.get_function_name(document))
+            ordinal = next((ordinal for ordinal, code_unit in enumerate(functions_by_name.get(name, []))
+                            if code_unit.page_content == document.page_content), STANDARD_LIBRARY_ORDINAL)
+            path.append((*name, ordinal))
+        self.put(key, repository, commit, query, bool(retriever.found_path), path)
+        return documents, False
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,21 +1,61 @@
 
 
+import contextlib
 import logging
 import os
+import shutil
+import tempfile
 import typing
 from pathlib import Path
 
 from git import Blob as GitBlob
+from git import GitCommandError
 from git import Repo
 from langchain_community.document_loaders.blob_loaders.schema import BlobLoader
 from langchain_core.document_loaders.blob_loaders import Blob
 from tqdm import tqdm
 
+from . import instrumentation
+from .git_mirrors import GitMirrorPool
+from .git_mirrors import NO_LAZY_FETCH_ENV
+from .git_mirrors import file_lock
+from .git_mirrors import get_head_commit
+from .git_mirrors import has_missing_alternates
+from .git_mirrors import resolve_local_commit
+
 PathLike = typing.Union[str, os.PathLike]
 
 logger = logging.getLogger(__name__)
 
 
+@contextlib.contextmanager
+def global_git_config_lock():
+    """
+    Serialize the writes of the global git config between processes, GitPython fails instead of waiting when the
+    config is locked by another writer.
+    """
+    with file_lock(os.path.join(tempfile.gettempdir(), "poc-git-config.lock")):
+        yield
+
+
+def get_sparse_checkout_patterns(include: typing.Iterable[str] | None,
+                                 exclude: typing.Iterable[str] | None) -> list[str]:
+    """
+    Translate include and exclude glob patterns to non-cone sparse checkout patterns, which select the files matched
+    by an include pattern and by no exclude pattern, like the filters of `SourceCodeGitLoader.yield_blobs`.
+
+    Glob patterns are relative to the repository root, so they are anchored: "*.md" only matches the files at the root
+    in both syntaxes, and "**/*.go" the files at any depth. Without include patterns all the files are selected.
+    """
+    if include is None:
+        return ["/*"]
+
+    def anchor(pattern: str) -> str:
+        return pattern if pattern.startswith("/") else f"/{pattern}"
+
+    return [anchor(pattern) for pattern in include] + [f"!{anchor(pattern)}" for pattern in exclude or []]
+
+
 class SourceCodeGitLoader(BlobLoader):
     """
     Load `Git` repository files.
@@ -27,6 +67,14 @@ class SourceCodeGitLoader(BlobLoader):
     Each document represents one file in the repository. The `path` points to
     the local Git repository, and the `ref` specifies the git reference to load
     files from. By default, it loads from the `main` branch.
+
+    A clone already at the commit of `ref` is used as is, without fetching. With a `GitMirrorPool`, the clones borrow
+    the objects of a shared mirror of their repository, which fetches each commit once.
+
+    Only the files matching the include and exclude patterns are checked out (sparse checkout), and clones without a
+    mirror are partial: the contents of the files are fetched when they are checked out, so that the other files
+    (binary assets, documentation, test fixtures) are neither downloaded nor written to disk. Remotes that don't support
+    partial clones send all the contents instead.
     """
 
     def __init__(
@@ -36,6 +84,10 @@ class SourceCodeGitLoader(BlobLoader):
         ref: typing.Optional[str] = "main",
         include: typing.Optional[typing.Iterable[str]] = None,
         exclude: typing.Optional[typing.Iterable[str]] = None,
+        paths: typing.Optional[typing.Iterable[str]] = None,
+        mirror_pool: GitMirrorPool | None = None,
+        partial_clone: bool = True,
+        sparse_checkout: bool = True,
     ):
         """
         Initialize the Git loader.
@@ -52,6 +104,15 @@ class SourceCodeGitLoader(BlobLoader):
             A list of file patterns to include. Uses the glob syntax, by default None
         exclude : typing.Optional[typing.Iterable[str]], optional
             A list of file patterns to exclude. Uses the glob syntax, by default None
+        paths : typing.Optional[typing.Iterable[str]], optional
+            Restrict the yielded files to these repository relative paths (after applying the include and exclude
+            filters). Used for incremental ingestion of only the files changed between two commits, by default None
+        mirror_pool : GitMirrorPool | None, optional
+            The mirrors that the clone borrows its objects from, by default the pool at poc_GIT_MIRROR_PATH if set
+        partial_clone : bool, optional
+            Clone without the file contents, fetched on checkout, by default True. Doesn't apply to mirrored clones.
+        sparse_checkout : bool, optional
+            Only check out the files matching the include and exclude patterns, by default True
         """
 
         self.repo_path = Path(repo_path)
@@ -60,6 +121,10 @@ class SourceCodeGitLoader(BlobLoader):
 
         self.include = include
         self.exclude = exclude
+        self.paths = set(paths) if paths is not None else None
+        self.mirror_pool = mirror_pool if mirror_pool is not None else GitMirrorPool.from_environment()
+        self.partial_clone = partial_clone
+        self.sparse_checkout = sparse_checkout
 
         self._repo: Repo | None = None
 
@@ -83,9 +148,17 @@ class SourceCodeGitLoader(BlobLoader):
         if (self._repo is not None):
             return self._repo
 
+        fetched_commit = None
+
         if not os.path.exists(self.repo_path) and self.clone_url is None:
             raise ValueError(f"Path {self.repo_path} does not exist")
         elif self.clone_url:
+            # A clone borrowing from a deleted mirror can't read its objects anymore
+            if os.path.isdir(os.path.join(self.repo_path, ".git")) and \
+                    has_missing_alternates(os.path.join(self.repo_path, ".git")):
+                logger.warning("Removing the clone at '%s', its mirror was deleted", self.repo_path)
+                shutil.rmtree(self.repo_path)
+
             # If the repo_path already contains a git repository, verify that it's the
             # same repository as the one we're trying to clone.
             if os.path.isdir(os.path.join(self.repo_path, ".git")):
@@ -98,21 +171,26 @@ class SourceCodeGitLoader(BlobLoader):
                 logger.debug("Updating existing Git repo for URL '%s' @ '%s'", self.clone_url, self.ref)
             else:
                 logger.debug("Cloning repository from URL: '%s' @ '%s'", self.clone_url, self.ref)
-                # Create a shallow clone of the repository without checking out
-                repo = Repo.clone_from(self.clone_url, self.repo_path, depth=1, no_checkout=True)
+                with instrumentation.span("git.clone"):
+                    if self.mirror_pool is not None:
+                        # The objects come from the mirror, an empty repository is enough. Fetching first doesn't leave
+                        # an empty clone behind if the remote can't be fetched
+                        fetched_commit = self.mirror_pool.fetch(self.clone_url, self.ref)
+                        repo = Repo.init(self.repo_path, mkdir=True)
+                        repo.create_remote("origin", self.clone_url)
+                    else:
+                        repo = self._clone()
 
                 # Set repo as git safe directory to avoid errors if directory ownership is changed outside the pipeline
                 # https://git-scm.com/docs/git-config#Documentation/git-config.txt-safedirectory
-                with repo.config_writer(config_level="global") as config:
+                with global_git_config_lock(), repo.config_writer(config_level="global") as config:
                     config.add_value("safe", "directory", str(self.repo_path.absolute()))
 
         else:
             repo = Repo(self.repo_path)
             logger.debug("Using existing Git repo at path: '%s' @ '%s'", self.repo_path, self.ref)
 
-        # Reliable way to check out the ref using a shallow clone
-        repo.git.fetch("origin", self.ref, depth=1)
-        repo.git.checkout("FETCH_HEAD")
+        self._checkout(repo, fetched_commit)
 
         logger.debug("Loaded Git repository at path: '%s' @ '%s'", self.repo_path, self.ref)
 
@@ -120,6 +198,127 @@ class SourceCodeGitLoader(BlobLoader):
 
         return repo
 
+    def _clone(self) -> Repo:
+        # Create a shallow clone of the repository without checking out
+        if self.partial_clone:
+            try:
+                # Servers that don't support filters send all the objects instead, git only warns about it
+                return Repo.clone_from(self.clone_url, self.repo_path, depth=1, no_checkout=True, filter="blob:none")
+            except GitCommandError as e:
+                # E.g. git versions without partial clones
+                logger.warning("Partial clone of '%s' failed, cloning all the contents. Error: %s", self.clone_url, e)
+                shutil.rmtree(self.repo_path, ignore_errors=True)
+        return Repo.clone_from(self.clone_url, self.repo_path, depth=1, no_checkout=True)
+
+    def _update_sparse_checkout(self, repo: Repo) -> bool:
+        """
+        Write the sparse checkout patterns of the include and exclude patterns to the clone, applied by the next
+        checkout. Returns whether they changed. The files of repositories that the loader didn't clone are left as is.
+        """
+        if self.clone_url is None:
+            return False
+        sparse_checkout_path = Path(repo.git_dir) / "info" / "sparse-checkout"
+        is_sparse = repo.config_reader().get_value("core", "sparseCheckout", False)
+        patterns = get_sparse_checkout_patterns(self.include if self.sparse_checkout else None, self.exclude)
+        if patterns == ["/*"] and not is_sparse:
+            return False
+
+        content = "".join(f"{pattern}\n" for pattern in patterns)
+        if is_sparse and sparse_checkout_path.is_file() and sparse_checkout_path.read_text() == content:
+            return False
+
+        logger.debug("Checking out the files of '%s' matching: %s", self.repo_path, patterns)
+        with repo.config_writer() as config:
+            config.set_value("core", "sparseCheckout", True)
+            config.set_value("core", "sparseCheckoutCone", False)
+        sparse_checkout_path.parent.mkdir(parents=True, exist_ok=True)
+        sparse_checkout_path.write_text(content)
+        return True
+
+    def _uses_mirror(self) -> bool:
+        return self.mirror_pool is not None and self.clone_url is not None
+
+    def _fetch(self, repo: Repo, ref: str) -> str:
+        """
+        Fetch a ref into the clone, or into its mirror, and returns the commit to check out.
+        """
+        if self._uses_mirror():
+            commit = self.mirror_pool.fetch(self.clone_url, ref)
+            self.mirror_pool.share_objects(repo, self.clone_url)
+            return commit
+
+        with instrumentation.span("git.fetch"):
+            repo.git.fetch("origin", ref, depth=1)
+        return "FETCH_HEAD"
+
+    def _checkout(self, repo: Repo, fetched_commit: str | None = None):
+        if self._uses_mirror():
+            # The commit may already have been fetched into the mirror for another clone
+            self.mirror_pool.share_objects(repo, self.clone_url)
+
+        sparse_checkout_changed = self._update_sparse_checkout(repo)
+
+        # A commit id available locally can't have changed on the remote, unlike a branch or a tag
+        commit = resolve_local_commit(repo, self.ref)
+        if commit is not None and commit == get_head_commit(repo):
+            logger.debug("Git repository at path '%s' is already at '%s', skipping fetch", self.repo_path, self.ref)
+            instrumentation.count("git.up_to_date")
+            if sparse_checkout_changed:
+                # Check out and remove the files of the new patterns
+                with instrumentation.span("git.checkout"):
+                    repo.git.read_tree("-mu", "HEAD")
+            return
+
+        if commit is None:
+            # Reliable way to check out the ref using a shallow clone
+            commit = fetched_commit or self._fetch(repo, self.ref)
+        with instrumentation.span("git.checkout"):
+            repo.git.checkout(commit)
+
+    def changed_paths(self, base_ref: str) -> tuple[set[str], set[str]]:
+        """
+        Compute the files that differ between `base_ref` and the currently loaded `ref`.
+
+        Parameters
+        ----------
+        base_ref : str
+            The git reference (usually a commit id) that a previous ingestion was performed on.
+
+        Returns
+        -------
+        tuple[set[str], set[str]]
+            Returns a tuple of (changed, deleted) repository relative paths. `changed` holds added and modified files,
+            `deleted` holds files that no longer exist at `ref`. Renames are reported as a delete plus an add.
+        """
+
+        repo = self.load_repo()
+
+        # The clone is shallow, so the base commit may not be available locally yet
+        try:
+            repo.git.cat_file("-e", f"{base_ref}^{{commit}}", env=NO_LAZY_FETCH_ENV)
+        except GitCommandError:
+            self._fetch(repo, base_ref)
+
+        diff_output = repo.git.diff("--name-status", "--no-renames", "-z", base_ref, "HEAD")
+
+        changed: set[str] = set()
+        deleted: set[str] = set()
+
+        entries = diff_output.split("\0")
+        for status, path in zip(entries[0::2], entries[1::2]):
+            if status.startswith("D"):
+                deleted.add(path)
+            else:
+                changed.add(path)
+
+        logger.debug("Found %d changed and %d deleted files between '%s' and '%s'",
+                     len(changed),
+                     len(deleted),
+                     base_ref,
+                     self.ref)
+
+        return changed, deleted
+
     def yield_blobs(self) -> typing.Iterator[Blob]:
         """
         Yield the blobs from the Git repository. One blob will be generated for each file in the repo which passes the
@@ -140,18 +339,20 @@ class SourceCodeGitLoader(BlobLoader):
 
         logger.debug("Scanning documents for Git repository at path: '%s'", self.repo_path)
 
-        all_files_in_repo = [str(item.path) for item in repo.tree().traverse() if isinstance(item, GitBlob)]
+        with instrumentation.span("git.list_files"):
+            all_files_in_repo = [str(item.path) for item in repo.tree().traverse() if isinstance(item, GitBlob)]
 
         base_path = Path(self.repo_path)
 
         include_files: set[str] = set()
         exclude_files: set[str] = set()
 
-        for inc in self.include or ["**/*"]:
-            include_files = include_files.union(set(str(x.relative_to(base_path)) for x in base_path.glob(inc)))
+        with instrumentation.span("git.glob"):
+            for inc in self.include or ["**/*"]:
+                include_files = include_files.union(set(str(x.relative_to(base_path)) for x in base_path.glob(inc)))
 
-        for exc in self.exclude or {}:
-            exclude_files = exclude_files.union(set(str(x.relative_to(base_path)) for x in base_path.glob(exc)))
+            for exc in self.exclude or {}:
+                exclude_files = exclude_files.union(set(str(x.relative_to(base_path)) for x in base_path.glob(exc)))
 
         # # Filter out files that are not in the repo
         # include_files = include_files.intersection(all_files_in_repo)
@@ -159,7 +360,11 @@ class SourceCodeGitLoader(BlobLoader):
         # Take the include files and remove the exclude files.
         final_files = include_files - exclude_files
 
+        if self.paths is not None:
+            final_files = final_files.intersection(self.paths)
+
         logger.debug("Processing %d files in the Git repository at path: '%s'", len(final_files), self.repo_path)
+        instrumentation.count("git.files", len(final_files))
 
         for f in tqdm(final_files):
 
@@ -0,0 +1,233 @@
+import logging
+import os
+import re
+import typing
+
+if typing.TYPE_CHECKING:
+    from langchain_core.documents import Document  # pragma: no cover
+
+    from functions_parsers.lang_functions_parsers import LanguageFunctionsParser  # pragma: no cover
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+PACKAGE_WITH_VERSION_SUFFIX_REGEX = re.compile(r"[./][vV][1-9]+$")
+CALL_REGEX = re.compile(r"([\w$]+)\s*\(")
+
+
+def handle_argument(param: str) -> str:
+    if (param.startswith("'") and param.endswith("'")) or (param.startswith('"') and param.endswith('"')):
+        return param
+    elif param.__contains__("(") and param.__contains__(")"):
+        function_prefix_index_end = param.find("(") + 1
+        function_ending_index_end = param.rfind(")")
+        return traverse_all_parameters(function_ending_index_end, function_prefix_index_end, param)
+    else:
+        return ".*"
+
+
+def traverse_all_parameters(function_ending_index_end, function_prefix_index_end, function_string):
+    current_idx = function_prefix_index_end
+    function_builder = function_string[:function_prefix_index_end]
+    if current_idx == function_ending_index_end:
+        function_builder += ")"
+    while current_idx < function_ending_index_end:
+        end_of_arg_ind = function_string[current_idx:].find(",")
+        if end_of_arg_ind > -1:
+            value = handle_argument(function_string[current_idx: current_idx + end_of_arg_ind].strip())
+            function_builder += f"\\s?{value},"
+            current_idx = current_idx + end_of_arg_ind + 1
+        else:
+            # last argument
+            value = handle_argument(function_string[current_idx:function_ending_index_end].strip())
+            function_builder += f"\\s?{value}\\s?)"
+            current_idx = function_ending_index_end
+
+    return function_builder
+
+
+def get_short_package_name(package: str) -> str:
+    """
+    Returns the last element of a package path without its major version suffix, e.g. "go-jose" for
+    "github.com/go-jose/go-jose/v4".
+    """
+    match = PACKAGE_WITH_VERSION_SUFFIX_REGEX.search(package)
+    if match:
+        parts = package.split(match.group())
+        return parts[-2].split("/")[-1]
+    else:
+        return package.split("/")[-1]
+
+
+def count_call_arguments(code: str, arguments_start: int) -> int | None:
+    """
+    Returns the number of arguments of a call whose argument list starts after the opening parenthesis at
+    `arguments_start - 1`, None if the argument list isn't closed.
+    """
+    depth = 0
+    quote = None
+    arguments = 0
+    has_argument = False
+    index = arguments_start
+    while index < len(code):
+        character = code[index]
+        if quote is not None:
+            if character == "\\":
+                index += 1
+            elif character == quote:
+                quote = None
+        elif character in "\"'`":
+            quote = character
+            has_argument = True
+        elif character in "([{":
+            depth += 1
+            has_argument = True
+        elif character in ")]}":
+            if depth == 0:
+                return arguments + 1 if has_argument else arguments
+            depth -= 1
+        elif character == "," and depth == 0:
+            arguments += 1
+        elif not character.isspace():
+            has_argument = True
+        index += 1
+    return None
+
+
+class SymbolIndex:
+    """
+    An index of the functions of a retriever's documents, to resolve the user inputs of the retriever without scanning
+    all the documents.
+
+    Functions are indexed by the names of their packages (module paths), and packages by their short names (the
+    package alias used in code, the last path element without the major version suffix). The calls made by the
+    functions of a package, by called function name and number of arguments, are indexed when the package is first
+    searched for a call expression.
+    """
+
+    def __init__(self, documents: typing.Iterable["Document"], language_parser: "LanguageFunctionsParser"):
+        self.language_parser = language_parser
+        self.__documents: list["Document"] = list()
+        # package name (lower case) -> indexes of the package's function documents
+        self.__functions_of_package: dict[str, list[int]] = dict()
+        # package name (lower case) -> package names as returned by the language parser, in first seen order
+        self.__package_names: dict[str, str] = dict()
+        # (package name, function name) (lower case) -> indexes of the function documents
+        self.__functions_by_name: dict[tuple[str, str], list[int]] = dict()
+        # package name (lower case) -> (called function name, arguments count) -> indexes of the calling documents
+        self.__calls_of_package: dict[str, dict[tuple[str, int | None], list[int]]] = dict()
+
+        for document in documents:
+            document_index = len(self.__documents)
+            self.__documents.append(document)
+            function_name = language_parser.get_function_name(document)
+            for package_name in dict.fromkeys(language_parser.get_package_names(document)):
+                package_key = package_name.lower()
+                self.__package_names.setdefault(package_key, package_name)
+                self.__functions_of_package.setdefault(package_key, []).append(document_index)
+                if function_name:
+                    self.__functions_by_name.setdefault((package_key, function_name.lower()), []).append(
+                        document_index)
+
+        logger.debug("Indexed %d functions of %d packages", len(self.__documents), len(self.__package_names))
+
+    def __len__(self) -> int:
+        return len(self.__documents)
+
+    def get_package_names(self) -> list[str]:
+        return list(self.__package_names.values())
+
+    def resolve_packages(self, package: str) -> list[str]:
+        """
+        Returns the indexed packages matching a package of a user input, the package itself if it's indexed, then the
+        packages whose name contains its short name (e.g. "github.com/go-jose/go-jose/v3" for
+        "github.com/go-jose/go-jose/v4").
+        """
+        short_package_name = get_short_package_name(package)
+        packages = [self.__package_names[package.lower()]] if package.lower() in self.__package_names else []
+        packages.extend(package_name for package_name in self.__package_names.values()
+                        if short_package_name in package_name and package_name.lower() != package.lower())
+        return packages
+
+    def get_package_functions(self, package: str) -> list["Document"]:
+        return [self.__documents[document_index]
+                for document_index in self.__functions_of_package.get(package.lower(), [])]
+
+    def find_functions(self, package: str, function_name: str) -> list["Document"]:
+        """
+        Returns the function documents of a package with a name, compared case insensitively.
+        """
+        return [self.__documents[document_index]
+                for document_index in self.__functions_by_name.get((package.lower(), function_name.lower()), [])]
+
+    def __get_calls_of_package(self, package_key: str) -> dict[tuple[str, int | None], list[int]]:
+        calls = self.__calls_of_package.get(package_key)
+        if calls is None:
+            calls = dict()
+            for document_index in self.__functions_of_package.get(package_key, []):
+                content = self.__documents[document_index].page_content
+                for match in CALL_REGEX.finditer(content):
+                    call = (match.group(1), count_call_arguments(content, match.end()))
+                    calling_documents = calls.setdefault(call, [])
+                    if not calling_documents or calling_documents[-1] != document_index:
+                        calling_documents.append(document_index)
+            self.__calls_of_package[package_key] = calls
+        return calls
+
+    def find_callers(self, package: str, function_name: str, arguments_count: int | None = None) -> list["Document"]:
+        """
+        Returns the function documents of a package calling a function with at least `arguments_count` arguments,
+        in documents order.
+        """
+        calls = self.__get_calls_of_package(package.lower())
+        document_indexes = set()
+        for (called_function, called_arguments_count), calling_documents in calls.items():
+            if called_function == function_name and (arguments_count is None or called_arguments_count is None or
+                                                     called_arguments_count >= arguments_count):
+                document_indexes.update(calling_documents)
+        return [self.__documents[document_index] for document_index in sorted(document_indexes)]
+
+    def resolve_input(self, input_string: str) -> str:
+        """
+        Resolve a retriever input "package,function" whose function is a call expression, e.g.
+        'github.com/go-jose/go-jose/v4,strings.Split(token, ".")', to the function of the package making the call.
+
+        Parameters
+        ----------
+        input_string : str
+            The retriever input.
+
+        Returns
+        -------
+        str
+            Returns the retriever input "package,function" of the calling function, with the package resolved to an
+            indexed package name, or the input itself if the function isn't a call expression. The function is empty
+            if no function of the package makes the call.
+        """
+        package, function = input_string.split(",", 1)
+        if "." not in function and ")" not in function:
+            return input_string
+
+        packages = self.resolve_packages(package)
+        if packages:
+            package = packages[0]
+
+        function_prefix_index_end = function.find("(") + 1
+        function_ending_index_end = function.rfind(")")
+        function_builder = traverse_all_parameters(function_ending_index_end, function_prefix_index_end, function)
+
+        called_function_match = re.search(r"([\w$]+)\s*\($", function[:function_prefix_index_end])
+        if called_function_match:
+            called_function = called_function_match.group(1)
+            arguments_count = count_call_arguments(function, function_prefix_index_end)
+        else:
+            called_function = re.split(r"\W", function.strip())[-1]
+            arguments_count = None
+
+        comment_line_character = self.language_parser.get_comment_line_notation()
+        for package_name in packages:
+            for func in self.find_callers(package_name, called_function, arguments_count):
+                if match := re.search(rf"{function_builder}", func.page_content, flags=re.MULTILINE):
+                    line_start = func.page_content.rfind(os.linesep, 0, match.start()) + 1
+                    if not func.page_content[line_start: match.start()].strip().startswith(comment_line_character):
+                        return f"{package},{self.language_parser.get_function_name(func)}"
+        return f"{package},"
@@ -0,0 +1,194 @@
+import collections
+import copy
+import functools
+import logging
+import re
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain.text_splitter import Language
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+logger = logging.getLogger(f"poc.{__name__}")
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_separator(separator: str) -> re.Pattern:
+    return re.compile(f"({separator})")
+
+
+@functools.lru_cache(maxsize=None)
+def _get_separators_for_language(language: Language | None) -> tuple[str, ...] | None:
+    try:
+        return tuple(RecursiveCharacterTextSplitter.get_separators_for_language(language))
+    except ValueError:
+        return None
+
+
+class MultiLanguageRecursiveCharacterTextSplitter(RecursiveCharacterTextSplitter):
+    """
+    A version of langchain's RecursiveCharacterTextSplitter that supports multiple languages.
+    """
+
+    def __init__(
+            self,
+            keep_separator: bool = True,
+            offset_chunking: bool = False,
+            max_workers: int = 1,
+            **kwargs,
+    ) -> None:
+        """
+        Create a new RecursiveCharacterTextSplitter.
+
+        With `offset_chunking`, the texts are split into (start, end) offsets instead of copied substrings, so the
+        start index of a chunk is known without searching for it in the text, and all the chunks of a text share one
+        shallow copy of its metadata (or a shallow copy with its own "start_index" when `add_start_index` is set)
+        instead of a deep copy each. The chunks are the same as the ones produced without it. `max_workers` larger
+        than 1 splits the texts in parallel processes.
+        """
+        super().__init__(is_separator_regex=True, keep_separator=keep_separator, **kwargs)
+        self._offset_chunking = offset_chunking
+        self._max_workers = max_workers
+
+    def _get_separators(self, language: Language) -> list[str]:
+        separators = _get_separators_for_language(language)
+        return list(separators) if separators is not None else self._separators
+
+    def create_documents(self, texts: list[str], metadatas: list[dict] | None = None) -> list[Document]:
+        """Create documents from a list of texts."""
+        _metadatas = metadatas or [{}] * len(texts)
+
+        # Offsets can only be computed when chunks are contiguous parts of the text, measured in characters
+        if self._offset_chunking and self._keep_separator and self._length_function is len:
+            return self._create_documents_from_offsets(texts, _metadatas)
+
+        documents = []
+        for i, text in enumerate(texts):
+            index = 0
+            previous_chunk_len = 0
+
+            # Determine the language of the text from the metadata
+            language = _metadatas[i].get("language", None)
+
+            for chunk in self._split_text(text, separators=self._get_separators(language)):
+                metadata = copy.deepcopy(_metadatas[i])
+                if self._add_start_index:
+                    offset = index + previous_chunk_len - self._chunk_overlap
+                    index = text.find(chunk, max(0, offset))
+                    metadata["start_index"] = index
+                    previous_chunk_len = len(chunk)
+                new_doc = Document(page_content=chunk, metadata=metadata)
+                documents.append(new_doc)
+        return documents
+
+    def _create_documents_from_offsets(self, texts: list[str], metadatas: list[dict]) -> list[Document]:
+        languages = [metadata.get("language", None) for metadata in metadatas]
+
+        if self._max_workers > 1 and len(texts) > 1:
+            with ProcessPoolExecutor(max_workers=self._max_workers) as executor:
+                texts_offsets = list(executor.map(self.split_text_offsets, texts, languages,
+                                                  chunksize=max(1, len(texts) // (self._max_workers * 4))))
+        else:
+            texts_offsets = map(self.split_text_offsets, texts, languages)
+
+        documents = []
+        for text, metadata, text_offsets in zip(texts, metadatas, texts_offsets):
+            shared_metadata = dict(metadata)
+            for start, end in text_offsets:
+                if self._add_start_index:
+                    chunk_metadata = {**shared_metadata, "start_index": start}
+                else:
+                    chunk_metadata = shared_metadata
+                documents.append(Document(page_content=text[start:end], metadata=chunk_metadata))
+        return documents
+
+    def split_text_offsets(self, text: str, language: Language | None = None) -> list[tuple[int, int]]:
+        """
+        Split a text into chunks, returned as (start, end) offsets into the text.
+        """
+        return self._split_offsets(text, 0, len(text), self._get_separators(language))
+
+    def _split_offsets(self, text: str, start: int, end: int, separators: list[str]) -> list[tuple[int, int]]:
+        # Same algorithm as RecursiveCharacterTextSplitter._split_text, applied to text[start:end] without copying it
+        final_chunks = []
+        separator = separators[-1]
+        new_separators = []
+        for i, _s in enumerate(separators):
+            if _s == "":
+                separator = _s
+                break
+            if _compile_separator(_s).search(text, start, end):
+                separator = _s
+                new_separators = separators[i + 1:]
+                break
+
+        good_splits = []
+        for split_start, split_end in self._split_offsets_with_separator(text, start, end, separator):
+            if split_end - split_start < self._chunk_size:
+                good_splits.append((split_start, split_end))
+            else:
+                if good_splits:
+                    final_chunks.extend(self._merge_offsets(text, good_splits))
+                    good_splits = []
+                if not new_separators:
+                    final_chunks.append((split_start, split_end))
+                else:
+                    final_chunks.extend(self._split_offsets(text, split_start, split_end, new_separators))
+        if good_splits:
+            final_chunks.extend(self._merge_offsets(text, good_splits))
+        return final_chunks
+
+    def _split_offsets_with_separator(self, text: str, start: int, end: int,
+                                      separator: str) -> typing.Iterator[tuple[int, int]]:
+        if separator == "":
+            for index in range(start, end):
+                yield index, index + 1
+            return
+
+        keep_separator_at_end = self._keep_separator == "end"
+        split_start = start
+        for match in _compile_separator(separator).finditer(text, start, end):
+            split_end = match.end() if keep_separator_at_end else match.start()
+            if split_end > split_start:
+                yield split_start, split_end
+            split_start = split_end
+        if end > split_start:
+            yield split_start, end
+
+    def _merge_offsets(self, text: str, splits: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        # Same algorithm as RecursiveCharacterTextSplitter._merge_splits with an empty separator
+        chunks = []
+        current_splits: collections.deque[tuple[int, int]] = collections.deque()
+        total = 0
+        for split_start, split_end in splits:
+            split_length = split_end - split_start
+            if total + split_length > self._chunk_size:
+                if total > self._chunk_size:
+                    logger.warning("Created a chunk of size %d, which is longer than the specified %d",
+                                   total,
+                                   self._chunk_size)
+                if len(current_splits) > 0:
+                    chunk = self._strip_offsets(text, current_splits[0][0], current_splits[-1][1])
+                    if chunk is not None:
+                        chunks.append(chunk)
+                    while total > self._chunk_overlap or (total + split_length > self._chunk_size and total > 0):
+                        first_start, first_end = current_splits.popleft()
+                        total -= first_end - first_start
+            current_splits.append((split_start, split_end))
+            total += split_length
+        if len(current_splits) > 0:
+            chunk = self._strip_offsets(text, current_splits[0][0], current_splits[-1][1])
+            if chunk is not None:
+                chunks.append(chunk)
+        return chunks
+
+    def _strip_offsets(self, text: str, start: int, end: int) -> tuple[int, int] | None:
+        if self._strip_whitespace:
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+        if start == end:
+            return None
+        return start, end